@@ -0,0 +1,326 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+
+import utilities
+
+# Networks used as templates for the synthetic corpora. Each has the reactions as (substrates, products) with the
+# rate constants, species, initial concentrations and boundary species that go with them.
+OSCILLATOR_TEMPLATES = [
+    {"reactions": [(["X"], ["X", "X"]), (["X", "Y"], ["Y", "Y"]), (["Y"], ["Z"])],
+     "rateconstants": [1.0, 0.5, 1.0],
+     "species": ["X", "Y", "Z"],
+     "initial_concentrations": [2.0, 1.0, 0.0],
+     "boundary": ["Z"]},
+    {"reactions": [(["S0"], ["S0", "S1"]), (["S1", "S2"], ["S1"]), (["S2", "S0"], ["S0"]), (["S2"], ["S0", "S2"]),
+                   (["S2", "S2"], ["S0", "S1"])],
+     "rateconstants": [27.971476939903916, 6.993513607324775, 15.037217321845633, 3.446568355371688,
+                       38.33079118172144],
+     "species": ["S0", "S1", "S2"],
+     "initial_concentrations": [5.624729967067094, 8.18187971911558, 6.042824063376348],
+     "boundary": []},
+]
+
+# Oscillator eigenvalues but negative steady state concentrations, fix_model can repair these
+BROKEN_OSCILLATOR_TEMPLATES = [
+    {"reactions": [(["S2", "S0"], ["S0", "S0"]), (["S0"], ["S2", "S2"]), (["S0", "S0"], ["S0", "S0"]),
+                   (["S1"], ["S1", "S2"]), (["S0"], ["S1", "S2"]), (["S0"], ["S1"]), (["S1", "S0"], ["S1", "S1"])],
+     "rateconstants": [1.856011765774747, 39.85439535757534, 40.331087790574614, 3.6966825670443337,
+                       45.95848519472352, 7.7715459127417645, 5.9442162392913565],
+     "species": ["S0", "S1", "S2"],
+     "initial_concentrations": [8.427019129943133, 8.731325218370248, 7.978199783544728],
+     "boundary": []},
+    {"reactions": [(["S1"], ["S1", "S2"]), (["S0"], ["S0", "S0"]), (["S1", "S0"], ["S1", "S2"]),
+                   (["S1", "S0"], ["S2"]), (["S2", "S0"], ["S1"])],
+     "rateconstants": [7.769531093949338, 15.05731401180228, 36.57940598316677, 27.703894186190304,
+                       8.044236339431464],
+     "species": ["S0", "S1", "S2"],
+     "initial_concentrations": [3.283296546919103, 3.9307557210218635, 6.7008922377215265],
+     "boundary": []},
+]
+
+DEFAULT_MIX = {"oscillator": 0.2, "broken": 0.2, "stiff": 0.2, "divergent": 0.1, "random": 0.3}
+
+SCENARIOS = ["load_model", "is_oscillator", "fix_model", "prune_antimony_model", "evaluate_oscillators",
+             "sort_by_fitness", "plot_timeseries"]
+
+
+#--------------------------------------------------
+# Synthetic Corpus
+#--------------------------------------------------
+
+def format_antimony(network, fitness):
+    """
+    Write a network as an antimony string, exactly like convert_to_antimony and writeoutnetwork do in Julia
+    :param network: (dict) with keys reactions, rateconstants, species, initial_concentrations and boundary
+    :param fitness: (float) Fitness value appended to the model
+    :return: (str) Antimony string
+    """
+    reactions = ""
+    rateconstants = ""
+    for i, ((substrates, products), k) in enumerate(zip(network["reactions"], network["rateconstants"])):
+        ratelaw = "*".join([f"k{i + 1}"] + substrates)
+        reactions += f"{' + '.join(substrates)} -> {' + '.join(products)}; {ratelaw}\n"
+        rateconstants += f"k{i + 1} = {k}\n"
+    initial_concentrations = ""
+    for s, c in zip(network["species"], network["initial_concentrations"]):
+        initial_concentrations += f"{s} = {c}\n"
+    if len(network["boundary"]) > 0:
+        initial_concentrations += "const " + ", ".join(network["boundary"])
+    return reactions + rateconstants + initial_concentrations + f"\n#fitness: {fitness}"
+
+
+def random_network(rng, nspecies=3, nreactions=5, rateconstant_range=(0.1, 50), log_uniform=False):
+    """
+    Generate a random mass-action network with uni and bi molecular reactions
+    :param rng: (random.Random) Random number generator
+    :param nspecies: optional (int), number of chemical species
+    :param nreactions: optional (int), number of reactions
+    :param rateconstant_range: optional (float, float), range of the rate constants
+    :param log_uniform: optional (bool), if True, rate constants are drawn uniformly on a log scale, which gives
+        stiff models when the range spans several orders of magnitude
+    :return: (dict) Network, see format_antimony
+    """
+    species = [f"S{i}" for i in range(nspecies)]
+    low, high = rateconstant_range
+    reactions = []
+    rateconstants = []
+    for _ in range(nreactions):
+        substrates = [rng.choice(species) for _ in range(rng.choice([1, 2]))]
+        products = [rng.choice(species) for _ in range(rng.choice([1, 2]))]
+        reactions.append((substrates, products))
+        if log_uniform:
+            rateconstants.append(10 ** rng.uniform(math.log10(low), math.log10(high)))
+        else:
+            rateconstants.append(rng.uniform(low, high))
+    return {"reactions": reactions,
+            "rateconstants": rateconstants,
+            "species": species,
+            "initial_concentrations": [rng.choice([1.0, 5.0, 9.0]) * rng.uniform(0.5, 1.5) for _ in species],
+            "boundary": []}
+
+
+def perturbed_template(rng, template, spread=0.01):
+    """
+    Copy a template network with every rate constant changed by up to +/- spread (relative)
+    :param rng: (random.Random) Random number generator
+    :param template: (dict) Network, see format_antimony
+    :param spread: optional (float), maximum relative change of the rate constants
+    :return: (dict) Network
+    """
+    network = dict(template)
+    network["rateconstants"] = [k * (1 + rng.uniform(-spread, spread)) for k in template["rateconstants"]]
+    return network
+
+
+def generate_model(rng, kind):
+    """
+    Generate one synthetic model
+    :param rng: (random.Random) Random number generator
+    :param kind: (str) One of "oscillator", "broken" (repairable broken oscillator), "stiff" (rate constants over
+        several orders of magnitude), "divergent" (explosive autocatalysis) or "random"
+    :return: (str) Antimony string
+    """
+    if kind == "oscillator":
+        network = perturbed_template(rng, rng.choice(OSCILLATOR_TEMPLATES))
+    elif kind == "broken":
+        # Broken oscillators are sensitive to their rate constants, even small changes often make them plain
+        # non-oscillators, so they are used as they are
+        network = rng.choice(BROKEN_OSCILLATOR_TEMPLATES)
+    elif kind == "stiff":
+        network = random_network(rng, nreactions=rng.randint(5, 8), rateconstant_range=(1e-3, 1e4), log_uniform=True)
+    elif kind == "divergent":
+        network = random_network(rng, nreactions=rng.randint(4, 6))
+        # Strong autocatalysis that the other reactions can't keep up with
+        network["reactions"].append((["S0"], ["S0", "S0"]))
+        network["rateconstants"].append(rng.uniform(500, 1000))
+    elif kind == "random":
+        network = random_network(rng, nreactions=rng.randint(5, 8))
+    else:
+        raise ValueError(f"Unknown model kind: {kind}")
+    return format_antimony(network, rng.random())
+
+
+def generate_corpus(path, n, seed=0, mix=None):
+    """
+    Write a deterministic corpus of synthetic models to a directory. Files are named <kind>_<number>.ant
+    :param path: (str) Path to the directory where the models will be written
+    :param n: (int) Number of models
+    :param seed: optional (int), seed of the random number generator
+    :param mix: optional (dict(str: float)), proportion of each kind of model (see generate_model), DEFAULT_MIX
+        by default
+    :return: list((str, str)) File name and kind of each model
+    """
+    if mix is None:
+        mix = DEFAULT_MIX
+    if not os.path.exists(path):
+        os.makedirs(path)
+    rng = random.Random(seed)
+    kinds = list(mix.keys())
+    weights = [mix[kind] for kind in kinds]
+    corpus = []
+    for i in range(n):
+        kind = rng.choices(kinds, weights=weights)[0]
+        file = f"{kind}_{i:06d}.ant"
+        with open(os.path.join(path, file), "w") as f:
+            f.write(generate_model(rng, kind))
+        corpus.append((file, kind))
+    return corpus
+
+
+#--------------------------------------------------
+# Timed Scenarios
+#--------------------------------------------------
+
+def time_per_model(corpus_path, corpus, function, kinds=None):
+    """
+    Private function. Time a function called on each model of a corpus
+    :param corpus_path: (str) Path to the corpus directory
+    :param corpus: list((str, str)) File name and kind of each model
+    :param function: Function taking the path to a model file, only the time spent in it is counted
+    :param kinds: optional list(str), only time models of these kinds
+    :return: (float, int) Total time in seconds and number of models
+    """
+    total = 0
+    count = 0
+    for file, kind in corpus:
+        if kinds is not None and kind not in kinds:
+            continue
+        total += function(os.path.join(corpus_path, file))
+        count += 1
+    return total, count
+
+
+def timed(function, *args, **kwargs):
+    """
+    Private function. Call a function and return the time it took
+    :return: (float) Time in seconds
+    """
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run_scenario(scenario, corpus_path, corpus, workdir):
+    """
+    Run one timed scenario on a corpus. Scenarios that modify files work on a fresh copy of the corpus.
+    :param scenario: (str) One of SCENARIOS
+    :param corpus_path: (str) Path to the corpus directory
+    :param corpus: list((str, str)) File name and kind of each model
+    :param workdir: (str) Scratch directory
+    :return: (float, int) Total time in seconds and number of models
+    """
+    if scenario == "load_model":
+        return time_per_model(corpus_path, corpus, lambda path: timed(utilities.load_model, path))
+    if scenario == "is_oscillator":
+        def check(path):
+            r = utilities.load_model(path)
+            return timed(utilities.is_oscillator, r)
+        return time_per_model(corpus_path, corpus, check)
+    if scenario == "fix_model":
+        def fix(path):
+            r = utilities.load_model(path)
+            astr = r.getAntimony()
+            return timed(utilities.fix_model, astr, fitness=utilities.get_model_fitness_from_file(path))
+        return time_per_model(corpus_path, corpus, fix, kinds=["broken"])
+    if scenario == "prune_antimony_model":
+        def prune(path):
+            with open(path, "r") as f:
+                astr = f.read()
+            return timed(utilities.prune_antimony_model, astr)
+        return time_per_model(corpus_path, corpus, prune, kinds=["oscillator"])
+    copy_path = os.path.join(workdir, scenario)
+    shutil.rmtree(copy_path, ignore_errors=True)
+    if scenario == "plot_timeseries":
+        # Only plot models that simulate cleanly, like the SUCCESS directories analysts plot
+        corpus = [(file, kind) for file, kind in corpus if kind in ["oscillator", "broken"]]
+        os.makedirs(copy_path)
+        for file, kind in corpus:
+            shutil.copy(os.path.join(corpus_path, file), os.path.join(copy_path, file))
+    else:
+        shutil.copytree(corpus_path, copy_path)
+    try:
+        if scenario == "evaluate_oscillators":
+            return timed(utilities.evaluate_oscillators, copy_path), len(corpus)
+        if scenario == "sort_by_fitness":
+            return timed(utilities.sort_by_fitness, copy_path), len(corpus)
+        if scenario == "plot_timeseries":
+            if not corpus:
+                return 0, 0
+            return timed(utilities.plot_timeseries, copy_path, savepath=os.path.join(workdir, "timeseries.png")), \
+                len(corpus)
+    finally:
+        shutil.rmtree(copy_path, ignore_errors=True)
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def run_benchmarks(sizes, scenarios=None, seed=0, mix=None, workdir=None):
+    """
+    Run timed scenarios on synthetic corpora of several sizes
+    :param sizes: list(int) Corpus sizes
+    :param scenarios: optional list(str), scenarios to run, all of SCENARIOS by default
+    :param seed: optional (int), seed used to generate the corpora
+    :param mix: optional (dict(str: float)), proportion of each kind of model, DEFAULT_MIX by default
+    :param workdir: optional (str), scratch directory, a temporary directory by default
+    :return: (dict) Machine readable results, see main
+    """
+    if scenarios is None:
+        scenarios = SCENARIOS
+    if mix is None:
+        mix = DEFAULT_MIX
+    cleanup = workdir is None
+    if workdir is None:
+        workdir = tempfile.mkdtemp(prefix="rne_benchmark_")
+    results = []
+    try:
+        for size in sizes:
+            corpus_path = os.path.join(workdir, f"corpus_{size}")
+            corpus = generate_corpus(corpus_path, size, seed=seed, mix=mix)
+            for scenario in scenarios:
+                seconds, count = run_scenario(scenario, corpus_path, corpus, workdir)
+                results.append({"scenario": scenario,
+                                "corpus_size": size,
+                                "models": count,
+                                "seconds": seconds,
+                                "seconds_per_model": seconds / count if count > 0 else None})
+                print(f"{scenario} ({size} models): {seconds:.3f} s")
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {"meta": {"seed": seed,
+                     "mix": mix,
+                     "sizes": sizes,
+                     "python": platform.python_version(),
+                     "platform": platform.platform(),
+                     "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the utilities.py hot paths on synthetic corpora")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100], help="corpus sizes")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS, help="scenarios to run")
+    parser.add_argument("--seed", type=int, default=0, help="seed used to generate the corpora")
+    parser.add_argument("--mix", type=json.loads, default=None,
+                        help='proportion of each kind of model as JSON, e.g. \'{"oscillator": 0.5, "random": 0.5}\'')
+    parser.add_argument("--workdir", default=None, help="scratch directory (a temporary directory by default)")
+    parser.add_argument("--output", default=None, help="path of the JSON results file (printed if not given)")
+    args = parser.parse_args()
+    results = run_benchmarks(args.sizes, scenarios=args.scenarios, seed=args.seed, mix=args.mix,
+                             workdir=args.workdir)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
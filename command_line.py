@@ -0,0 +1,269 @@
+import argparse
+import os
+import sys
+
+from model_files import EVALUATION_JOURNAL_FILENAME
+from verdict_cache import VerdictCache
+from simulation_cache import enable_simulation_cache
+from model_archive import pack_models, unpack_models
+from run_monitor import watch_evolution
+from rate_sweeps import rate_constant_ranges, sweep_rate_constants
+from work_queue import evaluate_oscillators_shared, prune_models_shared
+from utilities import (
+    compare_verdicts, enable_adaptive_solver, evaluate_fitness_cutoff, evaluate_oscillators, gather_best_models,
+    pack_fitness_values, plot_fitness, plot_timeseries, prescreen_oscillators, prune_models, rank_by_fitness,
+    read_objective_data_path, rescore_models, RESCORING_METRICS, sort_by_fitness, StageProfiler, VERDICT_MODES)
+
+
+def main(argv=None):
+    """
+    Command line entry point, e.g. python utilities.py evaluate path/to/models --workers 8
+    Tellurium and matplotlib are only loaded by the subcommands that need them.
+    :param argv: optional list(str), command line arguments, sys.argv[1:] by default
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Post-process reaction networks written by ReactionNetworkEvolution")
+    parser.add_argument("--simulation-cache", default=None, help="directory of a cache of simulation results")
+    parser.add_argument("--simulation-cache-size", type=float, default=1024,
+                        help="maximum size of the simulation cache in MB")
+    parser.add_argument("--adaptive-solver", action="store_true",
+                        help="simulate the oscillator tests at a lower output density first and learn which solver "
+                             "settings work for each kind of model; faster, but a broken oscillator can be repaired "
+                             "by removing a different reaction")
+    parser.add_argument("--solver-memory", default=None,
+                        help="JSON file of the solver settings that worked for each kind of model, shared by runs. "
+                             "Implies --adaptive-solver")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    gather = subparsers.add_parser("gather", help="gather the best models of a batch or results directory")
+    gather.add_argument("path", help="batch_* or results_* directory")
+    gather.add_argument("destination", help="directory where the models will be moved")
+    gather.add_argument("--workers", type=int, default=None, help="number of threads walking the trial directories")
+
+    evaluate = subparsers.add_parser("evaluate", help="label models as oscillators (success) or not (fail)")
+    evaluate.add_argument("path", help="directory of antimony models or model archive")
+    evaluate.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    evaluate.add_argument("--timeout", type=float, default=None, help="maximum seconds per model with workers")
+    evaluate.add_argument("--budget", type=float, default=None,
+                          help="maximum seconds per model, cheap tests first, models over budget are marked timeout")
+    evaluate.add_argument("--use-index", action="store_true", help="only evaluate new or changed models")
+    evaluate.add_argument("--checkpoint", action="store_true",
+                          help="journal verdicts in %s in the directory, so an interrupted run resumes where it "
+                               "stopped when run again with --checkpoint" % EVALUATION_JOURNAL_FILENAME)
+    evaluate.add_argument("--streaming", action="store_true", help="sample simulations sparsely, stop on a blow-up")
+    evaluate.add_argument("--profile", default=None,
+                          help="save a profile of the oscillator tests to this .json or .csv file")
+    evaluate.add_argument("--screen", action="store_true",
+                          help="mark clear non-oscillators as fails after a batched steady state and eigenvalue screen")
+    evaluate.add_argument("--verdict-cache", default=None,
+                          help="JSON file of verdicts of equivalent networks, loaded if it exists and saved afterwards")
+    evaluate.add_argument("--shared", action="store_true",
+                          help="evaluate together with other processes running on the same directory")
+
+    cutoff = subparsers.add_parser("cutoff", help="label models as success or fail based on their fitness")
+    cutoff.add_argument("path", help="directory of antimony models")
+    cutoff.add_argument("cutoff", type=float, help="models with at least this fitness are successes")
+    cutoff.add_argument("--use-index", action="store_true", help="read fitness values from the model index")
+
+    sort = subparsers.add_parser("sort", help="prefix models with their fitness rank")
+    sort.add_argument("path", help="directory of antimony models or model archive")
+    sort.add_argument("--ascending", action="store_true", help="sort worst to best")
+    sort.add_argument("--use-index", action="store_true", help="read fitness values from the model index")
+
+    rank = subparsers.add_parser("rank", help="rank models by fitness without renaming them")
+    rank.add_argument("path", help="directory of antimony models")
+    rank.add_argument("--top", type=int, default=None, help="only keep the best models")
+    rank.add_argument("--view", choices=["manifest", "symlink", "hardlink"], default="manifest",
+                      help="save the ranking as a manifest or as a directory of links to the ranked models")
+    rank.add_argument("--destination", default=None, help="manifest path or view directory")
+    rank.add_argument("--ascending", action="store_true", help="rank worst to best")
+    rank.add_argument("--use-index", action="store_true", help="read fitness values from the model index")
+    rank.add_argument("--score", default=None, help="rank by a score stored by rescore, e.g. default_fitness")
+
+    rescore = subparsers.add_parser("rescore", help="score models against objective time series data")
+    rescore.add_argument("path", help="directory of antimony models or model archive")
+    rescore.add_argument("--objective", default=None,
+                         help="CSV file of objective data or DEFAULT, objective_data_path of --settings by default")
+    rescore.add_argument("--settings", default=None, help="evolution settings.json to read objective_data_path from")
+    rescore.add_argument("--name", default=None, help="name of the objective in the score names")
+    rescore.add_argument("--metrics", nargs="+", choices=RESCORING_METRICS, default=["fitness"], help="metrics")
+    rescore.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    rescore.add_argument("--batch-size", type=int, default=256, help="number of models simulated together")
+
+    prune = subparsers.add_parser("prune", help="remove reactions that don't contribute to oscillation")
+    prune.add_argument("path", help="directory of antimony models")
+    prune.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    prune.add_argument("--timeout", type=float, default=None, help="maximum seconds per candidate network with workers")
+    prune.add_argument("--minimal", action="store_true", help="search for the smallest oscillating core")
+    prune.add_argument("--max-evaluations", type=int, default=None, help="evaluation budget per model")
+    prune.add_argument("--time-limit", type=float, default=None, help="time budget per model in seconds")
+    prune.add_argument("--streaming", action="store_true", help="sample simulations sparsely, stop on a blow-up")
+    prune.add_argument("--profile", default=None,
+                       help="save a profile of the oscillator tests to this .json or .csv file")
+    prune.add_argument("--verdict-cache", default=None,
+                       help="JSON file of verdicts of equivalent networks, loaded if it exists and saved afterwards")
+    prune.add_argument("--shared", action="store_true",
+                       help="prune together with other processes running on the same directory")
+    for subparser in [evaluate, prune]:
+        subparser.add_argument("--worker-id", default=None, help="name of this worker with --shared")
+        subparser.add_argument("--shard-size", type=int, default=None, help="models claimed at once with --shared")
+        subparser.add_argument("--lease-timeout", type=float, default=300,
+                               help="seconds after which the models of a silent worker are claimed with --shared")
+
+    sweep = subparsers.add_parser("sweep", help="map the rate constant values for which a model oscillates")
+    sweep.add_argument("model", help="antimony file")
+    sweep.add_argument("--constants", nargs="+", default=None,
+                       help="rate constants to sweep, all k1, k2, ... by default")
+    sweep.add_argument("--factor", type=float, default=10, help="sweep from value / factor to value * factor")
+    sweep.add_argument("--num", type=int, default=10, help="values per rate constant for a grid, points otherwise")
+    sweep.add_argument("--method", choices=["grid", "lhs", "random"], default="grid", help="sampling method")
+    sweep.add_argument("--linear", action="store_true", help="spread values evenly on a linear rather than log scale")
+    sweep.add_argument("--seed", type=int, default=0, help="seed for lhs and random sampling")
+    sweep.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    sweep.add_argument("--streaming", action="store_true", help="sample simulations sparsely, stop on a blow-up")
+    sweep.add_argument("--measure", action="store_true", help="measure the period and amplitude of oscillators")
+    sweep.add_argument("--savepath", default=None, help=".npz file to save the points and verdicts")
+
+    equivalence = subparsers.add_parser("equivalence",
+                                        help="check that a faster mode gives the verdicts of the reference tests")
+    equivalence.add_argument("path", help="directory of antimony models or model archive")
+    equivalence.add_argument("--alternative", choices=list(VERDICT_MODES), default="streaming",
+                             help="mode compared with the reference")
+    equivalence.add_argument("--golden", default=None,
+                             help="golden file of reference verdicts, golden_verdicts.json in path by default")
+    equivalence.add_argument("--threshold", type=float, default=None,
+                             help="fail (exit code 1) if the fraction of matching verdicts is lower")
+    equivalence.add_argument("--savepath", default=None, help="JSON file to save the report")
+    equivalence.add_argument("--refresh", action="store_true", help="run the reference again on every model")
+
+    plot_ts = subparsers.add_parser("plot-timeseries", help="plot simulations of models")
+    plot_ts.add_argument("input", help="antimony file, directory of antimony files or model archive")
+    plot_ts.add_argument("--start", type=float, default=0, help="start time")
+    plot_ts.add_argument("--end", type=float, default=1, help="end time")
+    plot_ts.add_argument("--numpoints", type=int, default=200, help="number of points")
+    plot_ts.add_argument("--savepath", default=None, help="path to save the figure")
+    plot_ts.add_argument("--page-size", type=int, default=None, help="models per page, one file is saved per page")
+    plot_ts.add_argument("--workers", type=int, default=None, help="number of worker processes for paginated plots")
+    plot_ts.add_argument("--max-points", type=int, default=None, help="maximum points drawn per time series")
+    plot_ts.add_argument("--engine", choices=["roadrunner", "batch"], default="roadrunner",
+                         help="simulate with RoadRunner or many models at once with the batched NumPy integrator")
+
+    prescreen = subparsers.add_parser("prescreen", help="classify trajectories with the batched NumPy integrator")
+    prescreen.add_argument("path", help="directory of antimony models")
+    prescreen.add_argument("--batch-size", type=int, default=64, help="number of models simulated together")
+    prescreen.add_argument("--savepath", default=None, help="JSON file to save the classification of each model")
+
+    plot_fit = subparsers.add_parser("plot-fitness", help="plot fitness trajectories from *_fitness.json files")
+    plot_fit.add_argument("path", help="json file, directory of json files, model archive or fitness store")
+    plot_fit.add_argument("--limit", type=int, default=None, help="maximum number of trajectories")
+    plot_fit.add_argument("--savepath", default=None, help="path to save the figure")
+
+    watch = subparsers.add_parser("watch", help="follow a running evolution and keep a status file and plot up to date")
+    watch.add_argument("path", help="evolution output directory or batch directory")
+    watch.add_argument("--interval", type=float, default=10, help="seconds between updates")
+    watch.add_argument("--status", default=None, help="JSON status file, watch_status.json in path by default")
+    watch.add_argument("--plot", default=None, help="path of the summary plot")
+    watch.add_argument("--plot-interval", type=float, default=60, help="minimum seconds between plots")
+    watch.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    watch.add_argument("--idle-timeout", type=float, default=None,
+                       help="stop when no new trial has appeared for this many seconds")
+
+    pack = subparsers.add_parser("pack-fitness", help="pack *_fitness.json files into a fitness store")
+    pack.add_argument("path", help="directory of json files")
+    pack.add_argument("store", help="fitness store directory, created or appended to")
+
+    pack_archive = subparsers.add_parser("pack-models", help="pack models and their fitness into an archive")
+    pack_archive.add_argument("path", help="directory of antimony models and *_fitness.json files")
+    pack_archive.add_argument("archive", help="model archive directory, created or appended to")
+
+    unpack = subparsers.add_parser("unpack-models", help="write the models of an archive back to a directory")
+    unpack.add_argument("archive", help="model archive directory")
+    unpack.add_argument("destination", help="directory where the models are written")
+
+    args = parser.parse_args(argv)
+    if args.simulation_cache:
+        enable_simulation_cache(args.simulation_cache, max_bytes=int(args.simulation_cache_size * 2 ** 20))
+    if args.adaptive_solver or args.solver_memory:
+        enable_adaptive_solver("fast", memory_path=args.solver_memory)
+    if args.command == "gather":
+        gather_best_models(args.path, args.destination, workers=args.workers)
+    elif args.command == "evaluate" and args.shared:
+        if args.use_index or args.checkpoint or args.verdict_cache or args.profile or args.screen:
+            parser.error("--shared can't be combined with --use-index, --checkpoint, --verdict-cache, --profile or "
+                         "--screen")
+        evaluate_oscillators_shared(args.path, worker=args.worker_id, workers=args.workers, timeout=args.timeout,
+                                    streaming=args.streaming, shard_size=args.shard_size or 16,
+                                    lease_timeout=args.lease_timeout)
+    elif args.command == "evaluate":
+        verdict_cache = VerdictCache(path=args.verdict_cache) if args.verdict_cache else None
+        profiler = StageProfiler() if args.profile else None
+        evaluate_oscillators(args.path, workers=args.workers, timeout=args.timeout, use_index=args.use_index,
+                             streaming=args.streaming, verdict_cache=verdict_cache, checkpoint=args.checkpoint,
+                             profiler=profiler, screen=args.screen, budget=args.budget)
+        if verdict_cache is not None:
+            verdict_cache.save()
+        if profiler is not None:
+            profiler.print_summary()
+            profiler.save(args.profile)
+    elif args.command == "cutoff":
+        evaluate_fitness_cutoff(args.path, args.cutoff, use_index=args.use_index)
+    elif args.command == "sort":
+        sort_by_fitness(args.path, reverse=not args.ascending, use_index=args.use_index)
+    elif args.command == "rank":
+        rank_by_fitness(args.path, k=args.top, reverse=not args.ascending, use_index=args.use_index,
+                        destination=args.destination, view=args.view, score=args.score)
+    elif args.command == "rescore":
+        objective_path = args.objective
+        if objective_path is None:
+            objective_path = read_objective_data_path(args.settings) if args.settings else "DEFAULT"
+        rescore_models(args.path, objective_path=objective_path, name=args.name, metrics=args.metrics,
+                       workers=args.workers, batch_size=args.batch_size)
+    elif args.command == "prune" and args.shared:
+        if args.profile or args.verdict_cache:
+            parser.error("--shared can't be combined with --profile or --verdict-cache")
+        prune_models_shared(args.path, worker=args.worker_id, workers=args.workers, minimal=args.minimal,
+                            max_evaluations=args.max_evaluations, time_limit=args.time_limit, streaming=args.streaming,
+                            shard_size=args.shard_size or 4, lease_timeout=args.lease_timeout, timeout=args.timeout)
+    elif args.command == "prune":
+        profiler = StageProfiler() if args.profile else None
+        verdict_cache = VerdictCache(path=args.verdict_cache) if args.verdict_cache else None
+        prune_models(args.path, workers=args.workers, minimal=args.minimal, max_evaluations=args.max_evaluations,
+                     time_limit=args.time_limit, streaming=args.streaming, profiler=profiler,
+                     verdict_cache=verdict_cache, timeout=args.timeout)
+        if verdict_cache is not None:
+            verdict_cache.save()
+        if profiler is not None:
+            profiler.print_summary()
+            profiler.save(args.profile)
+    elif args.command == "sweep":
+        with open(args.model, "r") as f:
+            astr = f.read()
+        ranges = rate_constant_ranges(astr, names=args.constants, factor=args.factor)
+        sweep_rate_constants(astr, ranges, num=args.num, method=args.method, log=not args.linear, seed=args.seed,
+                             workers=args.workers, streaming=args.streaming, measure=args.measure,
+                             savepath=args.savepath)
+    elif args.command == "equivalence":
+        report = compare_verdicts(args.path, alternative=args.alternative, golden_path=args.golden,
+                                  threshold=args.threshold, savepath=args.savepath, refresh=args.refresh)
+        if not report["passed"]:
+            sys.exit(1)
+    elif args.command == "plot-timeseries":
+        model = args.input
+        if os.path.isfile(model):
+            with open(model, "r") as f:
+                model = f.read()
+        plot_timeseries(model, start=args.start, end=args.end, numpoints=args.numpoints, savepath=args.savepath,
+                        page_size=args.page_size, workers=args.workers, max_points=args.max_points, engine=args.engine)
+    elif args.command == "prescreen":
+        prescreen_oscillators(args.path, batch_size=args.batch_size, savepath=args.savepath)
+    elif args.command == "plot-fitness":
+        plot_fitness(args.path, limit=args.limit, savepath=args.savepath)
+    elif args.command == "watch":
+        watch_evolution(args.path, interval=args.interval, status_path=args.status, plot_path=args.plot,
+                        plot_interval=args.plot_interval, duration=args.duration, idle_timeout=args.idle_timeout)
+    elif args.command == "pack-fitness":
+        pack_fitness_values(args.path, args.store)
+    elif args.command == "pack-models":
+        pack_models(args.path, args.archive)
+    elif args.command == "unpack-models":
+        unpack_models(args.archive, args.destination)
@@ -0,0 +1,60 @@
+import importlib
+import os
+import sys
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is only imported the first time one of its attributes is used, so that helpers that
+    only work with files don't pay for loading tellurium (libroadrunner, libantimony) or matplotlib.
+    """
+
+    def __init__(self, name, setup=None):
+        """
+        :param name: (str) Name of the module
+        :param setup: optional (function), called just before the module is imported
+        """
+        self.name = name
+        self.setup = setup
+        self.module = None
+
+    def load_module(self):
+        """
+        Import the module if it hasn't been imported yet. Not called load, which would hide numpy.load
+        :return: The module
+        """
+        if self.module is None:
+            if self.setup is not None:
+                self.setup()
+            self.module = importlib.import_module(self.name)
+        return self.module
+
+    def __getattr__(self, attr):
+        return getattr(self.load_module(), attr)
+
+
+def has_display():
+    """
+    Check if figures can be shown on screen
+    :return: (bool) False on headless machines
+    """
+    if sys.platform in ["win32", "darwin"]:
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def select_matplotlib_backend():
+    """
+    Use the interactive TkAgg backend when a display is available and the non-interactive Agg backend otherwise.
+    A backend set through the MPLBACKEND environment variable is left alone.
+    :return: None
+    """
+    import matplotlib
+    if os.environ.get("MPLBACKEND"):
+        return
+    matplotlib.use('TkAgg' if has_display() else 'Agg')
+
+
+te = LazyModule("tellurium")
+np = LazyModule("numpy")
+plt = LazyModule("matplotlib.pyplot", setup=select_matplotlib_backend)
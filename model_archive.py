@@ -0,0 +1,328 @@
+import json
+import math
+import os
+
+from lazy_modules import np
+from model_files import (
+    get_model_fitness_from_antimony, is_auxiliary_file, load_fitness_values, read_model_record,
+    strip_verdict_prefix, verdict_file_name)
+
+
+ARCHIVE_INDEX_DTYPE = [("offset", "<i8"), ("length", "<i8"), ("trajectory_offset", "<i8"),
+                       ("trajectory_length", "<i8"), ("fitness", "<f8"), ("verdict", "i1")]
+ARCHIVE_VERDICTS = [None, "success", "repaired", "broken", "fail", "error", "timeout"]
+
+
+def is_model_archive(path):
+    """
+    Check if a path is a model archive written by pack_models
+    :param path: (str) Path to check
+    :return: (bool) True if it is a model archive
+    """
+    return os.path.isfile(os.path.join(path, "index.bin")) and os.path.isfile(os.path.join(path, "ids.json"))
+
+
+class ModelArchive:
+    """
+    Models packed in one append-only data file (models.dat) holding the antimony text of each model followed by its
+    fitness trajectory (float64), with a fixed-width offset index (index.bin: offset and length of the text and of the
+    trajectory, fitness and verdict of each model) and the IDs of the models, their original file names (ids.json).
+    Texts and trajectories are read from memory maps. Verdicts are updated in the index, and a repaired model is
+    appended and its index entry pointed to the new text, so the data file is never rewritten.
+    The IDs are written last when appending, so an interrupted append is ignored and overwritten by the next one.
+    """
+
+    def __init__(self, path, writable=False):
+        """
+        :param path: (str) Path to the archive directory, created if writable and it doesn't exist
+        :param writable: optional (bool), if True, models can be appended and verdicts updated
+        """
+        self.path = path
+        self.writable = writable
+        self.dtype = np.dtype(ARCHIVE_INDEX_DTYPE)
+        self.data_path = os.path.join(path, "models.dat")
+        self.index_path = os.path.join(path, "index.bin")
+        if writable and not is_model_archive(path):
+            os.makedirs(path, exist_ok=True)
+            for filepath in [self.data_path, self.index_path]:
+                open(filepath, "ab").close()
+            self.save_ids([])
+        with open(os.path.join(path, "ids.json"), "r") as f:
+            self.ids = json.load(f)
+        self.positions = {file: i for i, file in enumerate(self.ids)}
+        self.orders = {}
+        self.data = None
+        if writable:
+            # Drop anything left over from an interrupted append
+            with open(self.index_path, "ab") as f:
+                f.truncate(len(self.ids) * self.dtype.itemsize)
+        self.open_index()
+        if writable:
+            ends = np.concatenate([self.index["offset"] + self.index["length"],
+                                   self.index["trajectory_offset"] + 8 * self.index["trajectory_length"], [0]])
+            with open(self.data_path, "ab") as f:
+                f.truncate(int(ends.max()))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.flush()
+        self.index = None
+        self.data = None
+
+    def open_index(self):
+        """
+        Private. Memory map the index entries of the models in ids
+        :return: None
+        """
+        if len(self.ids) == 0:
+            self.index = np.zeros(0, dtype=self.dtype)
+        else:
+            self.index = np.memmap(self.index_path, dtype=self.dtype, mode="r+" if self.writable else "r",
+                                   shape=(len(self.ids),))
+
+    def save_ids(self, ids):
+        """
+        Private. Replace the list of IDs atomically
+        :param ids: list(str) IDs of the models
+        :return: None
+        """
+        tmp_path = os.path.join(self.path, "ids.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(ids, f)
+        os.replace(tmp_path, os.path.join(self.path, "ids.json"))
+
+    def read(self, offset, length):
+        """
+        Private. Read bytes of the data file through its memory map, mapping it again if it has grown
+        :param offset: (int) Offset of the first byte
+        :param length: (int) Number of bytes
+        :return: (numpy.ndarray) uint8 view of the bytes
+        """
+        if self.data is None or offset + length > len(self.data):
+            self.data = np.memmap(self.data_path, dtype=np.uint8, mode="r")
+        return self.data[offset:offset + length]
+
+    def position(self, file):
+        """
+        :param file: (str) ID of a model
+        :return: (int) Position of the model in the archive
+        """
+        return self.positions[file]
+
+    def text(self, file):
+        """
+        :param file: (str) ID of a model
+        :return: (str) Antimony string of the model
+        """
+        entry = self.index[self.position(file)]
+        return self.read(int(entry["offset"]), int(entry["length"])).tobytes().decode()
+
+    def trajectory(self, file):
+        """
+        :param file: (str) ID of a model
+        :return: (numpy.ndarray) Fitness of the top individual for each generation, empty if it wasn't tracked
+        """
+        entry = self.index[self.position(file)]
+        values = self.read(int(entry["trajectory_offset"]), 8 * int(entry["trajectory_length"]))
+        return values.view(np.float64)
+
+    def fitness(self, file):
+        """
+        :param file: (str) ID of a model
+        :return: (float) Fitness of the model, None if the model has no fitness line
+        """
+        fitness = float(self.index[self.position(file)]["fitness"])
+        return None if math.isnan(fitness) else fitness
+
+    def verdict(self, file):
+        """
+        :param file: (str) ID of a model
+        :return: (str) Verdict of the model (see evaluate_model), None if it hasn't been evaluated
+        """
+        return ARCHIVE_VERDICTS[self.index[self.position(file)]["verdict"]]
+
+    def order(self, reverse=True):
+        """
+        Private. Positions of the models sorted by fitness, models without fitness last
+        :param reverse: optional (bool), if True, from the highest to the lowest fitness
+        :return: (numpy.ndarray)
+        """
+        if reverse not in self.orders:
+            fitness = np.asarray(self.index["fitness"])
+            key = np.where(np.isnan(fitness), np.inf, -fitness if reverse else fitness)
+            self.orders[reverse] = np.argsort(key, kind="stable")
+        return self.orders[reverse]
+
+    def ranked(self, reverse=True):
+        """
+        IDs of the models by fitness, models without fitness last
+        :param reverse: optional (bool), if True, from the highest to the lowest fitness
+        :return: list(str)
+        """
+        return [self.ids[i] for i in self.order(reverse)]
+
+    def by_rank(self, rank, reverse=True):
+        """
+        :param rank: (int) Rank of a model by fitness, 0 for the best
+        :param reverse: optional (bool), if True, rank 0 is the highest fitness
+        :return: (str) ID of the model
+        """
+        return self.ids[self.order(reverse)[rank]]
+
+    def append(self, models):
+        """
+        Append models to the archive, skipping IDs that are already in it
+        :param models: iterable of (str, str, list(float) or None, str or None) ID, antimony string, fitness trajectory
+            and verdict of each model
+        :return: (int) The number of models appended
+        """
+        entries = []
+        ids = list(self.ids)
+        with open(self.data_path, "ab") as f:
+            for file, astr, trajectory, verdict in models:
+                if file in self.positions:
+                    continue
+                text = astr.encode()
+                offset = f.tell()
+                f.write(text)
+                f.write(b"\0" * (-f.tell() % 8))  # Keep trajectories aligned for the memory map
+                trajectory = np.asarray(trajectory if trajectory is not None else [], dtype=np.float64)
+                trajectory_offset = f.tell()
+                f.write(trajectory.tobytes())
+                fitness = get_model_fitness_from_antimony(astr)
+                entries.append((offset, len(text), trajectory_offset, len(trajectory),
+                                np.nan if fitness is None else fitness, ARCHIVE_VERDICTS.index(verdict)))
+                self.positions[file] = len(ids)
+                ids.append(file)
+        with open(self.index_path, "ab") as f:
+            f.write(np.array(entries, dtype=self.dtype).tobytes())
+        self.save_ids(ids)
+        self.ids = ids
+        self.orders = {}
+        self.open_index()
+        return len(entries)
+
+    def set_verdict(self, file, verdict, astr=None):
+        """
+        Record the verdict of a model
+        :param file: (str) ID of the model
+        :param verdict: (str) Verdict of the model (see evaluate_model), "error" or "timeout"
+        :param astr: optional (str), repaired antimony string, appended to the data file
+        :return: None
+        """
+        i = self.position(file)
+        if astr is not None:
+            text = astr.encode()
+            with open(self.data_path, "ab") as f:
+                offset = f.tell()
+                f.write(text)
+            fitness = get_model_fitness_from_antimony(astr)
+            self.index["offset"][i] = offset
+            self.index["length"][i] = len(text)
+            self.index["fitness"][i] = np.nan if fitness is None else fitness
+            self.orders = {}
+        self.index["verdict"][i] = ARCHIVE_VERDICTS.index(verdict)
+
+    def rename(self, names):
+        """
+        Change the IDs of models
+        :param names: dict(str: str) New ID of each renamed model
+        :return: None
+        """
+        ids = [names.get(file, file) for file in self.ids]
+        self.save_ids(ids)
+        self.ids = ids
+        self.positions = {file: i for i, file in enumerate(ids)}
+
+    def flush(self):
+        """
+        Write the verdict changes of the index to disk
+        :return: None
+        """
+        if isinstance(self.index, np.memmap):
+            self.index.flush()
+
+
+def pack_models(path, archive_path):
+    """
+    Pack the antimony files of a directory, with their json fitness trajectories ({ID}.ant and {ID}_fitness.json as
+    written by evolve_networks) and the verdicts given by their success_/fail_/... prefixes, into a model archive.
+    Models already in the archive are skipped, so this can be run again as new trials finish.
+    :param path: (str) Path to a directory of antimony models
+    :param archive_path: (str) Path to the archive directory, created if needed
+    :return: (int) The number of models added
+    """
+    files = sorted(file for file in os.listdir(path) if not file.endswith(".json") and not is_auxiliary_file(file))
+    trajectories = {file[:-len("_fitness.json")]: file for file in os.listdir(path) if file.endswith("_fitness.json")}
+
+    def models():
+        for file in files:
+            verdict, name = strip_verdict_prefix(file)
+            stem = os.path.splitext(name)[0]
+            with open(os.path.join(path, file), "r") as f:
+                astr = f.read()
+            trajectory = None
+            if stem in trajectories:
+                trajectory = load_fitness_values(os.path.join(path, trajectories[stem]))
+            yield file, astr, trajectory, verdict
+
+    with ModelArchive(archive_path, writable=True) as archive:
+        added = archive.append(models())
+    print(f"Added {added} models to {archive_path}")
+    return added
+
+
+def unpack_models(archive_path, destination):
+    """
+    Write the models of an archive back to a directory, named with their verdict as evaluate_oscillators would, with
+    their fitness trajectories as {ID}_fitness.json files
+    :param archive_path: (str) Path to the archive directory
+    :param destination: (str) Path to the directory where the models are written, created if needed
+    :return: (int) The number of models written
+    """
+    os.makedirs(destination, exist_ok=True)
+    with ModelArchive(archive_path) as archive:
+        for file in archive.ids:
+            with open(os.path.join(destination, verdict_file_name(file, archive.verdict(file))), "w") as f:
+                f.write(archive.text(file))
+            trajectory = archive.trajectory(file)
+            if len(trajectory) > 0:
+                stem = os.path.splitext(strip_verdict_prefix(file)[1])[0]
+                with open(os.path.join(destination, f"{stem}_fitness.json"), "w") as f:
+                    json.dump({"top_individual_fitness": trajectory.tolist()}, f)
+        count = len(archive)
+    print(f"Wrote {count} models to {destination}")
+    return count
+
+
+def list_model_files(path):
+    """
+    Private function. Names of the models of a directory or a model archive
+    :param path: (str) Path to a directory of antimony models or a model archive
+    :return: list(str) Sorted file names (IDs in an archive, in the order they were packed)
+    """
+    if is_model_archive(path):
+        with ModelArchive(path) as archive:
+            return list(archive.ids)
+    return sorted(file for file in os.listdir(path) if not is_auxiliary_file(file))
+
+
+def read_model_texts(path, files):
+    """
+    Private function. Read the antimony strings of models of a directory or a model archive
+    :param path: (str) Path to a directory of antimony models or a model archive
+    :param files: list(str) File names (IDs in an archive)
+    :return: list(str) Antimony strings, None for models that couldn't be read
+    """
+    if is_model_archive(path):
+        with ModelArchive(path) as archive:
+            return [archive.text(file) for file in files]
+    return [read_model_record(path, file).astr for file in files]
@@ -0,0 +1,110 @@
+import collections
+import json
+import os
+
+# Bookkeeping files kept in a model directory next to the models (see is_auxiliary_file)
+GATHER_MANIFEST_FILENAME = "gather_manifest.json"
+RANKING_MANIFEST_FILENAME = "ranking.json"
+MODEL_INDEX_FILENAME = ".model_index.sqlite"
+EVALUATION_JOURNAL_FILENAME = ".evaluation_journal.jsonl"
+MODEL_SCORES_FILENAME = ".model_scores.sqlite"
+WORK_QUEUE_DIRECTORY = ".work_queue"
+GOLDEN_VERDICTS_FILENAME = "golden_verdicts.json"
+
+
+def is_model_index_file(file):
+    """
+    Check if a file name belongs to the model index (including sqlite journal files)
+    :param file: (str) File name
+    :return: (bool) True if the file is part of the model index
+    """
+    return file.startswith(MODEL_INDEX_FILENAME)
+
+
+def is_auxiliary_file(file):
+    """
+    Check if a file in a model directory is bookkeeping rather than a model (model index, gather or ranking manifest,
+    evaluation journal, work queue, golden verdicts or score table)
+    :param file: (str) File name
+    :return: (bool) True if the file is not a model
+    """
+    return is_model_index_file(file) or file.startswith(MODEL_SCORES_FILENAME) or \
+        file in [GATHER_MANIFEST_FILENAME, RANKING_MANIFEST_FILENAME, EVALUATION_JOURNAL_FILENAME, WORK_QUEUE_DIRECTORY,
+                 GOLDEN_VERDICTS_FILENAME]
+
+
+def get_model_fitness_from_antimony(astr):
+    '''
+    Extracts the fitness from an antimony string
+    :param astr: (str) An antimony string
+    :return: (float) Fitness of the model
+    '''
+    for line in astr.split("\n"):
+        if line.startswith("#fitness"):
+            fitness = line.split(" ")[1]
+            return float(fitness)
+
+
+ModelRecord = collections.namedtuple("ModelRecord", ["file", "astr", "fitness"])
+ModelRecord.__doc__ = """
+A model file read once: its file name, antimony string and fitness (None if the file has no fitness line, and astr is
+None if the file couldn't be read)
+"""
+
+
+def read_model_record(path, file):
+    """
+    Read a model file once, parsing its fitness from the same read
+    :param path: (str) Path to the directory containing the model
+    :param file: (str) File name of the model
+    :return: (ModelRecord)
+    """
+    try:
+        with open(os.path.join(path, file), "r") as f:
+            astr = f.read()
+    except OSError:
+        return ModelRecord(file, None, None)
+    return ModelRecord(file, astr, get_model_fitness_from_antimony(astr))
+
+
+def verdict_file_name(file, verdict):
+    """
+    Private function. Name of a model file once its verdict has been applied
+    :param file: (str) File name of the model
+    :param verdict: (str) Verdict of the model
+    :return: (str) The new file name
+    """
+    if verdict in ["success", "repaired"]:
+        prefix = "success"
+    elif verdict in ["fail", "error", "timeout"]:
+        prefix = verdict
+    else:  # Broken oscillators that couldn't be repaired are left as they are
+        return file
+    if prefix in file:
+        return file
+    return f"{prefix}_{file}"
+
+
+def strip_verdict_prefix(file):
+    """
+    Private function. Split the verdict prefix added by evaluate_oscillators (see verdict_file_name) from a file name
+    :param file: (str) File name
+    :return: (str, str) The verdict ("success", "fail", "error", "timeout" or None) and the file name without it
+    """
+    for verdict in ["success", "fail", "error", "timeout"]:
+        if file.startswith(f"{verdict}_"):
+            return verdict, file[len(verdict) + 1:]
+    return None, file
+
+
+def load_fitness_values(path):
+    """
+    Load a list of the fitness values for each generation
+    :param path: Path to a json file containing the fitness values
+    :return: list(float) fitness values for each generation
+    """
+    if not path.endswith(".json"):
+        raise ValueError("file type must be .json")
+    with open(path, "r") as f:
+        data = json.load(f)
+    return data["top_individual_fitness"]
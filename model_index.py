@@ -0,0 +1,109 @@
+import hashlib
+import os
+import sqlite3
+
+from model_files import get_model_fitness_from_antimony, MODEL_INDEX_FILENAME
+
+
+class ModelIndex:
+    """
+    Persistent per-directory index of model files, stored as a sqlite database inside the directory.
+    For each file it records the size, modification time, content hash, fitness, oscillator verdict and whether the
+    model was repaired. A file whose size and modification time are unchanged is not re-read. A file whose name
+    changed (e.g. after a success_ rename) is matched by its content hash, so verdicts survive renames.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: (str) Path to the directory of antimony models
+        """
+        self.path = path
+        self.conn = sqlite3.connect(os.path.join(path, MODEL_INDEX_FILENAME), check_same_thread=False)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS models (
+                                 name TEXT PRIMARY KEY,
+                                 size INTEGER,
+                                 mtime_ns INTEGER,
+                                 hash TEXT,
+                                 fitness REAL,
+                                 verdict TEXT,
+                                 repaired INTEGER DEFAULT 0)""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS models_hash ON models (hash)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def lookup(self, file):
+        """
+        Get the index record for a file, reading and hashing the file only if it is new or has changed
+        :param file: (str) File name inside the indexed directory
+        :return: (dict) with keys name, size, mtime_ns, hash, fitness, verdict and repaired.
+            verdict is None if the model has not been evaluated yet.
+        """
+        st = os.stat(os.path.join(self.path, file))
+        row = self.conn.execute("SELECT hash, fitness, verdict, repaired FROM models "
+                                "WHERE name = ? AND size = ? AND mtime_ns = ?",
+                                (file, st.st_size, st.st_mtime_ns)).fetchone()
+        if row is None:
+            with open(os.path.join(self.path, file), "r") as f:
+                astr = f.read()
+            content_hash = hashlib.sha256(astr.encode()).hexdigest()
+            fitness = get_model_fitness_from_antimony(astr)
+            # The same content may already have been evaluated under a different name
+            known = self.conn.execute("SELECT verdict, repaired FROM models WHERE hash = ? AND verdict IS NOT NULL",
+                                      (content_hash,)).fetchone()
+            verdict, repaired = known if known else (None, 0)
+            row = (content_hash, fitness, verdict, repaired)
+            self.conn.execute("INSERT OR REPLACE INTO models VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (file, st.st_size, st.st_mtime_ns, *row))
+        return {"name": file, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": row[0], "fitness": row[1],
+                "verdict": row[2], "repaired": bool(row[3])}
+
+    def get_fitness(self, file):
+        """
+        Get the fitness of a model from the index
+        :param file: (str) File name inside the indexed directory
+        :return: (float) Fitness of the model, None if the model has no fitness line
+        """
+        return self.lookup(file)["fitness"]
+
+    def record_verdict(self, file, verdict, repaired=False):
+        """
+        Record the oscillator verdict of a model. The file is re-indexed first, so this should be called after any
+        rewrite of the file
+        :param file: (str) File name inside the indexed directory
+        :param verdict: (str) Verdict of the model, e.g. "success" or "fail"
+        :param repaired: optional (bool), True if the model was repaired
+        :return: None
+        """
+        self.lookup(file)
+        self.conn.execute("UPDATE models SET verdict = ?, repaired = ? WHERE name = ?", (verdict, int(repaired), file))
+
+    def rename(self, file, new_name):
+        """
+        Rename a model file and keep its index record
+        :param file: (str) Current file name inside the indexed directory
+        :param new_name: (str) New file name
+        :return: None
+        """
+        os.rename(os.path.join(self.path, file), os.path.join(self.path, new_name))
+        self.conn.execute("DELETE FROM models WHERE name = ?", (new_name,))
+        self.conn.execute("UPDATE models SET name = ? WHERE name = ?", (new_name, file))
+
+    def prune(self, files):
+        """
+        Remove records of files that no longer exist in the directory
+        :param files: list(str) File names currently in the directory
+        :return: None
+        """
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS current_files (name TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM current_files")
+        self.conn.executemany("INSERT OR IGNORE INTO current_files VALUES (?)", [(file,) for file in files])
+        self.conn.execute("DELETE FROM models WHERE name NOT IN (SELECT name FROM current_files)")
+        self.conn.commit()
@@ -0,0 +1,170 @@
+import collections
+import concurrent.futures
+import itertools
+import multiprocessing
+import re
+
+from lazy_modules import np, te
+from simulation_cache import simulate_model
+from utilities import is_oscillator
+
+
+SweepResult = collections.namedtuple("SweepResult", ["names", "points", "verdicts", "periods", "amplitudes"])
+SweepResult.__doc__ = """
+Result of sweep_rate_constants: the swept rate constants, the parameter points (one row per point, one column per rate
+constant), the verdict at each point (1 oscillator, 0 not an oscillator, -1 the evaluation crashed) and the period and
+amplitude at each point (NaN if not measured)
+"""
+
+
+def rate_constant_ranges(astr, names=None, factor=10):
+    """
+    Ranges around the current values of the rate constants of a model, to be swept with sweep_rate_constants
+    :param astr: (str) Antimony string of the model
+    :param names: optional list(str), rate constants to sweep. By default, every k1, k2, ... written by
+        convert_to_antimony that isn't zero
+    :param factor: optional (float), each range goes from the current value divided by factor to the current value
+        multiplied by factor
+    :return: dict(str: (float, float)) Lowest and highest value of each rate constant
+    """
+    r = te.loada(astr)
+    if names is None:
+        names = [k for k in r.getGlobalParameterIds() if re.fullmatch(r"k\d+", k) and r[k] > 0]
+    return {k: (r[k] / factor, r[k] * factor) for k in names}
+
+
+def sample_rate_constants(ranges, num=10, method="grid", log=True, seed=0):
+    """
+    Choose parameter points in a box of rate constant values
+    :param ranges: dict(str: (float, float)) Lowest and highest value of each rate constant
+    :param num: optional (int), for a grid, the number of values of each rate constant (num ** len(ranges) points in
+        total), otherwise the total number of points
+    :param method: optional (str), "grid", "lhs" (Latin hypercube: each range is cut into num intervals and every
+        interval of every rate constant holds exactly one point) or "random" (uniform)
+    :param log: optional (bool), if True, the values are spread evenly on a log scale, which requires positive ranges
+    :param seed: optional (int), seed of the random number generator for "lhs" and "random"
+    :return: (list(str), numpy.ndarray) The names of the rate constants and the points, shape (points, rate constants)
+    """
+    names = list(ranges)
+    low = np.array([ranges[k][0] for k in names], dtype=float)
+    high = np.array([ranges[k][1] for k in names], dtype=float)
+    if log:
+        if np.any(low <= 0) or np.any(high <= 0):
+            raise ValueError("Rate constant ranges must be positive to be sampled on a log scale")
+        low, high = np.log(low), np.log(high)
+    rng = np.random.default_rng(seed)
+    if method == "grid":
+        axes = np.meshgrid(*[np.linspace(0, 1, num)] * len(names), indexing="ij")
+        unit = np.stack([axis.ravel() for axis in axes], axis=1)
+    elif method == "lhs":
+        strata = rng.permuted(np.tile(np.arange(num), (len(names), 1)), axis=1).T
+        unit = (strata + rng.random((num, len(names)))) / num
+    elif method == "random":
+        unit = rng.random((num, len(names)))
+    else:
+        raise ValueError(f"Unknown sampling method {method}, expected grid, lhs or random")
+    points = low + unit * (high - low)
+    return names, np.exp(points) if log else points
+
+
+def measure_oscillation(r, end=50, numpoints=10001):
+    """
+    Private function. Measure the period and amplitude of an oscillation over the second half of a simulation from
+    the initial state of the model, on the species with the largest mean peak to trough amplitude
+    :param r: RoadRunner model, with its parameters set
+    :param end: optional (float), end time of the simulation
+    :param numpoints: optional (int), number of points of the simulation
+    :return: (float, float) The mean period and amplitude, NaN if no species has at least two peaks and troughs
+    """
+    r.reset()
+    values, names = simulate_model(r, 0, end, numpoints)
+    values = values[len(values) // 2:]
+    slopes = np.diff(values[:, 1:], axis=0)
+    is_peak = (slopes[:-1] > 0) & (slopes[1:] <= 0)
+    is_trough = (slopes[:-1] < 0) & (slopes[1:] >= 0)
+    period, amplitude = np.nan, np.nan
+    for j in range(values.shape[1] - 1):
+        peaks = np.nonzero(is_peak[:, j])[0] + 1
+        troughs = np.nonzero(is_trough[:, j])[0] + 1
+        if len(peaks) < 2 or len(troughs) < 2:
+            continue
+        species_amplitude = np.mean(values[peaks, j + 1]) - np.mean(values[troughs, j + 1])
+        if not species_amplitude <= amplitude:
+            period, amplitude = np.mean(np.diff(values[peaks, 0])), species_amplitude
+    return period, amplitude
+
+
+sweep_worker_model = None  # (antimony string, RoadRunner model, integrator tolerances) of a sweep worker process
+
+
+def sweep_worker(astr, names, points, streaming=False, measure=False):
+    """
+    Private function. Evaluate parameter points of a model. The model is compiled once per process and its rate
+    constants are set in place for each point.
+    :param astr: (str) Antimony string of the model
+    :param names: list(str) Names of the rate constants
+    :param points: (numpy.ndarray) Values of the rate constants, shape (points, rate constants)
+    :param streaming: optional (bool), passed on to is_oscillator
+    :param measure: optional (bool), if True, the period and amplitude of oscillators are measured
+    :return: (numpy.ndarray) Verdict, period and amplitude of each point, shape (points, 3)
+    """
+    global sweep_worker_model
+    if sweep_worker_model is None or sweep_worker_model[0] != astr:
+        r = te.loada(astr)
+        sweep_worker_model = (astr, r, r.integrator.relative_tolerance, r.integrator.absolute_tolerance)
+    _, r, relative_tolerance, absolute_tolerance = sweep_worker_model
+    results = np.full((len(points), 3), np.nan)
+    for i, point in enumerate(points):
+        for k, value in zip(names, point):
+            r[k] = value
+        # is_oscillator may tighten the tolerance, a freshly loaded model would start with the defaults
+        r.integrator.relative_tolerance = relative_tolerance
+        r.integrator.absolute_tolerance = absolute_tolerance
+        try:
+            results[i, 0] = is_oscillator(r, reset_parameters=False, streaming=streaming)
+            if measure and results[i, 0]:
+                results[i, 1:] = measure_oscillation(r)
+        except Exception:
+            results[i, 0] = -1
+    return results
+
+
+def sweep_rate_constants(astr, ranges, num=10, method="grid", log=True, seed=0, workers=None, chunk_size=64,
+                         streaming=False, measure=False, savepath=None):
+    """
+    Map the region of rate constant values in which a model oscillates. Each parameter point is evaluated with
+    is_oscillator on a model compiled once per worker, with its rate constants set in place, so the verdicts are
+    the same as for a model written with those values.
+    :param astr: (str) Antimony string of the model
+    :param ranges: dict(str: (float, float)) Lowest and highest value of each rate constant to sweep, e.g. from
+        rate_constant_ranges. The other rate constants keep their values
+    :param num: optional (int), see sample_rate_constants
+    :param method: optional (str), "grid", "lhs" or "random", see sample_rate_constants
+    :param log: optional (bool), if True, the values are spread evenly on a log scale
+    :param seed: optional (int), seed for "lhs" and "random"
+    :param workers: optional (int), number of worker processes
+    :param chunk_size: optional (int), number of points sent to a worker at once
+    :param streaming: optional (bool), passed on to is_oscillator
+    :param measure: optional (bool), if True, measure the period and amplitude of the oscillators (see
+        measure_oscillation). Points that pass is_oscillator from their steady state eigenvalues alone may not
+        oscillate from their initial state, and get NaN
+    :param savepath: optional (str), save the result to this .npz file
+    :return: (SweepResult) The parameter points and their verdicts, periods and amplitudes
+    """
+    names, points = sample_rate_constants(ranges, num=num, method=method, log=log, seed=seed)
+    chunks = [points[i:i + chunk_size] for i in range(0, len(points), chunk_size)]
+    if workers is not None and workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                    mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(sweep_worker, itertools.repeat(astr), itertools.repeat(names), chunks,
+                                    itertools.repeat(streaming), itertools.repeat(measure)))
+    else:
+        results = [sweep_worker(astr, names, chunk, streaming=streaming, measure=measure) for chunk in chunks]
+    results = np.concatenate(results) if results else np.empty((0, 3))
+    result = SweepResult(names, points, results[:, 0].astype(np.int8), results[:, 1], results[:, 2])
+    print(f"Swept {len(points)} points of {len(names)} rate constants: {np.sum(result.verdicts == 1)} oscillate")
+    if np.any(result.verdicts == -1):
+        print(f"{np.sum(result.verdicts == -1)} points could not be evaluated")
+    if savepath:
+        np.savez_compressed(savepath, **result._asdict())
+    return result
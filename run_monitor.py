@@ -0,0 +1,242 @@
+import json
+import os
+import time
+
+from lazy_modules import np, plt
+from model_files import load_fitness_values
+from utilities import read_fitness_from_tail
+
+
+WATCH_STATUS_FILENAME = "watch_status.json"
+
+
+class EvolutionMonitor:
+    """
+    Running summary of an evolution output directory while run_evolution is still writing to it. Each call to update
+    lists the directory and only reads the files that appeared since the last call: the final model of each trial
+    ({ID}.ant, whose fitness is read from the end of the file) and its fitness trajectory ({ID}_fitness.json, when
+    fitness is tracked). Files are known by name, so trials moved to SUCCESS or FAIL by process_oscillators are not
+    counted twice. Files that are still being written are read again on the next update.
+    Only aggregates are kept: the final fitness of each trial, the best model, and the number of trajectories, mean
+    and best top fitness at each generation.
+    """
+
+    def __init__(self, path, quiet_time=1, settle_time=60):
+        """
+        :param path: (str) Path to an evolution output directory (containing batch_* directories) or a batch directory
+        :param quiet_time: optional (float), models modified less than this many seconds ago are left for the next
+            update, so that a fitness line that is still being written isn't misread
+        :param settle_time: optional (float), seconds after which a model that still has no fitness line is counted
+            as a trial without fitness rather than a file being written
+        """
+        self.path = path
+        self.quiet_time = quiet_time
+        self.settle_time = settle_time
+        self.seen = set()
+        self.fitness = []
+        self.no_fitness = 0
+        self.best_fitness = None
+        self.best_model = None
+        self.trajectory_count = np.zeros(0, dtype=np.int64)
+        self.trajectory_sum = np.zeros(0)
+        self.trajectory_best = np.zeros(0)
+        self.trajectories = 0
+        self.updated = None
+
+    def directories(self):
+        """
+        Private. Directories where run_evolution and process_oscillators write trials
+        :return: list(str) Empty if the output directory doesn't exist yet
+        """
+        if not os.path.isdir(self.path):
+            return []
+        batches = [self.path]
+        with os.scandir(self.path) as entries:
+            batches += sorted(entry.path for entry in entries if entry.name.startswith("batch_") and entry.is_dir())
+        return [os.path.join(batch, sub) for batch in batches for sub in ["", "SUCCESS", "FAIL"]]
+
+    def new_files(self):
+        """
+        Private. List the model and fitness files that haven't been ingested yet
+        :return: list(os.DirEntry)
+        """
+        found = {}
+        for directory in self.directories():
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name in self.seen or entry.name in found:
+                            continue
+                        if entry.name.endswith(".ant") or entry.name.endswith("_fitness.json"):
+                            found[entry.name] = entry
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+        return sorted(found.values(), key=lambda entry: entry.name)
+
+    def update(self):
+        """
+        Ingest the files that appeared since the last update
+        :return: (int) The number of files ingested
+        """
+        ingested = 0
+        for entry in self.new_files():
+            try:
+                if entry.name.endswith(".ant"):
+                    done = self.add_model(entry)
+                else:
+                    done = self.add_trajectory(entry)
+            except FileNotFoundError:  # Moved by process_oscillators, found in its new place next time
+                done = False
+            if done:
+                self.seen.add(entry.name)
+                ingested += 1
+        self.updated = time.time()
+        return ingested
+
+    def add_model(self, entry):
+        """
+        Private. Add the final fitness of a trial
+        :param entry: (os.DirEntry) The model file
+        :return: (bool) False if the file is still being written
+        """
+        age = time.time() - os.stat(entry.path).st_mtime
+        if age < self.quiet_time:
+            return False
+        fitness = read_fitness_from_tail(entry.path)
+        if fitness is None:
+            if age < self.settle_time:
+                return False
+            self.no_fitness += 1
+            return True
+        self.fitness.append(fitness)
+        if self.best_fitness is None or fitness > self.best_fitness:
+            self.best_fitness = fitness
+            self.best_model = entry.name
+        return True
+
+    def add_trajectory(self, entry):
+        """
+        Private. Add the top fitness of each generation of a trial to the per generation aggregates
+        :param entry: (os.DirEntry) The json fitness file
+        :return: (bool) False if the file is still being written
+        """
+        try:
+            values = np.asarray(load_fitness_values(entry.path), dtype=float)
+        except ValueError:  # Incomplete json
+            return False
+        if len(values) > len(self.trajectory_count):
+            grow = len(values) - len(self.trajectory_count)
+            self.trajectory_count = np.concatenate([self.trajectory_count, np.zeros(grow, dtype=np.int64)])
+            self.trajectory_sum = np.concatenate([self.trajectory_sum, np.zeros(grow)])
+            self.trajectory_best = np.concatenate([self.trajectory_best, np.full(grow, -np.inf)])
+        n = len(values)
+        self.trajectory_count[:n] += 1
+        self.trajectory_sum[:n] += values
+        self.trajectory_best[:n] = np.maximum(self.trajectory_best[:n], values)
+        self.trajectories += 1
+        return True
+
+    def status(self, bins=20):
+        """
+        Summary of the run so far
+        :param bins: optional (int), number of bins of the fitness histogram
+        :return: (dict) Number of trials, best fitness and model, fitness percentiles and histogram, and the mean and
+            best top fitness per generation over the trajectories (each generation over the trials that reached it)
+        """
+        fitness = np.asarray(self.fitness)
+        status = {"path": os.path.abspath(self.path), "updated": self.updated,
+                  "trials": len(self.fitness) + self.no_fitness, "trials_without_fitness": self.no_fitness,
+                  "best_fitness": self.best_fitness, "best_model": self.best_model,
+                  "trajectories": self.trajectories}
+        if len(fitness) > 0:
+            counts, edges = np.histogram(fitness, bins=bins)
+            percentiles = np.percentile(fitness, [10, 50, 90]).tolist()
+            status["fitness_percentiles"] = dict(zip(["10", "50", "90"], percentiles))
+            status["fitness_histogram"] = {"counts": counts.tolist(), "edges": edges.tolist()}
+        if self.trajectories > 0:
+            status["mean_top_fitness"] = (self.trajectory_sum / self.trajectory_count).tolist()
+            status["best_top_fitness"] = self.trajectory_best.tolist()
+        return status
+
+    def save_status(self, status_path):
+        """
+        Write the status to a JSON file, replacing it atomically so readers never see a partial file
+        :param status_path: (str) Path of the JSON file
+        :return: None
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(status_path)), exist_ok=True)
+        tmp_path = status_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.status(), f, indent=1)
+        os.replace(tmp_path, status_path)
+
+    def plot(self, savepath, bins=20):
+        """
+        Plot the fitness histogram of the trials and the mean and best top fitness per generation
+        :param savepath: (str) Path to save the figure
+        :param bins: optional (int), number of bins of the histogram
+        :return: None
+        """
+        fig, (left, right) = plt.subplots(1, 2, figsize=(12, 5))
+        if self.fitness:
+            left.hist(self.fitness, bins=bins)
+        left.set_xlabel("Final fitness")
+        left.set_ylabel("Trials")
+        left.set_title(f"{len(self.fitness)} trials, best {self.best_fitness}")
+        if self.trajectories > 0:
+            generations = np.arange(len(self.trajectory_count))
+            right.plot(generations, self.trajectory_sum / self.trajectory_count, label="Mean")
+            right.plot(generations, self.trajectory_best, label="Best")
+            right.legend()
+        right.set_xlabel("Generation")
+        right.set_ylabel("Top fitness")
+        right.set_title(f"Top Fitness Trajectories ({self.trajectories} runs)")
+        fig.savefig(savepath)
+        plt.close(fig)
+
+
+def watch_evolution(path, interval=10, status_path=None, plot_path=None, plot_interval=60, duration=None,
+                    idle_timeout=None):
+    """
+    Follow an evolution output directory while trials are being written, keeping an EvolutionMonitor up to date.
+    The status file is rewritten after each update that found new files and the plot at most every plot_interval
+    seconds, so watching costs little more than listing the directory. Stops on Ctrl+C, or after duration or
+    idle_timeout if given.
+    :param path: (str) Path to an evolution output directory or a batch directory
+    :param interval: optional (float), seconds between updates
+    :param status_path: optional (str), JSON status file, WATCH_STATUS_FILENAME in path by default
+    :param plot_path: optional (str), path of the summary plot. Not plotted by default
+    :param plot_interval: optional (float), minimum number of seconds between two plots
+    :param duration: optional (float), stop after this many seconds
+    :param idle_timeout: optional (float), stop when no new file has appeared for this many seconds
+    :return: (EvolutionMonitor) The monitor, with the final aggregates
+    """
+    status_path = status_path or os.path.join(path, WATCH_STATUS_FILENAME)
+    monitor = EvolutionMonitor(path)
+    start = last_new = time.monotonic()
+    last_plot = None
+    changed = first = True  # The status and plot are written once at the start even if the directory is empty
+    try:
+        while True:
+            now = time.monotonic()
+            if monitor.update() > 0 or first:
+                last_new = now
+                changed = True
+                first = False
+                monitor.save_status(status_path)
+                print(f"{len(monitor.fitness) + monitor.no_fitness} trials, best fitness {monitor.best_fitness}")
+            if plot_path and changed and (last_plot is None or now - last_plot >= plot_interval):
+                monitor.plot(plot_path)
+                last_plot = now
+                changed = False
+            if duration is not None and now - start >= duration:
+                break
+            if idle_timeout is not None and now - last_new >= idle_timeout:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    monitor.save_status(status_path)
+    if plot_path:
+        monitor.plot(plot_path)
+    return monitor
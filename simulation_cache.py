@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import threading
+import weakref
+
+from lazy_modules import np, te
+
+
+SIMULATION_CACHE_ENV = "RNE_SIMULATION_CACHE"  # Environment variables, so spawned worker processes use the cache too
+SIMULATION_CACHE_SIZE_ENV = "RNE_SIMULATION_CACHE_SIZE"
+
+
+class SimulationCache:
+    """
+    On-disk cache of simulation results. Each result is stored as a .npy file of a structured array whose fields are
+    the column names ("time", "[S0]", ...), keyed by a hash of the model (see simulation_content, or its antimony
+    text) and of the time grid, integrator tolerances and selections. Results are read back as memory-mapped arrays.
+    Files are written to a temporary name and renamed into place, so several processes can share a cache directory:
+    readers never see a partial file, and a file evicted while another process has it mapped stays readable to it.
+    Once the cache grows past max_bytes, the least recently used results are deleted.
+    """
+
+    def __init__(self, path, max_bytes=2 ** 30):
+        """
+        :param path: (str) Directory of the cache, created if needed
+        :param max_bytes: optional (int), maximum total size of the cached results
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, content, start, end, numpoints, relative_tolerance, absolute_tolerance, selections):
+        """
+        :param content: (str) Model description, e.g. simulation_content(r) or the antimony string
+        :param start: (float) Starting time for simulation
+        :param end: (float) Ending time for simulation
+        :param numpoints: (int) Number of points for the simulation
+        :param relative_tolerance: (float) Relative tolerance of the integrator
+        :param absolute_tolerance: (float) Absolute tolerance of the integrator
+        :param selections: list(str) Columns of the simulation result
+        :return: (str) The cache key
+        """
+        grid = json.dumps([start, end, numpoints, relative_tolerance, absolute_tolerance, list(selections)])
+        return hashlib.sha256((content + "\n" + grid).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        :param key: (str) Key returned by SimulationCache.key
+        :return: (numpy.memmap, list(str)) or None The result (time in the first column) and the column names, None
+            if the result isn't in the cache
+        """
+        filepath = os.path.join(self.path, key + ".npy")
+        try:
+            result = np.load(filepath, mmap_mode="r")
+            os.utime(filepath)  # Mark the result as recently used
+        except (FileNotFoundError, ValueError):
+            return None  # Not cached, or evicted by another process in the meantime
+        names = list(result.dtype.names)
+        return result.view(np.float64).reshape(len(result), len(names)), names
+
+    def put(self, key, values, names):
+        """
+        Store a result and evict the least recently used results if the cache is too big
+        :param key: (str) Key returned by SimulationCache.key
+        :param values: (numpy.ndarray) Simulation result, one column per name
+        :param names: list(str) Column names
+        :return: None
+        """
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        structured = values.view(np.dtype([(name, np.float64) for name in names])).reshape(-1)
+        temp = os.path.join(self.path, "%s.%d.%d.tmp" % (key, os.getpid(), threading.get_ident()))
+        with open(temp, "wb") as f:
+            np.save(f, structured)
+        os.replace(temp, os.path.join(self.path, key + ".npy"))
+        self.evict()
+
+    def evict(self):
+        """
+        Private. Delete the least recently used results until the cache fits in max_bytes
+        :return: None
+        """
+        entries = []
+        with os.scandir(self.path) as scan:
+            for entry in scan:
+                if entry.name.endswith(".npy"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, filepath in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def enable_simulation_cache(path, max_bytes=None):
+    """
+    Send all simulations of this process, and of worker processes started afterwards, through a SimulationCache
+    :param path: (str) Directory of the cache, None to disable the cache
+    :param max_bytes: optional (int), maximum total size of the cached results, default 1 GiB
+    :return: None
+    """
+    if path is None:
+        os.environ.pop(SIMULATION_CACHE_ENV, None)
+        os.environ.pop(SIMULATION_CACHE_SIZE_ENV, None)
+        return
+    os.environ[SIMULATION_CACHE_ENV] = os.path.abspath(path)
+    if max_bytes is not None:
+        os.environ[SIMULATION_CACHE_SIZE_ENV] = str(max_bytes)
+
+
+simulation_cache = None  # SimulationCache of this process, created from the environment on first use
+
+
+def get_simulation_cache():
+    """
+    Private function. Get the simulation cache enabled with enable_simulation_cache
+    :return: (SimulationCache) or None if no cache is enabled
+    """
+    global simulation_cache
+    path = os.environ.get(SIMULATION_CACHE_ENV)
+    if not path:
+        return None
+    max_bytes = int(os.environ.get(SIMULATION_CACHE_SIZE_ENV, 2 ** 30))
+    if simulation_cache is None or simulation_cache.path != path or simulation_cache.max_bytes != max_bytes:
+        simulation_cache = SimulationCache(path, max_bytes=max_bytes)
+    return simulation_cache
+
+
+model_digests = weakref.WeakKeyDictionary()  # Hash of the SBML each RoadRunner model was loaded from
+
+
+def simulation_content(r):
+    """
+    Private function. Describe what a simulation of a model depends on for the simulation cache, without
+    serializing the model: a hash of the SBML it was loaded from (computed once per model), its current values
+    (which the simulation starts from, and which knockouts and parameter changes act on) and the integrator and step
+    limit
+    :param r: RoadRunner model
+    :return: (str)
+    """
+    digest = model_digests.get(r)
+    if digest is None:
+        digest = model_digests[r] = hashlib.sha256(r.getSBML().encode()).hexdigest()
+    values = np.concatenate([r.model.getFloatingSpeciesConcentrations(), r.model.getBoundarySpeciesConcentrations(),
+                             r.model.getGlobalParameterValues(), r.model.getCompartmentVolumes()])
+    state = hashlib.sha256(np.ascontiguousarray(values, dtype=np.float64).tobytes()).hexdigest()
+    return "%s:%s:%s:%s" % (digest, state, r.integrator.getName(), r.integrator.maximum_num_steps)
+
+
+def simulate_model(r, start, end, numpoints):
+    """
+    Simulate a model like r.simulate(start, end, numpoints), going through the simulation cache if one is enabled
+    (see enable_simulation_cache). On a cache hit the model is left in the final state of the simulation, as if it
+    had been simulated.
+    :param r: RoadRunner model
+    :param start: (float) Starting time for simulation
+    :param end: (float) Ending time for simulation
+    :param numpoints: (int) Number of points for the simulation
+    :return: (numpy.ndarray, list(str)) The result, time in the first column, and the column names
+    """
+    cache = get_simulation_cache()
+    if cache is None:
+        m = r.simulate(start, end, numpoints)
+        return np.array(m), list(m.colnames)
+    key = cache.key(simulation_content(r), start, end, numpoints, r.integrator.relative_tolerance,
+                    r.integrator.absolute_tolerance, r.timeCourseSelections)
+    cached = cache.get(key)
+    if cached is None:
+        m = r.simulate(start, end, numpoints)
+        values, names = np.array(m), list(m.colnames)
+        cache.put(key, values, names)
+        return values, names
+    values, names = cached
+    floating_species = set(r.getFloatingSpeciesIds())
+    for name, value in zip(names, values[-1]):
+        if name.strip("[]") in floating_species:
+            r[name] = value
+    return values, names
+
+
+def simulate_antimony(astr, start, end, numpoints):
+    """
+    Load and simulate an antimony model with the default integrator settings, going through the simulation cache if
+    one is enabled. On a cache hit the model isn't even loaded.
+    :param astr: (str) Antimony string
+    :param start: (float) Starting time for simulation
+    :param end: (float) Ending time for simulation
+    :param numpoints: (int) Number of points for the simulation
+    :return: (numpy.ndarray, list(str)) The result, time in the first column, and the column names
+    """
+    cache = get_simulation_cache()
+    if cache is None:
+        m = te.loada(astr).simulate(start, end, numpoints)
+        return np.array(m), list(m.colnames)
+    # A freshly loaded model always has the default tolerances and selections
+    key = cache.key(astr, start, end, numpoints, None, None, ["default"])
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    m = te.loada(astr).simulate(start, end, numpoints)
+    values, names = np.array(m), list(m.colnames)
+    cache.put(key, values, names)
+    return values, names
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# utilities.py lives at the root of the repository, next to the Julia package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
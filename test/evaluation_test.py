@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+
+import pytest
+
+te = pytest.importorskip("tellurium")
+import utilities as u
+
+MODELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+
+def copy_models(path, names):
+    os.makedirs(path)
+    for name in names:
+        shutil.copy(os.path.join(MODELS, f"{name}.ant"), os.path.join(path, f"{name}.ant"))
+    return str(path)
+
+
+def model_files(path):
+    return sorted(file for file in os.listdir(path) if not u.is_auxiliary_file(file))
+
+
+@pytest.fixture
+def models(tmp_path):
+    path = copy_models(tmp_path / "models", ["oscillator", "repairable", "steady"])
+    with open(os.path.join(path, "garbage.ant"), "w") as f:
+        f.write("this isn't antimony ->")
+    return path
+
+
+def test_serial_and_parallel_evaluations_agree(models, tmp_path):
+    parallel = str(tmp_path / "parallel")
+    shutil.copytree(models, parallel)
+    assert u.evaluate_oscillators(models) == (2, 4)
+    assert u.evaluate_oscillators(parallel, workers=2) == (2, 4)
+    expected = ["error_garbage.ant", "fail_steady.ant", "success_oscillator.ant", "success_repairable.ant"]
+    assert model_files(models) == expected
+    assert model_files(parallel) == expected
+    for file in expected:
+        with open(os.path.join(models, file), "r") as f, open(os.path.join(parallel, file), "r") as g:
+            assert f.read() == g.read()
+
+
+def test_repaired_model_is_rewritten(models):
+    with open(os.path.join(models, "repairable.ant"), "r") as f:
+        astr = f.read()
+    u.evaluate_oscillators(models)
+    with open(os.path.join(models, "success_repairable.ant"), "r") as f:
+        repaired = f.read()
+    assert repaired != astr
+    assert repaired.count("#") > astr.count("#")
+    assert u.get_model_fitness_from_antimony(repaired) == pytest.approx(u.get_model_fitness_from_antimony(astr))
+
+
+def test_journal_ignores_torn_line(tmp_path):
+    journal = u.EvaluationJournal(str(tmp_path))
+    journal.append([("a.ant", "fail", None), ("b.ant", "repaired", "S0 -> S1; k1*S0")])
+    journal.close()
+    with open(os.path.join(str(tmp_path), u.EVALUATION_JOURNAL_FILENAME), "a") as f:
+        f.write('{"file": "c.ant", "verd')
+    journal = u.EvaluationJournal(str(tmp_path))
+    assert journal.torn
+    assert journal.entries["b.ant"]["astr"] == "S0 -> S1; k1*S0"
+    assert "c.ant" not in journal.entries
+    journal.append([("c.ant", "success", None)])
+    journal.close()
+    assert sorted(u.EvaluationJournal(str(tmp_path)).entries) == ["a.ant", "b.ant", "c.ant"]
+    journal.remove()
+    assert not os.path.exists(journal.filepath)
+
+
+def test_checkpoint_resumes_from_journal(tmp_path):
+    path = copy_models(tmp_path / "models", ["oscillator", "steady"])
+    # An interrupted run journaled a verdict for oscillator.ant, and applied the verdict of done.ant. Neither is
+    # evaluated again: oscillator.ant gets the journaled verdict and done.ant, which doesn't parse, is only counted
+    with open(os.path.join(path, "success_done.ant"), "w") as f:
+        f.write("this isn't antimony ->")
+    with open(os.path.join(path, u.EVALUATION_JOURNAL_FILENAME), "w") as f:
+        f.write(json.dumps({"file": "oscillator.ant", "verdict": "fail", "astr": None}) + "\n")
+        f.write(json.dumps({"file": "done.ant", "verdict": "success", "astr": None}) + "\n")
+    assert u.evaluate_oscillators(path, checkpoint=True) == (1, 3)
+    assert model_files(path) == ["fail_oscillator.ant", "fail_steady.ant", "success_done.ant"]
+    assert not os.path.exists(os.path.join(path, u.EVALUATION_JOURNAL_FILENAME))
+
+
+def test_journal_is_ignored_without_checkpoint(tmp_path):
+    path = copy_models(tmp_path / "models", ["oscillator"])
+    with open(os.path.join(path, u.EVALUATION_JOURNAL_FILENAME), "w") as f:
+        f.write(json.dumps({"file": "oscillator.ant", "verdict": "fail", "astr": None}) + "\n")
+    assert u.evaluate_oscillators(path) == (1, 1)
+    assert model_files(path) == ["success_oscillator.ant"]
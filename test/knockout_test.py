@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+te = pytest.importorskip("tellurium")
+import utilities as u
+
+MODELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+
+def read_model(name):
+    with open(os.path.join(MODELS, f"{name}.ant"), "r") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name", ["oscillator", "repairable"])
+def test_knockout_matches_edited_model(name):
+    engine = u.KnockoutEngine(read_model(name))
+    for i in engine.reaction_lines:
+        assert engine.can_knock_out({i})
+        expected = u.is_oscillator(te.loada(engine.materialize({i})))
+        assert engine.is_oscillator({i}) == expected
+
+
+def test_knockout_reloads_when_a_species_would_disappear():
+    # Knocking out J1 leaves C in no reaction, reloading the edited model turns it into a parameter
+    astr = "J0: A -> B; k0*A\nJ1: B -> C; k1*B\nJ2: B -> A; k2*B\nk0 = 1; k1 = 1; k2 = 1\nA = 1; B = 0; C = 0"
+    engine = u.KnockoutEngine(astr)
+    assert engine.can_knock_out({2})
+    assert not engine.can_knock_out({1})
+    assert not engine.is_oscillator({1})
+    # Unless it is declared as a species
+    engine = u.KnockoutEngine("species A, B, C\n" + astr)
+    assert engine.can_knock_out({engine.reaction_lines[1]})
+
+
+def test_knockout_reloads_with_a_shared_rate_constant():
+    engine = u.KnockoutEngine("J0: A -> B; k*A\nJ1: B -> A; k*B\nk = 1\nA = 1; B = 0")
+    assert engine.rate_constants == {}
+    assert not engine.can_knock_out({0})
+
+
+def test_materialize_comments_out_reactions():
+    astr = read_model("oscillator")
+    lines = u.KnockoutEngine(astr).materialize({0, 2}).split("\n")
+    assert lines[0] == "#" + astr.split("\n")[0]
+    assert lines[1] == astr.split("\n")[1]
+    assert lines[2] == "#" + astr.split("\n")[2]
+
+
+@pytest.mark.parametrize("name", ["repairable", "broken"])
+def test_fix_model_compile_once_matches_string_edits(name):
+    astr = read_model(name)
+    expected = u.fix_model(astr, fitness=0.5, compile_once=False)
+    assert u.fix_model(astr, fitness=0.5, compile_once=True) == expected
+
+
+def test_prune_compile_once_matches_string_edits():
+    astr = read_model("oscillator")
+    expected = u.prune_antimony_model(astr, compile_once=False)
+    assert expected[0] > 0
+    assert u.prune_antimony_model(astr, compile_once=True) == expected
+
+
+def test_prune_with_verdict_cache_matches_uncached():
+    astr = read_model("oscillator")
+    cache = u.VerdictCache()
+    expected = u.prune_antimony_model(astr)
+    assert u.prune_antimony_model(astr, verdict_cache=cache) == expected
+    assert cache.misses > 0
+    # Every knockout of the second pass is found in the cache
+    misses = cache.misses
+    assert u.prune_antimony_model(astr, verdict_cache=cache) == expected
+    assert cache.misses == misses
@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+import utilities as u
+
+MODELS = {
+    "success_a.ant": "S0 -> S1; k1*S0\nk1 = 1\nS0 = 1\nS1 = 0\n\n#fitness: 0.5",
+    "fail_b.ant": "S0 -> S1; k1*S0\nk1 = 2\nS0 = 1\nS1 = 0\n\n#fitness: 0.75",
+    "c.ant": "S0 -> S1; k1*S0\nk1 = 3\nS0 = 1\nS1 = 0",
+}
+TRAJECTORY = [0.1, 0.25, 0.5]
+
+
+@pytest.fixture
+def archive_path(tmp_path):
+    path = str(tmp_path / "models")
+    os.makedirs(path)
+    for file, astr in MODELS.items():
+        with open(os.path.join(path, file), "w") as f:
+            f.write(astr)
+    with open(os.path.join(path, "a_fitness.json"), "w") as f:
+        json.dump({"top_individual_fitness": TRAJECTORY}, f)
+    archive_path = str(tmp_path / "archive")
+    assert u.pack_models(path, archive_path) == 3
+    return archive_path
+
+
+def test_pack_models(archive_path):
+    assert u.is_model_archive(archive_path)
+    with u.ModelArchive(archive_path) as archive:
+        assert archive.ids == ["c.ant", "fail_b.ant", "success_a.ant"]
+        for file, astr in MODELS.items():
+            assert archive.text(file) == astr
+        assert archive.trajectory("success_a.ant").tolist() == TRAJECTORY
+        assert len(archive.trajectory("c.ant")) == 0
+        assert archive.fitness("fail_b.ant") == 0.75
+        assert archive.fitness("c.ant") is None
+        assert [archive.verdict(file) for file in archive.ids] == [None, "fail", "success"]
+        assert archive.ranked() == ["fail_b.ant", "success_a.ant", "c.ant"]
+
+
+def test_pack_models_again_skips_packed_models(archive_path, tmp_path):
+    assert u.pack_models(str(tmp_path / "models"), archive_path) == 0
+
+
+def test_set_verdict(archive_path):
+    repaired = "#S0 -> S1; k1*S0\nk1 = 3\nS0 = 1\nS1 = 0\n#fitness: 0.9"
+    with u.ModelArchive(archive_path, writable=True) as archive:
+        archive.set_verdict("c.ant", "repaired", astr=repaired)
+        archive.flush()
+    with u.ModelArchive(archive_path) as archive:
+        assert archive.verdict("c.ant") == "repaired"
+        assert archive.text("c.ant") == repaired
+        assert archive.fitness("c.ant") == 0.9
+        assert archive.text("success_a.ant") == MODELS["success_a.ant"]
+
+
+def test_unpack_models_round_trip(archive_path, tmp_path):
+    destination = str(tmp_path / "unpacked")
+    assert u.unpack_models(archive_path, destination) == 3
+    assert sorted(os.listdir(destination)) == sorted(list(MODELS) + ["a_fitness.json"])
+    for file, astr in MODELS.items():
+        with open(os.path.join(destination, file), "r") as f:
+            assert f.read() == astr
+    assert u.load_fitness_values(os.path.join(destination, "a_fitness.json")) == TRAJECTORY
+
+
+def test_evaluate_archive_records_verdicts(archive_path):
+    pytest.importorskip("tellurium")
+    # The packed verdicts are kept, only c.ant is evaluated
+    assert u.evaluate_oscillators(archive_path) == (1, 3)
+    with u.ModelArchive(archive_path) as archive:
+        assert [archive.verdict(file) for file in archive.ids] == ["fail", "fail", "success"]
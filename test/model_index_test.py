@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import utilities as u
+
+ASTR = "S0 -> S1; k1*S0\nk1 = 1\nS0 = 1\nS1 = 0\n\n#fitness: 0.25"
+
+
+@pytest.fixture
+def index(tmp_path):
+    with open(os.path.join(str(tmp_path), "a.ant"), "w") as f:
+        f.write(ASTR)
+    with u.ModelIndex(str(tmp_path)) as index:
+        yield index
+
+
+def test_lookup_reads_fitness(index):
+    record = index.lookup("a.ant")
+    assert record["fitness"] == pytest.approx(0.25)
+    assert record["verdict"] is None
+    assert not record["repaired"]
+
+
+def test_verdict_is_kept_until_the_file_changes(index):
+    index.record_verdict("a.ant", "fail")
+    assert index.lookup("a.ant")["verdict"] == "fail"
+    with open(os.path.join(index.path, "a.ant"), "w") as f:
+        f.write(ASTR.replace("k1 = 1", "k1 = 2"))
+    os.utime(os.path.join(index.path, "a.ant"), ns=(0, 0))  # A new modification time even on coarse clocks
+    assert index.lookup("a.ant")["verdict"] is None
+
+
+def test_verdict_follows_renamed_file(index):
+    index.record_verdict("a.ant", "repaired", repaired=True)
+    index.rename("a.ant", "success_a.ant")
+    record = index.lookup("success_a.ant")
+    assert (record["verdict"], record["repaired"]) == ("repaired", True)
+    # A copy under another name is matched by its content
+    with open(os.path.join(index.path, "b.ant"), "w") as f:
+        f.write(ASTR)
+    assert index.lookup("b.ant")["verdict"] == "repaired"
+
+
+def test_prune_drops_missing_files(index):
+    index.record_verdict("a.ant", "fail")
+    os.remove(os.path.join(index.path, "a.ant"))
+    index.prune([])
+    assert index.conn.execute("SELECT COUNT(*) FROM models").fetchone()[0] == 0
+
+
+def test_index_persists(tmp_path):
+    with open(os.path.join(str(tmp_path), "a.ant"), "w") as f:
+        f.write(ASTR)
+    with u.ModelIndex(str(tmp_path)) as index:
+        index.record_verdict("a.ant", "success")
+    with u.ModelIndex(str(tmp_path)) as index:
+        assert index.lookup("a.ant")["verdict"] == "success"
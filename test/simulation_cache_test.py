@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pytest
+
+te = pytest.importorskip("tellurium")
+import utilities as u
+
+ASTR = """
+J0: S0 -> S1; k0*S0
+J1: S1 -> S0; k1*S1
+k0 = 1; k1 = 0.5
+S0 = 10; S1 = 0
+"""
+
+
+@pytest.fixture
+def cache(tmp_path):
+    u.enable_simulation_cache(str(tmp_path))
+    yield u.get_simulation_cache()
+    u.enable_simulation_cache(None)
+
+
+def cached_results(cache):
+    return len([file for file in os.listdir(cache.path) if file.endswith(".npy")])
+
+
+def test_cache_hit_matches_simulation(cache):
+    expected = np.array(te.loada(ASTR).simulate(0, 10, 101))
+    r = te.loada(ASTR)
+    first, names = u.simulate_model(r, 0, 10, 101)
+    r.resetAll()
+    second, _ = u.simulate_model(r, 0, 10, 101)
+    assert cached_results(cache) == 1
+    assert np.allclose(first, expected)
+    assert np.allclose(second, expected)
+    # The model is left in the final state, as if it had been simulated
+    assert r["[S0]"] == pytest.approx(expected[-1, names.index("[S0]")])
+
+
+def test_cache_key_follows_parameters(cache):
+    r = te.loada(ASTR)
+    u.simulate_model(r, 0, 10, 101)
+    r.resetAll()
+    r["k0"] = 2
+    values, _ = u.simulate_model(r, 0, 10, 101)
+    assert cached_results(cache) == 2
+    r.resetAll()
+    r["k0"] = 2
+    assert np.allclose(values, np.array(r.simulate(0, 10, 101)))
+
+
+def test_cache_key_follows_initial_values(cache):
+    r = te.loada(ASTR)
+    u.simulate_model(r, 0, 10, 101)
+    r.resetAll()
+    r["S1"] = 5
+    u.simulate_model(r, 0, 10, 101)
+    assert cached_results(cache) == 2
+
+
+def test_cache_key_follows_integrator_settings(cache):
+    r = te.loada(ASTR)
+    u.simulate_model(r, 0, 10, 101)
+    r.resetAll()
+    r.integrator.maximum_num_steps = 1000
+    u.simulate_model(r, 0, 10, 101)
+    r.resetAll()
+    r.integrator.relative_tolerance = 1e-10
+    u.simulate_model(r, 0, 10, 101)
+    assert cached_results(cache) == 3
+
+
+def test_copies_of_a_model_share_results(cache):
+    u.simulate_model(te.loada(ASTR), 0, 10, 101)
+    u.simulate_model(te.loada(ASTR), 0, 10, 101)
+    assert cached_results(cache) == 1
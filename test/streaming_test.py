@@ -0,0 +1,51 @@
+import pytest
+
+te = pytest.importorskip("tellurium")
+import utilities as u
+
+
+def brusselator(b, x=1.001):
+    # Hopf bifurcation at b = 2: damped oscillations below it, a limit cycle above it
+    return f"""
+    J0: -> X; k0
+    J1: 2 X + Y -> 3 X; k1*X*X*Y
+    J2: X -> Y; k2*X
+    J3: X -> ; k3*X
+    k0 = 1; k1 = 1; k2 = {b}; k3 = 1
+    X = {x}; Y = {b}
+    """
+
+
+def test_streaming_detects_damped_oscillator_as_oscillating():
+    # Decays by less than the amplitude tolerance over three cycles, so the streaming detector is fooled
+    r = te.loada(brusselator(1.995))
+    assert u.detect_oscillation_streaming(r) == "oscillating"
+    assert r.model.getTime() < 50
+
+
+def test_streaming_damped_oscillator_verdict_matches_full_simulation():
+    astr = brusselator(1.995)
+    assert not u.is_oscillator(te.loada(astr))
+    assert u.is_oscillator(te.loada(astr), streaming=True) == u.is_oscillator(te.loada(astr))
+
+
+@pytest.mark.parametrize("b", [1.5, 1.995, 3])
+def test_streaming_verdict_matches_full_simulation(b):
+    astr = brusselator(b, x=1.5)
+    assert u.is_oscillator(te.loada(astr), streaming=True) == u.is_oscillator(te.loada(astr))
+
+
+def test_run_to_end_leaves_the_state_of_a_full_simulation():
+    r = te.loada(brusselator(1.995))
+    assert u.detect_oscillation_streaming(r, run_to_end=True) == "oscillating"
+    streamed = r.model.getFloatingSpeciesConcentrations()
+    assert r.model.getTime() == pytest.approx(50)
+    r.resetAll()
+    r.simulate(0, 50, 100000)
+    assert streamed == pytest.approx(r.model.getFloatingSpeciesConcentrations(), rel=1e-4)
+
+
+def test_streaming_stops_early_on_blow_up():
+    r = te.loada("J0: X -> 2 X; k*X; k = 5; X = 1")
+    assert u.detect_oscillation_streaming(r) == "diverged"
+    assert r.model.getTime() < 50
@@ -0,0 +1,101 @@
+import json
+
+import utilities as u
+
+ASTR = """
+J0: S0 + S1 -> 2 S1; k0*S0*S1
+J1: S1 -> S2; k1*S1
+J2: S2 -> S0; k2*S2
+k0 = 1.5
+k1 = 0.25
+k2 = 3
+S0 = 1
+S1 = 2
+S2 = 3
+"""
+
+# The same network with the species renamed and the reactions and declarations in another order
+RELABELED = """
+R2: C -> A; k2*C
+R0: A + B -> 2 B; k0*A*B
+R1: B -> C; k1*B
+k2 = 3
+k0 = 1.5
+k1 = 0.25
+A = 1
+C = 3
+B = 2
+"""
+
+
+def test_relabeled_network_has_the_same_key():
+    assert u.canonical_network(ASTR)[0] == u.canonical_network(RELABELED)[0]
+
+
+def test_labels_map_equivalent_species_together():
+    labels = u.canonical_network(ASTR)[1]
+    relabeled = u.canonical_network(RELABELED)[1]
+    assert [labels["S0"], labels["S1"], labels["S2"]] == [relabeled["A"], relabeled["B"], relabeled["C"]]
+
+
+def test_rate_constants_distinguish_networks():
+    other = ASTR.replace("k1 = 0.25", "k1 = 0.26")
+    assert u.canonical_network(ASTR)[0] != u.canonical_network(other)[0]
+
+
+def test_initial_concentrations_distinguish_networks():
+    other = ASTR.replace("S2 = 3", "S2 = 4")
+    assert u.canonical_network(ASTR)[0] != u.canonical_network(other)[0]
+
+
+def test_rounding_below_precision_gives_the_same_key():
+    other = ASTR.replace("k1 = 0.25", "k1 = 0.250000000000001")
+    assert u.canonical_network(ASTR)[0] == u.canonical_network(other)[0]
+    assert u.canonical_network(ASTR, precision=None)[0] != u.canonical_network(other, precision=None)[0]
+
+
+def test_symmetric_species_are_permuted():
+    # S0 and S1 can't be told apart by their roles, so both orderings are tried
+    astr = "J0: S0 -> S1; k0*S0\nJ1: S1 -> S0; k1*S1\nk0 = 1\nk1 = 1\nS0 = 1\nS1 = 1"
+    swapped = "J0: S1 -> S0; k0*S1\nJ1: S0 -> S1; k1*S0\nk0 = 1\nk1 = 1\nS1 = 1\nS0 = 1"
+    assert u.canonical_network(astr)[0] == u.canonical_network(swapped)[0]
+
+
+def test_non_mass_action_network_is_not_canonicalized():
+    assert u.canonical_network("J0: S0 -> S1; Vm*S0/(Km + S0)\nVm = 1; Km = 1\nS0 = 1; S1 = 0") is None
+    assert u.VerdictCache().key("evaluate", "J0: S0 -> S1; Vm*S0/(Km + S0)\nVm = 1; Km = 1") == (None, None)
+
+
+def test_cache_shares_verdicts_between_relabeled_networks():
+    cache = u.VerdictCache()
+    key, _ = cache.key("evaluate", ASTR)
+    assert cache.get(key) is None
+    cache.put(key, {"verdict": "fail"})
+    assert cache.get(cache.key("evaluate", RELABELED)[0]) == {"verdict": "fail"}
+    assert cache.get(cache.key("oscillator", RELABELED)[0]) is None  # Verdicts of another kind aren't shared
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = u.VerdictCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_cache_save_and_load(tmp_path):
+    path = str(tmp_path / "verdicts.json")
+    cache = u.VerdictCache(path=path)
+    cache.put(cache.key("evaluate", ASTR)[0], {"verdict": "success"})
+    cache.save()
+    loaded = u.VerdictCache(path=path)
+    assert loaded.get(loaded.key("evaluate", RELABELED)[0]) == {"verdict": "success"}
+    # Verdicts saved with another precision don't have comparable keys
+    assert len(u.VerdictCache(precision=6, path=path)) == 0
+    with open(path, "r") as f:
+        assert json.load(f)["precision"] == 12
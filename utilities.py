@@ -1,58 +1,187 @@
-import tellurium as te
 import math
 import os
-import matplotlib
 import json
+import collections
+import re
+import itertools
+import heapq
+import hashlib
+import shutil
+import sqlite3
+import importlib
+import contextlib
+import multiprocessing
+import concurrent.futures
+import time
+import threading
+import queue
+from multiprocessing.connection import wait
 
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
+# Everything these modules define is also available from this one, e.g. utilities.ModelArchive
+from lazy_modules import LazyModule, has_display, select_matplotlib_backend, te, np, plt
+from model_files import (
+    GATHER_MANIFEST_FILENAME, RANKING_MANIFEST_FILENAME, MODEL_INDEX_FILENAME, EVALUATION_JOURNAL_FILENAME,
+    MODEL_SCORES_FILENAME, WORK_QUEUE_DIRECTORY, GOLDEN_VERDICTS_FILENAME, is_model_index_file, is_auxiliary_file,
+    get_model_fitness_from_antimony, ModelRecord, read_model_record, verdict_file_name, strip_verdict_prefix,
+    load_fitness_values)
+from model_index import ModelIndex
+from verdict_cache import (
+    parse_reaction_line, parse_mass_action_network, quantize, canonical_reaction, canonical_network, VerdictCache)
+from simulation_cache import (
+    SIMULATION_CACHE_ENV, SIMULATION_CACHE_SIZE_ENV, SimulationCache, enable_simulation_cache, get_simulation_cache,
+    simulation_content, simulate_model, simulate_antimony)
+from model_archive import (
+    ARCHIVE_INDEX_DTYPE, ARCHIVE_VERDICTS, is_model_archive, ModelArchive, pack_models, unpack_models,
+    list_model_files, read_model_texts)
 
 
-def gather_best_models(path, destination):
+def gather_best_models(path, destination, workers=None):
     """
     Get models from numerous subdirectories and put all the antimony files in one place.
     Useful if the models were generated using the previous default write out which put final models under several
-    layers of subdirectories
+    layers of subdirectories.
+    Models are identified by a hash of their content, so a network found by several trials is stored only once, and a
+    name collision between different networks never overwrites a model. A manifest mapping every original trial path
+    to its gathered file is written to the destination (GATHER_MANIFEST_FILENAME) and extended by later gathers.
     :param path: (str) Path to the parent directory containing subdirectories for each model.
         E.g. batch_2024-05-31_122344xyz or results_20240531_122344
     :param destination: (str) Path to directory where models will be moved
-    :return: None
+    :param workers: optional (int), Number of threads used to walk the trial directories. Default is os.cpu_count()
+    :return: (dict) The manifest: original path -> {"file": gathered file name, "hash": content hash,
+        "duplicate": True if the model was already in the destination}
     """
     if not os.path.exists(destination):
         os.makedirs(destination)
-    if os.path.basename(path).startswith("batch"):
-        fullpath = path
-        # if os.path.isdir(os.path.join(path, dir, dir)):
-        #     fullpath = os.path.join(path, dir, dir)
-        # else:
-        #     fullpath = os.path.join(path, dir)
-    elif os.path.basename(path).startswith("results"):
+    if os.path.basename(path).startswith("results"):
         fullpath = os.path.join(path, "SUCCESS")
-    rename_and_move_models(fullpath, destination)
+    else:
+        fullpath = path
+    return rename_and_move_models(fullpath, destination, workers=workers)
+
+
+def find_best_model(trial_dir):
+    """
+    Private function to help in gathering the best models. Find the best model of a trial directory and hash it
+    :param trial_dir: (str) Path to a trial directory containing a final_models directory
+    :return: (str, str, str) or None Path to the model, gathered file name and content hash. None if the trial has no
+        best model
+    """
+    try:
+        with os.scandir(os.path.join(trial_dir, "final_models")) as entries:
+            for entry in entries:
+                if entry.name.startswith("bestmodel") and entry.is_file():
+                    name = entry.name.split("_")[1]  # Remove "bestmodel" from name
+                    if not name.endswith(".ant"):
+                        name += ".ant"  # add the antimony extension if not there already
+                    with open(entry.path, "rb") as f:
+                        content_hash = hashlib.sha256(f.read()).hexdigest()
+                    return entry.path, name, content_hash
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return None
+
+
+def move_without_overwrite(source, destination):
+    """
+    Private function. Atomically move a file, failing instead of replacing an existing destination file
+    :param source: (str) Path to the file to move
+    :param destination: (str) Path to move it to
+    :return: (bool) False if the destination already exists
+    """
+    try:
+        os.link(source, destination)
+    except FileExistsError:
+        return False
+    except OSError:
+        # Hard links are not possible across file systems (or on some file systems at all): copy next to the
+        # destination first so that the final step is still a single atomic operation.
+        temp = "%s.%d.tmp" % (destination, os.getpid())
+        shutil.copy2(source, temp)
+        try:
+            os.link(temp, destination)
+        except FileExistsError:
+            os.remove(temp)
+            return False
+        except OSError:
+            try:
+                os.close(os.open(destination, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                os.remove(temp)
+                return False
+            os.replace(temp, destination)
+        else:
+            os.remove(temp)
+    os.remove(source)
+    return True
 
 
-def rename_and_move_models(fullpath, destination):
+def read_gather_manifest(destination):
+    """
+    Load the manifest of a directory of gathered models
+    :param destination: (str) Path to the directory of gathered models
+    :return: (dict) original path -> {"file", "hash", "duplicate"}, empty if there is no manifest
+    """
+    manifest_path = os.path.join(destination, GATHER_MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def rename_and_move_models(fullpath, destination, workers=None):
     """
     Private function to help in gathering the best models
     :param path: (str) path with final_models directory two layers below it.
         eg. batch_2024-05-31_122344xyz for batch_2024-05-31_122344xyz/batch_2024-05-31_122344xyz/final_models
         or results_20240531_122344 for results_20240531_122344/20240522_121431rK3/final_models
     :param destination: (str) path to directory where models will be moved.
-    :return: None
+    :param workers: optional (int), Number of threads used to walk the trial directories
+    :return: (dict) The updated manifest
     """
-    for dir in os.listdir(fullpath):
-        try:
-            model_dir = os.path.join(fullpath, dir, "final_models")
-            for model in os.listdir(model_dir):
-                if model.startswith("bestmodel"):
-                    name = model.split("_")[1]  # Remove "bestmodel" from name
-                    if not model.endswith(".ant"):
-                        name += ".ant"  # add the antimony extension if not there already
-                    os.rename(os.path.join(model_dir, model), os.path.join(destination, name))
-                    # os.replace(os.path.join(model_dir, name), os.path.join(destination, name))
+    manifest = read_gather_manifest(destination)
+    # Hashes of models already in the destination, so gathering several batches into one place still dedupes
+    known_hashes = {entry["hash"]: entry["file"] for entry in manifest.values()
+                    if os.path.exists(os.path.join(destination, entry["file"]))}
+    with os.scandir(destination) as entries:
+        for entry in entries:
+            if entry.name.endswith(".ant") and entry.name not in known_hashes.values():
+                with open(entry.path, "rb") as f:
+                    known_hashes.setdefault(hashlib.sha256(f.read()).hexdigest(), entry.name)
+
+    with os.scandir(fullpath) as entries:
+        trial_dirs = sorted(entry.path for entry in entries if entry.is_dir())
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        found = list(executor.map(find_best_model, trial_dirs))
+
+    moved, duplicates = 0, 0
+    for trial_dir, result in zip(trial_dirs, found):
+        if result is None:
+            continue
+        model_path, name, content_hash = result
+        duplicate = content_hash in known_hashes
+        if duplicate:
+            os.remove(model_path)
+            duplicates += 1
+        else:
+            root, ext = os.path.splitext(name)
+            candidates = [name, "%s_%s%s" % (root, content_hash[:8], ext), "%s_%s%s" % (root, content_hash, ext)]
+            for name in candidates:
+                if move_without_overwrite(model_path, os.path.join(destination, name)):
                     break
-        except FileNotFoundError:
-            pass
+            else:
+                raise FileExistsError("Could not find a free name for %s in %s" % (model_path, destination))
+            known_hashes[content_hash] = name
+            moved += 1
+        manifest[os.path.abspath(model_path)] = {"file": known_hashes[content_hash], "hash": content_hash,
+                                                 "duplicate": duplicate}
+
+    manifest_path = os.path.join(destination, GATHER_MANIFEST_FILENAME)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    print("Gathered %d models from %d trial directories (%d duplicates, %d without a best model)"
+          % (moved, len(trial_dirs), duplicates, found.count(None)))
+    return manifest
 
 
 def load_model(path):
@@ -67,6 +196,665 @@ def load_model(path):
     return r
 
 
+#--------------------------------------------------
+# Batched Mass-Action Simulation
+#-------------------------------------------------
+
+# Coefficients of the fourth order Rosenbrock method with an embedded third order error estimate of Shampine (1982),
+# as used by Numerical Recipes' stiff()
+ROSENBROCK_GAMMA = 1 / 2
+ROSENBROCK_A = {21: 2, 31: 48 / 25, 32: 6 / 25}
+ROSENBROCK_C = {21: -8, 31: 372 / 25, 32: 12 / 5, 41: -112 / 125, 42: -54 / 125, 43: -2 / 5}
+ROSENBROCK_B = (19 / 9, 1 / 2, 25 / 108, 125 / 108)
+ROSENBROCK_E = (17 / 54, 7 / 36, 0, 125 / 108)
+
+
+class MassActionBatch:
+    """
+    A batch of mass-action networks (see parse_mass_action_network) stored as stacked arrays, so that all of them are
+    integrated at once with NumPy instead of compiling and simulating each one in RoadRunner. Networks with fewer
+    species or reactions than the largest one are padded with species that never change and reactions with a rate
+    constant of 0.
+    The state of each network is an array of its floating species (in RoadRunner's order), its boundary species, the
+    padding and a last entry that is always 1, which stands in for the missing reactants of reactions of order less
+    than the largest one.
+    """
+
+    def __init__(self, networks):
+        """
+        :param networks: list(dict) Networks as returned by parse_mass_action_network
+        """
+        self.names = [[s for s in network["species"] if s not in network["boundary"]] for network in networks]
+        nspecies = max([len(network["species"]) for network in networks], default=0)
+        nreactions = max([len(network["reactions"]) for network in networks], default=0)
+        order = max([len(reactants) for network in networks for reactants, _, _ in network["reactions"]], default=0)
+        self.size = nspecies + 1
+        self.initial = np.zeros((len(networks), self.size))
+        self.initial[:, -1] = 1
+        self.constants = np.zeros((len(networks), nreactions))
+        self.reactants = np.full((len(networks), nreactions, order), nspecies)
+        self.stoichiometry = np.zeros((len(networks), nreactions, self.size))
+        for b, network in enumerate(networks):
+            columns = self.names[b] + [s for s in network["species"] if s in network["boundary"]]
+            index = {s: i for i, s in enumerate(columns)}
+            self.initial[b, :len(columns)] = [network["species"][s] for s in columns]
+            for r, (reactants, products, k) in enumerate(network["reactions"]):
+                self.constants[b, r] = k
+                self.reactants[b, r, :len(reactants)] = [index[s] for s in reactants]
+                for s in reactants:
+                    if s not in network["boundary"]:
+                        self.stoichiometry[b, r, index[s]] -= 1
+                for s in products:
+                    if s not in network["boundary"]:
+                        self.stoichiometry[b, r, index[s]] += 1
+        self.onehot = (self.reactants[..., None] == np.arange(self.size)).astype(float)
+
+    def subset(self, rows):
+        """
+        Private function. Gather the arrays of some of the networks, so that integrating them doesn't index the whole
+        batch at every step
+        :param rows: (numpy.ndarray) Indices of the networks
+        :return: (tuple) Arrays used by rates_of_change and jacobian
+        """
+        gather = self.reactants[rows] + (np.arange(len(rows)) * self.size)[:, None, None]
+        others = [[i for i in range(gather.shape[2]) if i != m] for m in range(gather.shape[2])]
+        return self.constants[rows], gather, self.stoichiometry[rows], self.onehot[rows], others
+
+    def rates_of_change(self, y, system):
+        """
+        :param y: (numpy.ndarray) States of the networks, shape (networks, size)
+        :param system: (tuple) Arrays of the same networks, see subset
+        :return: (numpy.ndarray) The time derivatives of the states
+        """
+        constants, gather, stoichiometry, _, _ = system
+        rates = constants * np.prod(np.take(y, gather), axis=2)
+        return np.matmul(rates[:, None, :], stoichiometry)[:, 0]
+
+    def jacobian(self, y, system):
+        """
+        :param y: (numpy.ndarray) States of the networks, shape (networks, size)
+        :param system: (tuple) Arrays of the same networks, see subset
+        :return: (numpy.ndarray) The Jacobians of the rates of change, shape (networks, size, size)
+        """
+        constants, gather, stoichiometry, onehot, others = system
+        concentrations = np.take(y, gather)
+        # Derivative of the rate of each reaction with respect to each of its reactants, then each species
+        derivatives = np.stack([constants * np.prod(concentrations[:, :, other], axis=2) for other in others], axis=2)
+        rate_derivatives = np.matmul(derivatives[:, :, None, :], onehot)[:, :, 0]
+        return np.matmul(stoichiometry.transpose(0, 2, 1), rate_derivatives)
+
+    def steady_states(self, y, rows=None, max_iterations=100, tolerance=1e-9):
+        """
+        Find steady states of all networks with a damped Newton iteration. The Jacobians of mass-action networks with
+        conserved moieties are singular, so the Newton steps are least-squares solutions.
+        :param y: (numpy.ndarray) States to start from, shape (len(rows), size)
+        :param rows: optional (numpy.ndarray), indices of the networks, all of them by default
+        :param max_iterations: optional (int), maximum number of Newton steps
+        :param tolerance: optional (float), largest rate of change of a steady state, relative to its largest
+            concentration (or 1)
+        :return: (numpy.ndarray, numpy.ndarray) The states reached and whether each one is a steady state
+        """
+        system = self.subset(np.arange(len(y)) if rows is None else rows)
+        y = y.copy()
+        with np.errstate(all="ignore"):
+            f = self.rates_of_change(y, system)
+            residual = np.max(np.abs(f), axis=1)
+            converged = residual <= tolerance * np.maximum(1, np.max(np.abs(y), axis=1))
+            for _ in range(max_iterations):
+                if np.all(converged | ~np.isfinite(residual)):
+                    break
+                step = -np.matmul(np.linalg.pinv(self.jacobian(y, system)), f[:, :, None])[:, :, 0]
+                # Halve the steps that don't reduce the residual
+                damping = np.ones(len(y))
+                for _ in range(10):
+                    trial = y + damping[:, None] * step
+                    trial_f = self.rates_of_change(trial, system)
+                    trial_residual = np.max(np.abs(trial_f), axis=1)
+                    improved = trial_residual < residual
+                    if np.all(improved | converged):
+                        break
+                    damping[~improved] /= 2
+                improved &= ~converged
+                if not np.any(improved):
+                    break
+                y[improved], f[improved] = trial[improved], trial_f[improved]
+                residual[improved] = trial_residual[improved]
+                converged = residual <= tolerance * np.maximum(1, np.max(np.abs(y), axis=1))
+        return y, converged
+
+    def eigenvalues(self, y, rows=None):
+        """
+        :param y: (numpy.ndarray) States of the networks, shape (len(rows), size)
+        :param rows: optional (numpy.ndarray), indices of the networks, all of them by default
+        :return: (numpy.ndarray) Eigenvalues of the Jacobian of each network, shape (len(rows), size). Padding adds
+            eigenvalues of 0
+        """
+        return np.linalg.eigvals(self.jacobian(y, self.subset(np.arange(len(y)) if rows is None else rows)))
+
+    def simulate(self, start, end, numpoints, relative_tolerance=1e-6, absolute_tolerance=1e-10, max_steps=100000,
+                 blowup_threshold=1e15):
+        """
+        Integrate all networks with an adaptive Rosenbrock method, each with its own step size. Output points are
+        interpolated between steps, so they don't limit the step size.
+        :param start: (float) Starting time for simulation
+        :param end: (float) Ending time for simulation
+        :param numpoints: (int) Number of points for the simulation
+        :param relative_tolerance: optional (float), relative tolerance of the local error of each step
+        :param absolute_tolerance: optional (float), absolute tolerance of the local error of each step
+        :param max_steps: optional (int), networks that need more steps than this are given up on
+        :param blowup_threshold: optional (float), networks with concentrations larger than this are given up on
+        :return: (numpy.ndarray, numpy.ndarray, numpy.ndarray) The times, shape (numpoints,), the states, shape
+            (networks, numpoints, size), and whether each network was integrated up to the end time (the states of
+            the others are NaN from where the integration stopped)
+        """
+        nmodels = len(self.initial)
+        times = np.linspace(start, end, numpoints)
+        states = np.full((nmodels, numpoints, self.size), np.nan)
+        states[:, 0] = self.initial
+        y = self.initial.copy()
+        t = np.full(nmodels, float(start))
+        f = self.rates_of_change(y, self.subset(np.arange(nmodels)))
+        # Initial step sizes as suggested by Hairer, Norsett & Wanner, Solving ODEs I, section II.4
+        scale = absolute_tolerance + relative_tolerance * np.abs(y)
+        magnitude, rate = np.max(np.abs(y) / scale, axis=1), np.max(np.abs(f) / scale, axis=1)
+        with np.errstate(all="ignore"):
+            h = np.where((magnitude < 1e-5) | (rate < 1e-5), 1e-6, 0.01 * magnitude / rate)
+        h = np.minimum(h, 0.1 * (end - start))
+        next_output = np.ones(nmodels, dtype=int)
+        steps = np.zeros(nmodels, dtype=int)
+        active = np.full(nmodels, end > start and numpoints > 1)
+        finished = ~active
+        identity = np.eye(self.size)
+        rows = None
+        while np.any(active):
+            if rows is None or len(rows) != np.count_nonzero(active):
+                rows = np.flatnonzero(active)
+                system = self.subset(rows)
+            y0, f0, t0 = y[rows], f[rows], t[rows]
+            step = np.minimum(h[rows], end - t0)
+            with np.errstate(all="ignore"):
+                matrix = identity / (ROSENBROCK_GAMMA * step)[:, None, None] - self.jacobian(y0, system)
+                try:
+                    inverse = np.linalg.inv(matrix)
+                except np.linalg.LinAlgError:
+                    inverse = np.linalg.pinv(matrix)
+
+                def solve(rhs):
+                    return np.matmul(inverse, rhs[:, :, None])[:, :, 0]
+
+                over_h = 1 / step[:, None]
+                g1 = solve(f0)
+                slope = self.rates_of_change(y0 + ROSENBROCK_A[21] * g1, system)
+                g2 = solve(slope + ROSENBROCK_C[21] * g1 * over_h)
+                slope = self.rates_of_change(y0 + ROSENBROCK_A[31] * g1 + ROSENBROCK_A[32] * g2, system)
+                g3 = solve(slope + (ROSENBROCK_C[31] * g1 + ROSENBROCK_C[32] * g2) * over_h)
+                g4 = solve(slope + (ROSENBROCK_C[41] * g1 + ROSENBROCK_C[42] * g2 + ROSENBROCK_C[43] * g3) * over_h)
+                stages = (g1, g2, g3, g4)
+                y1 = y0 + sum(b * g for b, g in zip(ROSENBROCK_B, stages))
+                error = sum(e * g for e, g in zip(ROSENBROCK_E, stages))
+                tolerance = absolute_tolerance + relative_tolerance * np.maximum(np.abs(y0), np.abs(y1))
+                error = np.max(np.abs(error) / tolerance, axis=1)
+                error[~np.all(np.isfinite(y1), axis=1)] = np.inf
+                factor = np.clip(0.9 * error ** -0.25, 0.2, 5)
+            factor[~np.isfinite(factor)] = 0.2
+            accepted = error <= 1
+            blown_up = accepted & np.any(np.abs(y1) > blowup_threshold, axis=1)
+            h[rows] = step * factor
+            steps[rows] += 1
+            if np.any(accepted):
+                done = rows[accepted]
+                f1 = self.rates_of_change(y1, system)[accepted]
+                y0, f0, y1, t0, step = y0[accepted], f0[accepted], y1[accepted], t0[accepted], step[accepted]
+                t1 = np.where(step >= end - t0, end, t0 + step)
+                # Cubic Hermite interpolation of the output points passed by the step
+                counts = np.searchsorted(times, t1, side="right") - next_output[done]
+                owners = np.repeat(np.arange(len(done)), counts)
+                points = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                points += np.repeat(next_output[done], counts)
+                s = ((times[points] - t0[owners]) / step[owners])[:, None]
+                states[done[owners], points] = ((2 * s ** 3 - 3 * s ** 2 + 1) * y0[owners]
+                                                + (s ** 3 - 2 * s ** 2 + s) * step[owners, None] * f0[owners]
+                                                + (3 * s ** 2 - 2 * s ** 3) * y1[owners]
+                                                + (s ** 3 - s ** 2) * step[owners, None] * f1[owners])
+                next_output[done] += counts
+                y[done], f[done], t[done] = y1, f1, t1
+                finished[done] = t1 >= end
+            failed = (h[rows] <= 1e-12 * (end - start)) | (steps[rows] >= max_steps) | blown_up
+            active[rows] = ~finished[rows] & ~failed
+        return times, states, finished
+
+
+def simulate_mass_action(astrs, start, end, numpoints, batch_size=256, fallback=True):
+    """
+    Simulate many antimony models at once with MassActionBatch, much faster than compiling and simulating each one in
+    RoadRunner. Models that aren't plain mass-action networks (see parse_mass_action_network), or that the batched
+    integrator gives up on (e.g. because they blow up), are simulated with RoadRunner instead.
+    On the benchmark corpus, the results agree with RoadRunner's to within 2e-5 of the largest concentration of each
+    model (median 1e-6) over 0 to 50 time units, including oscillators. The cost of a step hardly depends on the
+    number of models, so large batches pay off: 256 models take about 0.02 s each on one core, against 0.15 s each
+    to compile and simulate in RoadRunner.
+    :param astrs: list(str) Antimony strings
+    :param start: (float) Starting time for simulation
+    :param end: (float) Ending time for simulation
+    :param numpoints: (int) Number of points for the simulation
+    :param batch_size: optional (int), number of models integrated together. Memory use is about
+        batch_size * numpoints * (species + 1) * 8 bytes
+    :param fallback: optional (bool), if False, models the batched integrator can't simulate are not simulated with
+        RoadRunner either
+    :return: list((numpy.ndarray, list(str))) The result of each model with time in the first column and the column
+        names, as returned by simulate_antimony. None for models that couldn't be simulated
+    """
+    results = [None] * len(astrs)
+    networks = [parse_mass_action_network(astr) for astr in astrs]
+    batched = [i for i, network in enumerate(networks) if network is not None]
+    for first in range(0, len(batched), batch_size):
+        rows = batched[first:first + batch_size]
+        batch = MassActionBatch([networks[i] for i in rows])
+        times, states, finished = batch.simulate(start, end, numpoints)
+        for j, i in enumerate(rows):
+            if finished[j]:
+                names = batch.names[j]
+                results[i] = (np.column_stack([times, states[j, :, :len(names)]]),
+                              ["time"] + [f"[{name}]" for name in names])
+    if fallback:
+        for i, result in enumerate(results):
+            if result is None:
+                try:
+                    results[i] = simulate_antimony(astrs[i], start, end, numpoints)
+                except Exception:
+                    pass
+    return results
+
+
+#--------------------------------------------------
+# Profiling
+#-------------------------------------------------
+
+PROFILE_HISTOGRAM_EDGES = [0] + [10 ** (e / 2) for e in range(-8, 7)]  # Seconds, 0.1 ms to 1000 s
+
+
+class StageProfiler:
+    """
+    Records the wall time, outcome and swallowed exception type of each stage of the oscillator tests (see
+    profile_stage), and which stage decided each verdict. Records are aggregated into counters and time histograms
+    per stage by summary(), and can be saved as JSON (summary and records) or CSV (one row per record).
+    A profiler is enabled for a block of code with the profiling context manager. evaluate_oscillators, fix_model and
+    prune_models take a profiler as an argument, and collect the records of their worker processes into it.
+    """
+
+    def __init__(self):
+        self.model = None  # Label of the model currently being evaluated, stored with each record
+        self.records = []
+
+    def record(self, stage, seconds, outcome, exception=None):
+        """
+        :param stage: (str) Name of the stage
+        :param seconds: (float) Wall time of the stage
+        :param outcome: (str) Outcome of the stage, "exception" if it raised
+        :param exception: optional (str), name of the type of the exception the stage raised
+        :return: None
+        """
+        self.records.append({"model": self.model, "kind": "stage", "stage": stage, "seconds": seconds,
+                             "outcome": outcome, "exception": exception})
+
+    def decide(self, stage, verdict):
+        """
+        Record the stage that decided a verdict
+        :param stage: (str) Name of the stage
+        :param verdict: (bool) The verdict
+        :return: None
+        """
+        self.records.append({"model": self.model, "kind": "decision", "stage": stage, "seconds": None,
+                             "outcome": "oscillator" if verdict else "not_oscillator", "exception": None})
+
+    def summary(self):
+        """
+        Aggregate the records
+        :return: (dict) "models": number of models, "stages": for each stage its count, total, mean and maximum
+            seconds, counts of outcomes and exception types and a histogram of times (bucket edges in seconds and
+            counts), "decisions": for each stage, how many verdicts of each kind it decided
+        """
+        stages = {}
+        decisions = {}
+        for record in self.records:
+            if record["kind"] == "decision":
+                outcomes = decisions.setdefault(record["stage"], {})
+                outcomes[record["outcome"]] = outcomes.get(record["outcome"], 0) + 1
+                continue
+            stage = stages.setdefault(record["stage"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                                                        "outcomes": {}, "exceptions": {},
+                                                        "histogram": {"edges": PROFILE_HISTOGRAM_EDGES,
+                                                                      "counts": [0] * len(PROFILE_HISTOGRAM_EDGES)}})
+            stage["count"] += 1
+            stage["total_seconds"] += record["seconds"]
+            stage["max_seconds"] = max(stage["max_seconds"], record["seconds"])
+            stage["outcomes"][record["outcome"]] = stage["outcomes"].get(record["outcome"], 0) + 1
+            if record["exception"] is not None:
+                stage["exceptions"][record["exception"]] = stage["exceptions"].get(record["exception"], 0) + 1
+            bucket = sum(1 for edge in PROFILE_HISTOGRAM_EDGES[1:] if record["seconds"] >= edge)
+            stage["histogram"]["counts"][bucket] += 1
+        for stage in stages.values():
+            stage["mean_seconds"] = stage["total_seconds"] / stage["count"]
+        return {"models": len({record["model"] for record in self.records}), "stages": stages,
+                "decisions": decisions}
+
+    def save(self, path):
+        """
+        Save the profile, as CSV records if the path ends in .csv, otherwise as JSON with the summary and records
+        :param path: (str) Path to the output file
+        :return: None
+        """
+        if path.endswith(".csv"):
+            columns = ["model", "kind", "stage", "seconds", "outcome", "exception"]
+            with open(path, "w") as f:
+                f.write(",".join(columns) + "\n")
+                for record in self.records:
+                    f.write(",".join("" if record[c] is None else str(record[c]) for c in columns) + "\n")
+        else:
+            with open(path, "w") as f:
+                json.dump({"summary": self.summary(), "records": self.records}, f, indent=1)
+
+    def print_summary(self):
+        """
+        Print the time spent in each stage and the stages that decided the verdicts
+        :return: None
+        """
+        summary = self.summary()
+        for name, stage in sorted(summary["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+            print(f"{name}: {stage['count']} runs, {stage['total_seconds']:.2f} s total, "
+                  f"{stage['mean_seconds'] * 1000:.1f} ms mean, outcomes {stage['outcomes']}"
+                  + (f", exceptions {stage['exceptions']}" if stage["exceptions"] else ""))
+        for name, outcomes in summary["decisions"].items():
+            print(f"decided by {name}: {outcomes}")
+
+
+oscillation_profiler = None  # StageProfiler the oscillator tests currently record into
+
+
+@contextlib.contextmanager
+def profiling(profiler):
+    """
+    Record the oscillator tests run inside a with block into a profiler
+    :param profiler: (StageProfiler) or None to leave profiling as it is
+    :return: context manager
+    """
+    global oscillation_profiler
+    if profiler is None:
+        yield None
+        return
+    previous = oscillation_profiler
+    oscillation_profiler = profiler
+    try:
+        yield profiler
+    finally:
+        oscillation_profiler = previous
+
+
+class profile_stage:
+    """
+    Context manager timing one stage of the oscillator tests when profiling is enabled. The outcome attribute can be
+    set inside the block. An exception raised in the block is recorded and passed on, so it should be entered inside
+    the try block that swallows it.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.outcome = "completed"
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if oscillation_profiler is not None:
+            if exc_type is None:
+                oscillation_profiler.record(self.name, time.perf_counter() - self.start, self.outcome)
+            else:
+                oscillation_profiler.record(self.name, time.perf_counter() - self.start, "exception",
+                                            exc_type.__name__)
+        return False
+
+
+def decided(stage, verdict):
+    """
+    Private function. Record which stage decided a verdict when profiling is enabled
+    :param stage: (str) Name of the stage
+    :param verdict: (bool) The verdict
+    :return: (bool) The verdict
+    """
+    if oscillation_profiler is not None:
+        oscillation_profiler.decide(stage, verdict)
+    return verdict
+
+
+#--------------------------------------------------
+# Integrator Configuration
+#-------------------------------------------------
+
+OSCILLATION_WINDOW = (0, 50, 100000)  # Start, end and number of points of the simulation of the oscillator tests
+SOLVER_LADDER_ENV = "RNE_SOLVER_LADDER"  # Environment variables, so spawned worker processes use the same settings
+SOLVER_MEMORY_ENV = "RNE_SOLVER_MEMORY"
+
+SolverConfiguration = collections.namedtuple("SolverConfiguration", ["name", "integrator", "relative_tolerance",
+                                                                     "absolute_tolerance", "maximum_num_steps",
+                                                                     "numpoints"])
+SolverConfiguration.__doc__ = """
+One rung of the solver ladder used to simulate the oscillator test window: the integrator, its tolerances and step
+limit (None keeps the current setting of the model) and the number of output points
+"""
+
+# The settings the oscillator tests have always used: the default tolerances, then a tighter relative tolerance
+REFERENCE_LADDER = [
+    SolverConfiguration("dense", "cvode", None, None, None, 100000),
+    SolverConfiguration("dense_tight", "cvode", 1e-10, None, None, 100000),
+]
+
+# From the cheapest to the most expensive. Only the end state of the window is used when not streaming, so the sparse
+# rungs write 100 times fewer points. CVODE's step limit applies to each output interval and the sparse rungs keep
+# the default one, so a model that blows up fails as quickly as on the dense rungs, and a step limit failure is
+# retried at the dense output density. The end state of a sparse simulation is not exactly the dense one, which can
+# be enough to change which knockout repairs a broken oscillator, so this ladder has to be enabled explicitly.
+FAST_LADDER = [
+    SolverConfiguration("sparse", "cvode", None, None, None, 1001),
+    SolverConfiguration("sparse_tight", "cvode", 1e-10, None, None, 1001),
+] + REFERENCE_LADDER
+
+SOLVER_LADDERS = {"reference": REFERENCE_LADDER, "fast": FAST_LADDER}
+
+# Failure modes whose outcome doesn't depend on how often the output is sampled: a model that fails this way with
+# some tolerances isn't simulated again with the same tolerances at another output density
+TOLERANCE_FAILURES = ["convergence", "error_test"]
+
+
+def failure_mode(exception):
+    """
+    Private function. Classify why a simulation failed from the CVODE error in the message of the exception
+    :param exception: (Exception) The exception raised by the simulation
+    :return: (str) "step_limit" (too many steps in an output interval), "convergence" (repeated Newton convergence
+        failures, typical of stiff models), "error_test" (repeated local error test failures) or "other"
+    """
+    message = str(exception)
+    if "CV_TOO_MUCH_WORK" in message:
+        return "step_limit"
+    if "CV_CONV_FAILURE" in message:
+        return "convergence"
+    if "CV_ERR_FAILURE" in message:
+        return "error_test"
+    return "other"
+
+
+def model_class(r):
+    """
+    Private function. Group models that are likely to need the same solver settings: by network shape, and by the
+    spread of their rate constants in decades as a cheap stiffness estimate
+    :param r: RoadRunner model
+    :return: (str) e.g. "3x5:2" for 3 floating species, 5 reactions and rate constants spanning 2 decades
+    """
+    rates = np.asarray(r.getGlobalParameterValues(), dtype=float)
+    rates = rates[rates > 0]
+    spread = int(np.log10(rates.max() / rates.min())) if len(rates) > 1 else 0
+    return f"{r.getNumFloatingSpecies()}x{r.getNumReactions()}:{spread}"
+
+
+class SolverMemory:
+    """
+    Which rungs of the solver ladder succeeded and failed (and how) for each model class (see model_class). New
+    models start from the cheapest rung that worked for their class, skipping cheaper rungs that have only ever
+    failed for it.
+    When backed by a JSON file, the counts of the file are loaded on first use and the new observations of this
+    process are added to it after each model, so the processes of a run (and later runs on the same corpus) learn
+    from each other. The file is only a hint: an update can be lost when two processes write it at the same time.
+    """
+
+    def __init__(self, path=None, min_failures=3):
+        """
+        :param path: optional (str), JSON file of the counts, created if needed
+        :param min_failures: optional (int), number of failures without a success after which a rung is skipped for a
+            model class
+        """
+        self.path = path
+        self.min_failures = min_failures
+        self.counts = self.load()  # {class: {rung: {"success": n, "convergence": n, ...}}}
+        self.pending = {}
+
+    def load(self):
+        """
+        Private. Read the counts of the file
+        :return: (dict)
+        """
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def start(self, key, ladder):
+        """
+        :param key: (str) Model class
+        :param ladder: list(SolverConfiguration) Rungs to choose from
+        :return: (int) Index of the first rung to try
+        """
+        rungs = self.counts.get(key, {})
+        for i, configuration in enumerate(ladder[:-1]):
+            outcomes = rungs.get(configuration.name, {})
+            failures = sum(n for outcome, n in outcomes.items() if outcome != "success")
+            if outcomes.get("success", 0) > 0 or failures < self.min_failures:
+                return i
+        return len(ladder) - 1
+
+    def record(self, key, observations):
+        """
+        Count the outcome of each rung tried for a model
+        :param key: (str) Model class
+        :param observations: list((str, str)) Name of each rung tried and its outcome, "success" or a failure mode
+        :return: None
+        """
+        for counts in [self.counts, self.pending]:
+            for name, outcome in observations:
+                outcomes = counts.setdefault(key, {}).setdefault(name, {})
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        if self.path is not None:
+            self.save()
+
+    def save(self):
+        """
+        Private. Add the pending observations to the counts of the file, replacing it atomically
+        :return: None
+        """
+        counts = self.load()
+        for key, rungs in self.pending.items():
+            for name, outcomes in rungs.items():
+                merged = counts.setdefault(key, {}).setdefault(name, {})
+                for outcome, n in outcomes.items():
+                    merged[outcome] = merged.get(outcome, 0) + n
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(counts, f)
+        os.replace(tmp_path, self.path)
+        self.counts = counts
+        self.pending = {}
+
+
+def enable_adaptive_solver(ladder="fast", memory_path=None):
+    """
+    Simulate the oscillator tests of this process, and of worker processes started afterwards, with a solver ladder
+    other than REFERENCE_LADDER, starting each model from the cheapest rung that worked for its class.
+    Results can differ from those of the reference settings: which knockout repairs a broken oscillator can change,
+    and since the starting rung depends on the models evaluated before (in the same process, or sharing the memory
+    file), results can also differ between a serial and a parallel run.
+    :param ladder: (str) Name of a ladder of SOLVER_LADDERS, None to go back to the reference settings without
+        learning
+    :param memory_path: optional (str), JSON file of the solver memory shared by the processes and later runs. By
+        default each process learns on its own
+    :return: None
+    """
+    os.environ.pop(SOLVER_LADDER_ENV, None)
+    os.environ.pop(SOLVER_MEMORY_ENV, None)
+    if ladder is None:
+        return
+    if ladder not in SOLVER_LADDERS:
+        raise ValueError(f"Unknown solver ladder {ladder}, expected one of {', '.join(SOLVER_LADDERS)}")
+    os.environ[SOLVER_LADDER_ENV] = ladder
+    if memory_path is not None:
+        os.environ[SOLVER_MEMORY_ENV] = os.path.abspath(memory_path)
+
+
+solver_memory = None  # SolverMemory of this process, created on first use
+
+
+def get_solver_memory():
+    """
+    Private function. Get the solver memory of this process, backed by the file given to enable_adaptive_solver
+    :return: (SolverMemory) or None if the adaptive solver isn't enabled
+    """
+    global solver_memory
+    if os.environ.get(SOLVER_LADDER_ENV) is None:
+        return None
+    path = os.environ.get(SOLVER_MEMORY_ENV)
+    if solver_memory is None or solver_memory.path != path:
+        solver_memory = SolverMemory(path)
+    return solver_memory
+
+
+def get_solver_ladder():
+    """
+    Private function. Get the solver ladder enabled with enable_adaptive_solver
+    :return: list(SolverConfiguration) REFERENCE_LADDER if the adaptive solver isn't enabled
+    """
+    return SOLVER_LADDERS[os.environ.get(SOLVER_LADDER_ENV, "reference")]
+
+
+def configure_integrator(r, configuration):
+    """
+    Private function. Apply a rung of the solver ladder to a model
+    :param r: RoadRunner model
+    :param configuration: (SolverConfiguration)
+    :return: (dict) The previous values of the settings that were changed, for restore_integrator
+    """
+    if r.integrator.getName() != configuration.integrator:
+        r.setIntegrator(configuration.integrator)
+    previous = {}
+    for setting in ["relative_tolerance", "absolute_tolerance", "maximum_num_steps"]:
+        value = getattr(configuration, setting)
+        if value is not None:
+            previous[setting] = getattr(r.integrator, setting)
+            setattr(r.integrator, setting, value)
+    return previous
+
+
+def restore_integrator(r, previous):
+    """
+    Private function. Undo configure_integrator
+    :param r: RoadRunner model
+    :param previous: (dict) Returned by configure_integrator
+    :return: None
+    """
+    for setting, value in previous.items():
+        setattr(r.integrator, setting, value)
+
+
 #--------------------------------------------------
 # Network Sorting
 #-------------------------------------------------
@@ -85,18 +873,6 @@ def get_model_fitness_from_file(path):
             return float(fitness)
 
 
-def get_model_fitness_from_antimony(astr):
-    '''
-    Extracts the fitness from an antimony string
-    :param astr: (str) An antimony string
-    :return: (float) Fitness of the model
-    '''
-    for line in astr.split("\n"):
-        if line.startswith("#fitness"):
-            fitness = line.split(" ")[1]
-            return float(fitness)
-
-
 def get_model_fitness(input):
     '''
     Extracts the fitness of a model
@@ -104,35 +880,140 @@ def get_model_fitness(input):
     :return: (float) Fitness of the model
     '''
     if "->" in input:
-        return get_model_fitness_from_antimony(astr)
+        return get_model_fitness_from_antimony(input)
     else:
         return get_model_fitness_from_file(input)
 
 
-def fix_model(astr, fitness=None):
+class KnockoutEngine:
+    """
+    Evaluates reaction knockouts of a model while compiling it only once. A reaction is knocked out by setting its
+    rate constant (k1, k2, ... as written by convert_to_antimony) to zero, which leaves the remaining reactions
+    unchanged. Only the final accepted antimony string needs to be materialized.
+    Reactions whose rate law isn't a simple product with a rate constant of its own, or whose removal would turn an
+    undeclared species into a parameter, are evaluated by reloading the edited antimony string instead.
+    """
+
+    def __init__(self, astr, streaming=False):
+        """
+        :param astr: (str) Antimony string of the model
+        :param streaming: optional (bool), passed on to is_oscillator
+        """
+        self.streaming = streaming
+        self.astr = astr
+        self.lines = astr.split("\n")
+        self.reaction_lines = [i for i, line in enumerate(self.lines) if "->" in line]
+        self.r = te.loada(astr)
+        self.relative_tolerance = self.r.integrator.relative_tolerance
+        self.absolute_tolerance = self.r.integrator.absolute_tolerance
+        self.floating_species = set(self.r.getFloatingSpeciesIds())
+        declared = set()
+        for line in self.lines:
+            match = re.match(r"\s*species\s+([^;]*)", line)
+            if match:
+                declared.update(name.strip() for name in match.group(1).split(","))
+        self.declared_species = declared
+        parameters = set(self.r.getGlobalParameterIds())
+        self.rate_constants = {}
+        self.species = {}
+        for i in self.reaction_lines:
+            line = self.lines[i].split("#")[0]  # Commented out reactions are already knocked out
+            if "->" not in line or ";" not in line:
+                continue
+            reaction, ratelaw = line.split(";")[:2]
+            reaction = reaction.split(":")[-1]
+            self.species[i] = set(re.findall(r"[A-Za-z_]\w*", reaction))
+            ratelaw = ratelaw.replace(" ", "")
+            factors = ratelaw.split("*")
+            constants = [factor for factor in factors if factor in parameters]
+            if re.fullmatch(r"[A-Za-z_]\w*(\*[A-Za-z_]\w*)*", ratelaw) and len(constants) == 1:
+                self.rate_constants[i] = constants[0]
+        # Rate constants shared by several reactions can't be used to knock out a single one
+        counts = {}
+        for k in self.rate_constants.values():
+            counts[k] = counts.get(k, 0) + 1
+        self.rate_constants = {i: k for i, k in self.rate_constants.items() if counts[k] == 1}
+        self.initial_values = {k: self.r[k] for k in self.rate_constants.values()}
+
+    def can_knock_out(self, knockouts):
+        """
+        Private. Check if a set of knockouts can be emulated without recompiling the model
+        :param knockouts: (set(int)) Indices of the lines of the reactions to knock out
+        :return: (bool)
+        """
+        active = [i for i in self.species if i not in knockouts]
+        remaining_species = set().union(*[self.species[i] for i in active])
+        for i in knockouts:
+            if i not in self.species:
+                continue  # Already commented out, knocking it out again doesn't change the model
+            if i not in self.rate_constants:
+                return False
+            for species in self.species[i] & self.floating_species:
+                if species not in remaining_species and species not in self.declared_species:
+                    return False
+        return True
+
+    def materialize(self, knockouts):
+        """
+        Build the antimony string of the model with reactions commented out
+        :param knockouts: (set(int)) Indices of the lines of the reactions to knock out
+        :return: (str) The new antimony string
+        """
+        return "\n".join("#" + line if i in knockouts else line for i, line in enumerate(self.lines))
+
+    def is_oscillator(self, knockouts):
+        """
+        Test if the model oscillates with a set of reactions knocked out
+        :param knockouts: (set(int)) Indices of the lines of the reactions to knock out
+        :return: (bool) True is the model oscillates
+        """
+        if not self.can_knock_out(knockouts):
+            return is_oscillator(te.loada(self.materialize(knockouts)), streaming=self.streaming)
+        knocked_out = {self.rate_constants[i] for i in knockouts if i in self.species}
+        for k, value in self.initial_values.items():
+            self.r[k] = 0.0 if k in knocked_out else value
+        # is_oscillator may tighten the tolerance, a freshly loaded model would start with the defaults
+        self.r.integrator.relative_tolerance = self.relative_tolerance
+        self.r.integrator.absolute_tolerance = self.absolute_tolerance
+        return is_oscillator(self.r, reset_parameters=False, streaming=self.streaming)
+
+
+def fix_model(astr, fitness=None, compile_once=True, streaming=False, profiler=None):
     '''
     Attempts to fix a model to make it an oscillator by removing one reaction at a time.
     :param astr: (str) Antimony string of the model
     :param fitness: (float) Fitness of the model (optional). If provided, will be appended to the new antimony string
+    :param compile_once: optional (bool), if True, the model is compiled once and reactions are knocked out in place
+        (see KnockoutEngine). If False, the antimony string is edited and reloaded for every reaction.
+    :param streaming: optional (bool), passed on to is_oscillator
+    :param profiler: optional (StageProfiler), records the time and outcome of each stage of the oscillator tests
     :return: (bool) if the model was successfully fixed, (str) The new antimony string if the model was successfully
     fixed, otherwise it returns the input antimony string.
     '''
-    split_astr = astr.split("\n")
-    for i in range(len(split_astr)):
-        if "->" in split_astr[i]:
-            split_astr[i] = "#" + split_astr[i]
-            newastr = "\n".join(split_astr)
-            r = te.loada(newastr)
-            if is_oscillator(r):
-                if fitness:
-                    newastr.append(f"\n# fitness: {fitness}")
-                return True, newastr
-            # If the model is not fixed, then uncomment the line
-            split_astr[i] = split_astr[i][1:]
-    # If the model can't be fixed, return None
-    if fitness:
-        newastr.append(f"\n# fitness: {fitness}")
-    return False, astr
+    with profiling(profiler):
+        if compile_once:
+            engine = KnockoutEngine(astr, streaming=streaming)
+            for i in engine.reaction_lines:
+                if engine.is_oscillator({i}):
+                    newastr = engine.materialize({i})
+                    if fitness is not None:
+                        newastr += f"\n#fitness: {fitness}"
+                    return True, newastr
+            return False, astr
+        split_astr = astr.split("\n")
+        for i in range(len(split_astr)):
+            if "->" in split_astr[i]:
+                split_astr[i] = "#" + split_astr[i]
+                newastr = "\n".join(split_astr)
+                r = te.loada(newastr)
+                if is_oscillator(r, streaming=streaming):
+                    if fitness is not None:
+                        newastr += f"\n#fitness: {fitness}"
+                    return True, newastr
+                # If the model is not fixed, then uncomment the line
+                split_astr[i] = split_astr[i][1:]
+        # If the model can't be fixed, return the original string
+        return False, astr
 
 
 def check_eigens(eigen_array):
@@ -163,185 +1044,1269 @@ def is_broken_oscillator(r):
     is_good_oscillator = False
 
     try:
-        s = r.steadyState()
-        eigens = r.getFullEigenValues()
-        hasgoodvals = check_eigens(eigens)
-        if hasgoodvals:
-            if not all(i >= 0 for i in r.getFloatingSpeciesConcentrations()):
-                is_broken = True
-            else:
-                is_good_oscillator = True
+        with profile_stage("broken_check") as stage:
+            s = r.steadyState()
+            eigens = r.getFullEigenValues()
+            hasgoodvals = check_eigens(eigens)
+            stage.outcome = "no_oscillation"
+            if hasgoodvals:
+                if not all(i >= 0 for i in r.getFloatingSpeciesConcentrations()):
+                    is_broken = True
+                    stage.outcome = "broken"
+                else:
+                    is_good_oscillator = True
+                    stage.outcome = "oscillator"
     except:
         pass
+    if is_good_oscillator:
+        decided("broken_check", True)
     return is_good_oscillator, is_broken
 
 
-def is_oscillator_preprocessed(r):
+def detect_oscillation_streaming(r, end=50, numpoints=100000, sample_every=10, chunk_points=500, min_cycles=3,
+                                 amplitude_tolerance=0.01, convergence_tolerance=1e-8, blowup_threshold=1e10,
+                                 run_to_end=False):
+    """
+    Integrate a model step by step and classify its trajectory from the peaks and troughs of each species as the
+    data arrives, stopping as soon as the outcome is clear. The integrator only stops at the sampled output points and
+    is never restarted, so the samples follow the trajectory of r.simulate. Only a small rolling buffer of samples and
+    the most recent peaks and troughs are kept in memory, regardless of the length of the simulation.
+    The model is integrated from its current state, so it should be reset before calling this function.
+    :param r: RoadRunner model
+    :param end: optional (float), time at which to stop if no verdict was reached
+    :param numpoints: optional (int), number of output points between 0 and end, like r.simulate(0, end, numpoints)
+    :param sample_every: optional (int), only every nth output point (and the last one) is computed and used to look
+        for peaks and troughs
+    :param chunk_points: optional (int), number of samples in the rolling buffer, which is analysed whenever it fills
+    :param min_cycles: optional (int), number of consecutive cycles of similar amplitude needed to call an oscillation
+        sustained
+    :param amplitude_tolerance: optional (float), maximum relative difference between the amplitudes of those cycles
+    :param convergence_tolerance: optional (float), maximum relative range of every species over a full buffer for
+        the model to be considered converged to a fixed point
+    :param blowup_threshold: optional (float), concentrations larger than this (or not finite) count as a blow-up
+    :param run_to_end: optional (bool), if True, keep integrating to the end time after an "oscillating" or
+        "converged" verdict (without analysing the samples), so the model is left in the same state as after
+        r.simulate(0, end, numpoints). Only a blow-up stops the simulation early
+    :return: (str) One of "oscillating" (sustained oscillation), "converged" (reached a fixed point), "diverged"
+        (blow-up) or "undecided" (reached the end time without a verdict)
+    """
+    dt = end / (numpoints - 1)
+    start = np.array(r.model.getFloatingSpeciesConcentrations())
+    nspecies = len(start)
+    if nspecies == 0:
+        return "undecided"
+    # The first two rows of the buffer hold the last two samples of the previous chunk, which are needed to find
+    # extrema at chunk boundaries
+    buffer = np.empty((chunk_points + 2, nspecies))
+    buffer[0] = start
+    filled = 1
+    peaks = [[] for _ in range(nspecies)]
+    troughs = [[] for _ in range(nspecies)]
+    t = 0
+    verdict = "undecided"
+    samples = list(range(sample_every, numpoints - 1, sample_every)) + [numpoints - 1]
+    for i in samples:
+        # Each step ends exactly on the output point, so the time doesn't drift over the many steps
+        t = r.oneStep(t, i * dt - t, reset=(i == samples[0]))
+        if verdict != "undecided":
+            continue
+        buffer[filled] = r.model.getFloatingSpeciesConcentrations()
+        filled += 1
+        if filled < len(buffer) and i < numpoints - 1:
+            continue
+        values = buffer[:filled]
+        if not np.all(np.isfinite(values)) or np.any(np.abs(values) > blowup_threshold):
+            return "diverged"
+        slopes = np.diff(values, axis=0)
+        is_peak = (slopes[:-1] > 0) & (slopes[1:] <= 0)
+        is_trough = (slopes[:-1] < 0) & (slopes[1:] >= 0)
+        for j in range(nspecies):
+            peaks[j] = (peaks[j] + list(values[1:-1, j][is_peak[:, j]]))[-(min_cycles + 1):]
+            troughs[j] = (troughs[j] + list(values[1:-1, j][is_trough[:, j]]))[-(min_cycles + 1):]
+            if len(peaks[j]) > min_cycles and len(troughs[j]) > min_cycles:
+                amplitudes = np.array(peaks[j][-min_cycles:]) - np.array(troughs[j][-min_cycles:])
+                floor = convergence_tolerance * max(1, max(abs(p) for p in peaks[j]))
+                if (np.min(amplitudes) > floor and min(troughs[j]) >= -floor
+                        and np.min(amplitudes) >= (1 - amplitude_tolerance) * np.max(amplitudes)):
+                    verdict = "oscillating"
+                    break
+        scales = np.maximum(1, np.max(np.abs(values), axis=0))
+        if (verdict == "undecided" and filled == len(buffer)
+                and np.all(np.ptp(values, axis=0) <= convergence_tolerance * scales)):
+            verdict = "converged"
+        if verdict != "undecided" and not run_to_end:
+            return verdict
+        buffer[:2] = buffer[filled - 2:filled]
+        filled = 2
+    return verdict
+
+
+def classify_trajectory(values, min_cycles=3, amplitude_tolerance=0.01, convergence_tolerance=1e-8,
+                        blowup_threshold=1e10, window=500):
+    """
+    Classify a whole trajectory with the criteria of detect_oscillation_streaming, applied to the end of the
+    trajectory rather than as the data arrives
+    :param values: (numpy.ndarray) Concentrations of the floating species, shape (numpoints, species)
+    :param min_cycles: optional (int), number of consecutive cycles of similar amplitude needed at the end of the
+        trajectory to call an oscillation sustained
+    :param amplitude_tolerance: optional (float), maximum relative difference between the amplitudes of those cycles
+    :param convergence_tolerance: optional (float), maximum relative range of every species over the last points
+        for the model to be considered converged to a fixed point
+    :param blowup_threshold: optional (float), concentrations larger than this (or not finite) count as a blow-up
+    :param window: optional (int), number of points at the end of the trajectory used to test for convergence
+    :return: (str) One of "oscillating", "converged", "diverged" or "undecided"
+    """
+    if not np.all(np.isfinite(values)) or np.any(np.abs(values) > blowup_threshold):
+        return "diverged"
+    slopes = np.diff(values, axis=0)
+    is_peak = (slopes[:-1] > 0) & (slopes[1:] <= 0)
+    is_trough = (slopes[:-1] < 0) & (slopes[1:] >= 0)
+    for j in range(values.shape[1]):
+        peaks = values[1:-1, j][is_peak[:, j]][-(min_cycles + 1):]
+        troughs = values[1:-1, j][is_trough[:, j]][-(min_cycles + 1):]
+        if len(peaks) > min_cycles and len(troughs) > min_cycles:
+            amplitudes = peaks[-min_cycles:] - troughs[-min_cycles:]
+            floor = convergence_tolerance * max(1, np.max(np.abs(peaks)))
+            if (np.min(amplitudes) > floor and np.min(troughs) >= -floor
+                    and np.min(amplitudes) >= (1 - amplitude_tolerance) * np.max(amplitudes)):
+                return "oscillating"
+    tail = values[-window:]
+    scales = np.maximum(1, np.max(np.abs(tail), axis=0))
+    if np.all(np.ptp(tail, axis=0) <= convergence_tolerance * scales):
+        return "converged"
+    return "undecided"
+
+
+def prescreen_oscillators(path, end=50, numpoints=10001, batch_size=64, savepath=None):
+    """
+    Quickly sort the models in a directory by the shape of their trajectories, simulated with simulate_mass_action
+    over the window used by the oscillator tests and classified with classify_trajectory. This only looks at the
+    trajectories: evaluate_oscillators also tests the eigenvalues at steady state and repairs broken oscillators, so
+    models that don't oscillate here can still pass it.
+    :param path: (str) Path to a directory of antimony models
+    :param end: optional (float), end time of the simulations
+    :param numpoints: optional (int), number of points of the simulations. The default gives the same spacing as
+        the points detect_oscillation_streaming looks at
+    :param batch_size: optional (int), number of models simulated together
+    :param savepath: optional (str), save the classification of each model to this JSON file
+    :return: dict(str: str) The classification of each file, "failed" if it couldn't be simulated
+    """
+    files = sorted(file for file in os.listdir(path) if not is_auxiliary_file(file))
+    labels = {}
+    for first in range(0, len(files), batch_size):
+        chunk = files[first:first + batch_size]
+        astrs = []
+        for file in chunk:
+            with open(os.path.join(path, file), "r") as f:
+                astrs.append(f.read())
+        for file, result in zip(chunk, simulate_mass_action(astrs, 0, end, numpoints, batch_size=batch_size)):
+            labels[file] = "failed" if result is None else classify_trajectory(result[0][:, 1:])
+    counts = collections.Counter(labels.values())
+    print(f"Prescreened {len(labels)} models: " + ", ".join(f"{counts[label]} {label}" for label in sorted(counts)))
+    if savepath:
+        with open(savepath, "w") as f:
+            json.dump(labels, f, indent=1)
+    return labels
+
+
+def screen_non_oscillators(astrs, batch_size=256, starts=64, margin=1e-6, distance=1e-4):
+    """
+    Find the models that clearly fail every test of is_oscillator, without loading them in RoadRunner. The tests look
+    at the eigenvalues of the Jacobian at three states: the steady state reached from the initial concentrations,
+    the end of the simulation and the steady state reached from there. Networks often have several steady states and
+    RoadRunner's solver doesn't always find the same one as Newton's method, so steady states are searched from many
+    starting points. For plain mass-action networks all of this is computed for a whole batch of models at once with
+    MassActionBatch. A model is only called a clear non-oscillator if the simulation ends at a steady state and no
+    steady state found nor the end of the simulation has an eigenvalue that check_eigens would accept, even with a
+    margin. Everything else is left to the full tests.
+    The screen can still disagree with the full tests when RoadRunner finds a steady state that none of the starting
+    points lead to, or gives a zero eigenvalue (e.g. of a conserved moiety) a round-off imaginary part, which
+    check_eigens accepts.
+    :param astrs: list(str) Antimony strings
+    :param batch_size: optional (int), number of models computed together
+    :param starts: optional (int), number of random starting points of the steady state search, on top of the
+        initial concentrations and the end of the simulation
+    :param margin: optional (float), eigenvalues with a real part above -margin times the largest eigenvalue count
+        as accepted by check_eigens
+    :param distance: optional (float), largest relative distance between the end of the simulation and the steady
+        state found from there
+    :return: list(bool) True for the models that are clearly not oscillators
+    """
+    clear = [False] * len(astrs)
+    networks = [parse_mass_action_network(astr) for astr in astrs]
+    batched = [i for i, network in enumerate(networks) if network is not None]
+    random = np.random.default_rng(0)  # The same starting points on every run
+    for first in range(0, len(batched), batch_size):
+        rows = batched[first:first + batch_size]
+        batch = MassActionBatch([networks[i] for i in rows])
+        _, states, finished = batch.simulate(0, 50, 2)
+        ends = np.nan_to_num(states[:, -1])
+        end_steady_states, found_end = batch.steady_states(ends)
+        scales = np.maximum(1, np.max(np.abs(ends), axis=1))
+        candidates = finished & found_end & (np.max(np.abs(end_steady_states - ends), axis=1) <= distance * scales)
+        # Random starting points spread over the scale of the initial concentrations, keeping boundary species.
+        # Some concentrations are negative, as RoadRunner also finds steady states of broken oscillators
+        floating = np.zeros(batch.initial.shape, dtype=bool)
+        for j, names in enumerate(batch.names):
+            floating[j, :len(names)] = True
+        typical = np.maximum(1, np.max(batch.initial[:, :-1], axis=1, initial=0))[:, None]
+        points = [ends, batch.initial]
+        for _ in range(starts):
+            guess = typical * 10 ** random.uniform(-2, 1, batch.initial.shape)
+            guess *= np.where(random.uniform(size=guess.shape) < 0.25, -1, 1)
+            points.append(np.where(floating, guess, batch.initial))
+        for point in points:
+            # Only the models that are still candidates are searched
+            remaining = np.flatnonzero(candidates)
+            if len(remaining) == 0:
+                break
+            if point is ends:
+                y, found = ends[remaining], np.ones(len(remaining), dtype=bool)
+            else:
+                y, found = batch.steady_states(point[remaining], remaining)
+            if not np.any(found):
+                continue
+            with np.errstate(all="ignore"):
+                eigens = batch.eigenvalues(y[found], remaining[found])
+            largest = np.max(np.abs(eigens), axis=1, keepdims=True)
+            accepted = np.any((eigens.real >= -margin * largest) & (eigens.imag != 0), axis=1)
+            candidates[remaining[found][accepted]] = False
+        for j, i in enumerate(rows):
+            clear[i] = bool(candidates[j])
+    return clear
+
+
+def simulate_oscillation_window(r, reset, streaming=False, ladder=None):
+    """
+    Private function. Simulate the model from its initial state over the window used by the oscillator tests, going
+    up the solver ladder until a simulation succeeds. Once a simulation fails with a convergence or error test
+    failure, the rungs with the same tolerances are skipped. With the adaptive solver (see enable_adaptive_solver),
+    the model starts from the cheapest rung that worked for models of its class (see SolverMemory). The integrator
+    settings of the model are restored afterwards.
+    :param r: RoadRunner model
+    :param reset: Function used to reset the model, e.g. r.resetToOrigin
+    :param streaming: optional (bool), if True, the trajectory is classified with detect_oscillation_streaming as it
+        is integrated and the simulation stops early if it blows up. Otherwise the model is integrated to the end of
+        the window, so the tests that follow see the same state as without streaming. Only the rungs with the output
+        density of the window are used, since the verdict depends on the samples
+    :param ladder: optional list(SolverConfiguration), the ladder enabled with enable_adaptive_solver,
+        REFERENCE_LADDER by default
+    :return: (str) "failed" if the simulation failed, "simulated" if not streaming, otherwise the verdict of
+        detect_oscillation_streaming
+    """
+    start, end, numpoints = OSCILLATION_WINDOW
+    ladder = ladder or get_solver_ladder()
+    if streaming:
+        ladder = [configuration for configuration in ladder if configuration.numpoints == numpoints]
+    memory = get_solver_memory()
+    key = model_class(r) if memory is not None else None
+    observations = []
+    failed_tolerances = set()
+    outcome = "failed"
+    for configuration in ladder[memory.start(key, ladder) if memory is not None else 0:]:
+        tolerances = (configuration.integrator, configuration.relative_tolerance, configuration.absolute_tolerance)
+        if tolerances in failed_tolerances:
+            continue
+        previous = configure_integrator(r, configuration)
+        try:
+            reset()
+            with profile_stage("simulate_retry" if observations else "simulate") as stage:
+                if streaming:
+                    stage.outcome = detect_oscillation_streaming(r, end=end, numpoints=numpoints, run_to_end=True)
+                else:
+                    simulate_model(r, start, end, configuration.numpoints)
+                    stage.outcome = "simulated"
+            observations.append((configuration.name, "success"))
+            outcome = stage.outcome
+            break
+        except Exception as e:
+            mode = failure_mode(e)
+            observations.append((configuration.name, mode))
+            if mode in TOLERANCE_FAILURES:
+                failed_tolerances.add(tolerances)
+        finally:
+            restore_integrator(r, previous)
+    if memory is not None:
+        memory.record(key, observations)
+    return outcome
+
+
+def is_oscillator_preprocessed(r, streaming=False):
     """
     This is the "private" is_oscillator function. It assumes preprocessing has already been done with
     the function is_broken_oscillator and skips finding the inital steady state eigenvalues.
     :param r: Roadrunner model
+    :param streaming: optional (bool), if True, simulate with detect_oscillation_streaming and stop early if the
+        trajectory blows up. The other verdicts are decided by the eigenvalues at the end of the window, as without
+        streaming
     :return: (bool) True is the model is an oscillator.
     """
-    r.resetToOrigin()
+    trajectory = simulate_oscillation_window(r, r.resetToOrigin, streaming=streaming)
+    if trajectory in ["failed", "diverged"]:
+        return decided("simulate", False)
     try:
-        r.simulate(0, 50, 100000)
-
+        with profile_stage("eigenvalues") as stage:
+            eigens = r.getFullEigenValues()
+            hasgoodvals = check_eigens(eigens)
+            stage.outcome = "oscillator" if hasgoodvals else "no_oscillation"
     except:
-        try:
-            r.integrator.relative_tolerance = 1e-10
-            r.resetToOrigin()
-            r.simulate(0, 50, 100000)
-        except:
-            return False
-    try:
-        eigens = r.getFullEigenValues()
-    except:
-        return False
-    hasgoodvals = check_eigens(eigens)
+        return decided("eigenvalues", False)
     if hasgoodvals:
-        return True
+        return decided("eigenvalues", True)
     # 4. If that still didn't work, calculate steady state again
     try:
-        s = r.steadyState()
-        change = r.getRatesOfChange()
-        eigens = r.getFullEigenValues()
-        hasgoodvals = check_eigens(eigens)
+        with profile_stage("steady_state_retry") as stage:
+            s = r.steadyState()
+            change = r.getRatesOfChange()
+            eigens = r.getFullEigenValues()
+            hasgoodvals = check_eigens(eigens)
+            stage.outcome = "oscillator" if hasgoodvals else "no_oscillation"
     except:
         pass
     # And if that doesn't work then it's definitely (?) not an oscillator
-    return hasgoodvals and all(i >= 0 for i in r.getFloatingSpeciesConcentrations())
+    return decided("steady_state_retry", hasgoodvals and all(i >= 0 for i in r.getFloatingSpeciesConcentrations()))
 
 
-def is_oscillator(r):
+def is_oscillator(r, reset_parameters=True, streaming=False):
     """
     This is intended to be the "public" function. Given a roadrunner model, perform all tests for oscillation.
     It will mark "broken" oscillators as non-oscillators and will not attempt repair
     :param r: RoadRunner model
+    :param reset_parameters: optional (bool), if False, the model is reset with r.reset() rather than
+        r.resetToOrigin(), which keeps rate constants that were changed in place
+    :param streaming: optional (bool), if True, simulate with detect_oscillation_streaming and stop early if the
+        trajectory blows up. The other verdicts are decided by the eigenvalues at the end of the window, as without
+        streaming
     :return: (bool) True is the model oscillates
     """
+    reset = r.resetToOrigin if reset_parameters else r.reset
     try:
-        r.resetToOrigin()
-        s = r.steadyState()
-        eigens = r.getFullEigenValues()
-        hasgoodvals = check_eigens(eigens)
-        if hasgoodvals and all(i >= 0 for i in r.getFloatingSpeciesConcentrations()):
-            return True
+        with profile_stage("steady_state") as stage:
+            reset()
+            s = r.steadyState()
+            eigens = r.getFullEigenValues()
+            hasgoodvals = check_eigens(eigens)
+            stage.outcome = "no_oscillation"
+            if hasgoodvals and all(i >= 0 for i in r.getFloatingSpeciesConcentrations()):
+                stage.outcome = "oscillator"
+        if stage.outcome == "oscillator":
+            return decided("steady_state", True)
     except:
         pass
     # If that didn't work, simulate for a bit
-    r.resetToOrigin()
-    try:
-        r.simulate(0, 50, 100000)
-
-    except:
-        try:
-            r.integrator.relative_tolerance = 1e-10
-            r.resetToOrigin()
-            r.simulate(0, 50, 100000)
-        except:
-            return False
+    trajectory = simulate_oscillation_window(r, reset, streaming=streaming)
+    if trajectory in ["failed", "diverged"]:
+        return decided("simulate", False)
     try:
-        eigens = r.getFullEigenValues()
+        with profile_stage("eigenvalues") as stage:
+            eigens = r.getFullEigenValues()
+            hasgoodvals = check_eigens(eigens)
+            stage.outcome = "oscillator" if hasgoodvals else "no_oscillation"
     except:
-        return False
-    hasgoodvals = check_eigens(eigens)
+        return decided("eigenvalues", False)
     if hasgoodvals:
-        return True
+        return decided("eigenvalues", True)
     # If that still didn't work, calculate steady state again
     try:
-        s = r.steadyState()
-        change = r.getRatesOfChange()
-        eigens = r.getFullEigenValues()
-        hasgoodvals = check_eigens(eigens)
+        with profile_stage("steady_state_retry") as stage:
+            s = r.steadyState()
+            change = r.getRatesOfChange()
+            eigens = r.getFullEigenValues()
+            hasgoodvals = check_eigens(eigens)
+            stage.outcome = "oscillator" if hasgoodvals else "no_oscillation"
     except:
         pass
     # And if that doesn't work then it's definitely (?) not an oscillator
-    return hasgoodvals and all(i >= 0 for i in r.getFloatingSpeciesConcentrations())
+    return decided("steady_state_retry", hasgoodvals and all(i >= 0 for i in r.getFloatingSpeciesConcentrations()))
+
+
+def prefetch_model_records(path, files, size=16):
+    """
+    Private function. Read model files on a background I/O thread so that reading overlaps with evaluation
+    :param path: (str) Path to the directory containing the models
+    :param files: list(str) File names of the models
+    :param size: optional (int), maximum number of records read ahead
+    :return: generator of ModelRecord, in the order of files
+    """
+    records = queue.Queue(maxsize=size)
+
+    def reader():
+        for file in files:
+            records.put(read_model_record(path, file))
+        records.put(None)
+
+    threading.Thread(target=reader, daemon=True).start()
+    while True:
+        record = records.get()
+        if record is None:
+            return
+        yield record
+
+
+def evaluate_model(astr, fitness=None, streaming=False):
+    """
+    Private function. Evaluate a single antimony model for oscillation without touching the file system.
+    Repair will be attempted for broken oscillators.
+    :param astr: (str) Antimony string of the model
+    :param fitness: optional (float), fitness of the model, appended to the repaired antimony string
+    :param streaming: optional (bool), passed on to the oscillator tests
+    :return: (str, str) The verdict and the repaired antimony string (None unless the model was repaired).
+        The verdict is one of "success", "repaired", "broken" (a broken oscillator that could not be repaired)
+        or "fail"
+    """
+    with profile_stage("load"):
+        r = te.loada(astr)
+    is_good_oscillator, is_broken = is_broken_oscillator(r)
+    if is_good_oscillator:
+        return "success", None
+    elif is_broken:
+        # Try to fix the broken oscillator. When profiling, the time of this stage includes the tests of each knockout
+        with profile_stage("repair") as stage:
+            is_fixed, astr = fix_model(r.getAntimony(), fitness=fitness, streaming=streaming)
+            stage.outcome = "repaired" if is_fixed else "not_repaired"
+        if is_fixed:
+            return "repaired", astr
+        return "broken", None
+    elif is_oscillator_preprocessed(r, streaming=streaming):
+        return "success", None
+    return "fail", None
 
 
-def evaluate_oscillators(path: str):
+def screen_model(astr):
+    """
+    Private function. Cheap first stage of a scheduled evaluation (see evaluate_model_files_scheduled): load the model
+    and test the eigenvalues at its steady state with is_broken_oscillator
+    :param astr: (str) Antimony string of the model
+    :return: (str, None) "success" if the model is a good oscillator, "pending" if it needs the rest of the tests
+    """
+    with profile_stage("load"):
+        r = te.loada(astr)
+    is_good_oscillator, is_broken = is_broken_oscillator(r)
+    return "success" if is_good_oscillator else "pending", None
+
+
+def evaluate_model_file(filepath, streaming=False):
+    """
+    Private function. Evaluate a single antimony file for oscillation without touching the file system.
+    Repair will be attempted for broken oscillators.
+    :param filepath: (str) Path to the antimony file
+    :param streaming: optional (bool), passed on to the oscillator tests
+    :return: (str, str) The verdict and the repaired antimony string, see evaluate_model
+    """
+    record = read_model_record(os.path.dirname(filepath), os.path.basename(filepath))
+    return evaluate_model(record.astr, fitness=record.fitness, streaming=streaming)
+
+
+def verdict_to_cache(astr, verdict, repaired_astr, labels, precision):
+    """
+    Private function. Turn the verdict of evaluate_model_file into a VerdictCache entry that doesn't depend on species
+    names. A repair is stored as the canonical form of the reaction that was removed.
+    :param astr: (str) Antimony string of the model
+    :param verdict: (str) Verdict returned by evaluate_model_file
+    :param repaired_astr: (str) Repaired antimony string, only used if the verdict is "repaired"
+    :param labels: (dict) Canonical labels of the species, as returned by VerdictCache.key
+    :param precision: (int) Precision of the cache
+    :return: (dict) or None The cache entry, None if the verdict shouldn't be cached
+    """
+    if verdict in ["error", "timeout"]:
+        return None
+    if verdict != "repaired":
+        return {"verdict": verdict}
+    before = [canonical_reaction(reaction, labels, precision)
+              for reaction in parse_mass_action_network(astr)["reactions"]]
+    repaired = parse_mass_action_network(repaired_astr)
+    if repaired is None:
+        return None
+    for reaction in repaired["reactions"]:
+        reaction = canonical_reaction(reaction, labels, precision)
+        if reaction in before:
+            before.remove(reaction)
+    if len(before) != 1:
+        return None
+    return {"verdict": "repaired", "removed": before[0]}
+
+
+def verdict_from_cache(record, entry, labels, precision):
+    """
+    Private function. Turn a VerdictCache entry back into the result of evaluate_model for a model
+    :param record: (ModelRecord) The model
+    :param entry: (dict) Cache entry made by verdict_to_cache
+    :param labels: (dict) Canonical labels of the species of this model
+    :param precision: (int) Precision of the cache
+    :return: (str, str) or None The verdict and the repaired antimony string, None if the repair can't be applied
+    """
+    if entry["verdict"] != "repaired":
+        return entry["verdict"], None
+    # Comment out the same reaction that evaluate_model would have, in the form it would have written
+    r = te.loada(record.astr)
+    lines = r.getAntimony().split("\n")
+    for i, line in enumerate(lines):
+        reaction = parse_reaction_line(line.split("//")[0].strip())
+        if reaction is None:
+            continue
+        reactants, products, k = reaction
+        if canonical_reaction((reactants, products, r[k]), labels, precision) == entry["removed"]:
+            lines[i] = "#" + line
+            astr = "\n".join(lines)
+            if record.fitness is not None:
+                astr += f"\n#fitness: {record.fitness}"
+            return "repaired", astr
+    return None
+
+
+def apply_verdict(path, file, verdict, astr=None, index=None):
+    """
+    Private function. Rename (and rewrite, if repaired) a model file according to its verdict
+    :param path: (str) Path to the directory containing the model
+    :param file: (str) File name of the model
+    :param verdict: (str) Verdict returned by evaluate_model, "error" if the evaluation crashed or "timeout" if it ran
+        out of its time budget
+    :param astr: (str) Repaired antimony string, only used if the verdict is "repaired"
+    :param index: optional (ModelIndex), index of the directory, the verdict will be recorded in it
+    :return: None
+    """
+    if verdict == "repaired":
+        with open(os.path.join(path, file), 'w') as f:
+            f.write(astr)
+    if index is not None and verdict not in ["error", "timeout"]:  # Retried next time
+        index.record_verdict(file, verdict, repaired=verdict == "repaired")
+    new_name = verdict_file_name(file, verdict)
+    if new_name != file:
+        if index is not None:
+            index.rename(file, new_name)
+        else:
+            os.rename(os.path.join(path, file), os.path.join(path, new_name))
+
+
+class EvaluationJournal:
+    """
+    Checkpoint journal of evaluate_oscillators, kept in the model directory while a run is in progress. Each verdict
+    is appended and flushed to disk before its file is renamed or rewritten, so after an interruption the next run
+    applies the journaled verdicts instead of evaluating those models again. The journal is deleted once a run
+    finishes.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: (str) Path to the directory of antimony models
+        """
+        self.filepath = os.path.join(path, EVALUATION_JOURNAL_FILENAME)
+        self.entries = {}
+        self.file = None
+        self.torn = False
+        if os.path.exists(self.filepath):
+            with open(self.filepath, "r") as f:
+                lines = f.read().split("\n")
+            self.torn = lines[-1] != ""  # The last write was interrupted
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.entries[entry["file"]] = entry
+
+    def append(self, results):
+        """
+        Write verdicts to the journal
+        :param results: list((str, str, str)) File name, verdict and repaired antimony string (or None) of each model
+        :return: None
+        """
+        if self.file is None:
+            self.file = open(self.filepath, "a")
+            if self.torn:
+                self.file.write("\n")
+        for file, verdict, astr in results:
+            entry = {"file": file, "verdict": verdict, "astr": astr}
+            self.file.write(json.dumps(entry) + "\n")
+            self.entries[file] = entry
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        """
+        Delete the journal once all verdicts have been applied
+        :return: None
+        """
+        self.close()
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+
+def write_verdicts(path, verdicts, journal=None, index=None, errors=None, batch_size=64, archive=None):
+    """
+    Private function. Writer stage of evaluate_oscillators, run on its own thread. Takes verdicts from a queue in
+    batches, journals each batch and then renames or rewrites the files, until it receives None.
+    :param path: (str) Path to the directory containing the models
+    :param verdicts: (queue.Queue) (file name, verdict, repaired antimony string) tuples, then None
+    :param journal: optional (EvaluationJournal), checkpoint journal
+    :param index: optional (ModelIndex), index of the directory
+    :param errors: optional (list), an exception raised while writing is appended to it
+    :param batch_size: optional (int), maximum number of verdicts journaled together
+    :param archive: optional (ModelArchive), if given, verdicts are recorded in the archive instead of renaming files
+    :return: None
+    """
+    done = False
+    while not done:
+        batch = [verdicts.get()]
+        while batch[-1] is not None and len(batch) < batch_size:
+            try:
+                batch.append(verdicts.get_nowait())
+            except queue.Empty:
+                break
+        if batch[-1] is None:
+            batch.pop()
+            done = True
+        if errors:
+            continue  # Keep draining the queue so that the evaluation stage isn't blocked
+        try:
+            if journal is not None and batch:
+                journal.append(batch)
+            for file, verdict, astr in batch:
+                if archive is not None:
+                    archive.set_verdict(file, verdict, astr if verdict == "repaired" else None)
+                else:
+                    apply_verdict(path, file, verdict, astr, index=index)
+            if index is not None:
+                index.conn.commit()
+            if archive is not None:
+                archive.flush()
+        except Exception as e:
+            if errors is None:
+                raise
+            errors.append(e)
+
+
+def oscillator_worker(conn):
+    """
+    Private function. Worker loop for evaluate_oscillators when run with several workers. Each worker is a separate
+    process with its own tellurium/RoadRunner state, so a crash only takes down that worker.
+    :param conn: (multiprocessing.connection.Connection) Pipe to the parent process. Sends "ready" once tellurium is
+        loaded, then receives (ModelRecord, streaming, profile, task) tuples (None to stop), where task is "evaluate"
+        (evaluate_model) or "screen" (screen_model), and sends back (verdict, repaired antimony string, profile records
+        or None) for each one
+    :return: None
+    """
+    te.load_module()  # Not counted in the time of the first model
+    conn.send("ready")
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        record, streaming, profile, task = task
+        profiler = StageProfiler() if profile else None
+        try:
+            with profiling(profiler):
+                if profiler is not None:
+                    profiler.model = record.file
+                if task == "screen":
+                    verdict, astr = screen_model(record.astr)
+                else:
+                    verdict, astr = evaluate_model(record.astr, fitness=record.fitness, streaming=streaming)
+        except Exception:
+            verdict, astr = "error", None
+        conn.send((verdict, astr, profiler.records if profiler is not None else None))
+    conn.close()
+
+
+def evaluate_model_files_parallel(records, workers, timeout=None, streaming=False, on_result=None, task="evaluate",
+                                  timeouts=None, timeout_verdict="error", durations=None):
+    """
+    Private function. Evaluate models using a pool of worker processes. If a worker dies (e.g. libroadrunner
+    segfaults) or takes longer than the timeout, it is killed and replaced, and the model is marked as an error.
+    When profiling is enabled, the profile records of the workers are added to the current profiler.
+    :param records: iterable of ModelRecord, the models to evaluate. Consumed lazily, so it can be a generator
+    :param workers: (int) Number of worker processes
+    :param timeout: optional (float), maximum number of seconds to spend on a single model
+    :param streaming: optional (bool), passed on to the oscillator tests
+    :param on_result: optional (function), called with the file name and the result as soon as a model is done
+    :param task: optional (str), "evaluate" to run evaluate_model or "screen" to run screen_model
+    :param timeouts: optional dict(str: float), timeouts of some files, overriding timeout
+    :param timeout_verdict: optional (str), verdict of the models that take longer than their timeout
+    :param durations: optional (dict), filled with the number of seconds spent on each file
+    :return: dict(str: (str, str)) The verdict and repaired antimony string (or None) for each file
+    """
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    records = iter(records)
+    pending = list(itertools.islice(records, workers))
+    slots = []  # Each slot is [process, connection, file being evaluated, start time, timeout, ready]
+    if not pending:
+        return results
+
+    def start_worker():
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=oscillator_worker, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        return [process, parent_conn, None, None, None, False]
+
+    def finish(file, result, start=None):
+        results[file] = result
+        if durations is not None and start is not None:
+            durations[file] = time.monotonic() - start
+        if on_result is not None:
+            on_result(file, result)
+
+    def next_record():
+        while True:
+            record = pending.pop(0) if pending else next(records, None)
+            if record is None or record.astr is not None:
+                return record
+            finish(record.file, ("error", None))  # The file couldn't be read
+
+    for _ in range(min(workers, len(pending))):
+        slots.append(start_worker())
+    try:
+        exhausted = False
+        while not exhausted or any(slot[2] is not None for slot in slots):
+            # Hand out work to idle workers
+            for slot in slots:
+                if slot[5] and slot[2] is None and not exhausted:
+                    record = next_record()
+                    if record is None:
+                        exhausted = True
+                        break
+                    slot[2] = record.file
+                    slot[3] = time.monotonic()
+                    slot[4] = timeouts.get(record.file, timeout) if timeouts is not None else timeout
+                    slot[1].send((record, streaming, oscillation_profiler is not None, task))
+            busy = [slot for slot in slots if slot[2] is not None]
+            starting = [slot for slot in slots if not slot[5]]
+            if not busy and not starting:
+                continue
+            wait_time = None
+            if any(slot[4] is not None for slot in busy):
+                wait_time = max(0, min(slot[3] + slot[4] for slot in busy if slot[4] is not None) - time.monotonic())
+            watched = busy + starting
+            ready = wait([slot[1] for slot in watched] + [slot[0].sentinel for slot in watched], timeout=wait_time)
+            for slot in starting:
+                if slot[1] in ready or slot[0].sentinel in ready:
+                    try:
+                        slot[1].recv()
+                    except (EOFError, OSError):
+                        raise RuntimeError("An evaluation worker process failed to start")
+                    slot[5] = True
+            for i, slot in enumerate(slots):
+                if slot[2] is None:
+                    continue
+                crashed = False
+                verdict = "error"
+                if slot[1] in ready or slot[0].sentinel in ready:
+                    try:
+                        verdict, astr, profile_records = slot[1].recv()
+                    except (EOFError, OSError):
+                        crashed = True
+                    else:
+                        if profile_records is not None and oscillation_profiler is not None:
+                            oscillation_profiler.records.extend(profile_records)
+                        finish(slot[2], (verdict, astr), slot[3])
+                elif slot[4] is not None and time.monotonic() - slot[3] >= slot[4]:
+                    crashed = True
+                    verdict = timeout_verdict
+                else:
+                    continue
+                if crashed:
+                    # Kill the worker and replace it with a new one
+                    finish(slot[2], (verdict, None), slot[3])
+                    slot[0].kill()
+                    slot[0].join()
+                    slot[1].close()
+                    slots[i] = start_worker()
+                else:
+                    slot[2] = None
+    finally:
+        for slot in slots:
+            if slot[0].is_alive() and slot[2] is None:
+                try:
+                    slot[1].send(None)
+                except OSError:
+                    pass
+            slot[0].join(timeout=1)
+            if slot[0].is_alive():
+                slot[0].kill()
+                slot[0].join()
+            slot[1].close()
+    return results
+
+
+def evaluate_model_files_scheduled(records, workers, budget, streaming=False, on_result=None):
+    """
+    Private function. Evaluate models in worker processes within a wall clock budget per model. The cheap steady state
+    test (screen_model) is run for all models first, then the full tests are run on the models it didn't decide,
+    highest fitness first, each with what is left of its budget. Models that run out of budget are killed and get
+    the verdict "timeout", so the whole run takes at most about len(records) * budget / workers seconds, plus the time
+    to start a new worker after each timeout.
+    :param records: iterable of ModelRecord, the models to evaluate
+    :param workers: (int) Number of worker processes
+    :param budget: (float) Maximum number of seconds to spend on a single model over both stages
+    :param streaming: optional (bool), passed on to the oscillator tests
+    :param on_result: optional (function), called with the file name and the result as soon as a model is done
+    :return: dict(str: (str, str)) The verdict and repaired antimony string (or None) for each file
+    """
+    results = {}
+    pending = {}
+    durations = {}
+    records = {record.file: record for record in records}
+
+    def finish(file, result):
+        results[file] = result
+        if on_result is not None:
+            on_result(file, result)
+
+    def screened(file, result):
+        if result[0] == "pending":
+            pending[file] = records[file]
+        else:
+            finish(file, result)
+
+    evaluate_model_files_parallel(records.values(), workers, timeout=budget, on_result=screened, task="screen",
+                                  timeout_verdict="timeout", durations=durations)
+    # The full tests repeat the cheap ones, which are quick for the models that got this far
+    ordered = sorted(pending.values(), key=lambda record: -record.fitness if record.fitness is not None else math.inf)
+    remaining = {record.file: budget - durations[record.file] for record in ordered}
+    for record in ordered:
+        if remaining[record.file] <= 0:
+            finish(record.file, ("timeout", None))
+    evaluate_model_files_parallel([record for record in ordered if remaining[record.file] > 0], workers,
+                                  streaming=streaming, on_result=finish, timeouts=remaining, timeout_verdict="timeout")
+    return results
+
+
+def evaluate_oscillators(path: str, workers=None, timeout=None, use_index=False, streaming=False,
+                         verdict_cache=None, checkpoint=False, profiler=None, screen=False, budget=None):
     """
     Evaluate models in a directly and label them as oscillators (success) or non-oscillators (fail). Repair will be
     attempted for broken oscillators.
-    :param path: (str) Path to a directory of antimony models
+    Models are read ahead on an I/O thread and files are renamed or rewritten on a writer thread, so the evaluation
+    itself never waits on the file system.
+    :param path: (str) Path to a directory of antimony models or a model archive (see pack_models). The verdicts of
+        an archive are recorded in its index as they come, so models that already have one are not evaluated again
+        (except errors and timeouts), and use_index and checkpoint don't apply
+    :param workers: optional (int), number of worker processes. If greater than 1, models are evaluated in parallel
+        and a crash or hang while evaluating one model only marks that model as an error (error_ prefix). Models
+        that raise an exception (e.g. that can't be parsed) are marked as errors with or without workers
+    :param timeout: optional (float), when running with workers, maximum number of seconds to spend on one model
+    :param use_index: optional (bool), if True, verdicts are stored in a persistent index in the directory and only
+        new or changed models are simulated on later runs
+    :param streaming: optional (bool), if True, simulations only stop at every 10th of the 100000 output points and
+        stop early if the trajectory blows up (see detect_oscillation_streaming)
+    :param verdict_cache: optional (VerdictCache), models that are relabeled or reordered copies of a network in the
+        cache (or earlier in the directory) get its verdict without being simulated
+    :param checkpoint: optional (bool), if True, verdicts are journaled in a .evaluation_journal.jsonl file in the
+        directory (see EvaluationJournal) so that an interrupted run picks up where it stopped when it is run again
+        with checkpoint. The file is deleted once a run finishes
+    :param profiler: optional (StageProfiler), records the time and outcome of each stage of the oscillator tests
+        for each model
+    :param screen: optional (bool), if True, models are first screened in batches with screen_non_oscillators and
+        those that clearly aren't oscillators are marked as fails without loading them in RoadRunner
+    :param budget: optional (float), maximum number of seconds to spend on each model. Models are evaluated in worker
+        processes (at least one) with the cheap steady state test first and the simulations by decreasing fitness
+        (see evaluate_model_files_scheduled), and those that run out of time are marked as timeouts (timeout_ prefix)
+        rather than fails. Timeouts aren't recorded in the index, so they are evaluated again on the next run
     :return: (int, int) The number of oscillators found and the total number of models evaluated
     """
-    success_count = 0
-    total_count = 0
-    for file in os.listdir(path):
-        if not file.endswith(".json"):
-            r = load_model(os.path.join(path, file))
-            fitness = get_model_fitness(os.path.join(path, file))
-            total_count += 1
-            is_good_oscillator, is_broken = is_broken_oscillator(r)
-            if is_good_oscillator:
-                success_count += 1
-                if "success" not in file:
-                    os.rename(os.path.join(path, file), os.path.join(path, f"success_{file}"))
-            elif is_broken:
-                # Try to fix the broken oscillator
-                is_fixed, astr = fix_model(r.getAntimony(), fitness=fitness)
-                if is_fixed:
-                    success_count += 1
-                    with open(os.path.join(path, file), 'w') as f:
-                        f.write(astr)
-                    if "success" not in file:
-                        os.rename(os.path.join(path, file), os.path.join(path, f"success_{file}"))
+    counts = {"total": 0, "success": 0, "error": 0, "timeout": 0}
+    archive = ModelArchive(path, writable=True) if is_model_archive(path) else None
+    if archive is not None:
+        files = list(archive.ids)
+    else:
+        files = sorted(file for file in os.listdir(path) if not file.endswith(".json") and not is_auxiliary_file(file))
+    journal = EvaluationJournal(path) if checkpoint and archive is None else None
+    index = ModelIndex(path) if use_index and archive is None else None
+    results = {}  # Verdicts known before evaluating anything
+    if archive is not None:
+        for file in files:
+            verdict = archive.verdict(file)
+            if verdict not in [None, "error", "timeout"]:
+                results[file] = (verdict, None)
+    if journal is not None:
+        present = set(files)
+        for file, entry in journal.entries.items():
+            if file in present:
+                results[file] = (entry["verdict"], entry["astr"])  # Journaled but maybe not applied yet
+            elif verdict_file_name(file, entry["verdict"]) in present:
+                # Already applied by the interrupted run, only count it
+                files.remove(verdict_file_name(file, entry["verdict"]))
+                counts["total"] += 1
+                counts["success"] += entry["verdict"] in ["success", "repaired"]
+                counts["error"] += entry["verdict"] == "error"
+                counts["timeout"] += entry["verdict"] == "timeout"
+        if journal.entries:
+            print(f"Resuming: {len(journal.entries)} models were already evaluated")
+    if index is not None:
+        index.prune(files)
+        for file in files:
+            if file in results:
+                continue
+            record = index.lookup(file)
+            if record["verdict"] == "repaired":  # The file already holds the repaired model
+                results[file] = ("success", None)
+            elif record["verdict"] is not None:
+                results[file] = (record["verdict"], None)
+        index.conn.commit()
+    to_evaluate = [file for file in files if file not in results]
+
+    verdicts = queue.Queue()
+    writer_errors = []
+    writer = threading.Thread(target=write_verdicts, args=(path, verdicts, journal, index, writer_errors),
+                              kwargs={"archive": archive}, daemon=True)
+    writer.start()
+
+    def finish(file, result):
+        verdict, astr = result
+        counts["total"] += 1
+        counts["success"] += verdict in ["success", "repaired"]
+        counts["error"] += verdict == "error"
+        counts["timeout"] += verdict == "timeout"
+        verdicts.put((file, verdict, astr))
+
+    cache_keys = {}
+    kind = "evaluate-streaming" if streaming else "evaluate"
+
+    def cached_result(record):
+        if verdict_cache is None or record.astr is None:
+            return None
+        if record.file not in cache_keys:
+            cache_keys[record.file] = verdict_cache.key(kind, record.astr)
+        key, labels = cache_keys[record.file]
+        entry = verdict_cache.get(key) if key is not None else None
+        if entry is None:
+            return None
+        return verdict_from_cache(record, entry, labels, verdict_cache.precision)
+
+    def screened(records, batch_size=256):
+        # Pass on the records that need the full tests, in batches so the screen can use stacked arrays
+        records = iter(records)
+        while True:
+            batch = list(itertools.islice(records, batch_size))
+            if not batch:
+                return
+            readable = [record for record in batch if record.astr is not None]
+            if profiler is not None:
+                profiler.model = None  # The screen is timed for the whole batch
+            with profile_stage("screen"):
+                clear = screen_non_oscillators([record.astr for record in readable], batch_size=batch_size)
+            rejected = {record.file for record, is_clear in zip(readable, clear) if is_clear}
+            for record in batch:
+                if record.file in rejected:
+                    if profiler is not None:
+                        profiler.model = record.file
+                    decided("screen", False)
+                    finish(record.file, ("fail", None))
+                else:
+                    yield record
+
+    def cache_result(record, result):
+        key, labels = cache_keys.get(record.file, (None, None))
+        if key is not None:
+            entry = verdict_to_cache(record.astr, result[0], result[1], labels, verdict_cache.precision)
+            if entry is not None:
+                verdict_cache.put(key, entry)
+
+    try:
+        for file, result in results.items():
+            finish(file, result)
+        with profiling(profiler):
+            if archive is not None:
+                records = (ModelRecord(file, archive.text(file), archive.fitness(file)) for file in to_evaluate)
             else:
-                if is_oscillator_preprocessed(r):
-                    success_count += 1
-                    if "success" not in file:
-                        os.rename(os.path.join(path, file), os.path.join(path, f"success_{file}"))
+                records = prefetch_model_records(path, to_evaluate)
+            if screen:
+                records = screened(records)
+            if budget is not None or (workers is not None and workers > 1):
+                by_file = {}
+                group_results = {}
+
+                def on_result(file, result):
+                    if verdict_cache is not None:
+                        cache_result(by_file[file], result)
+                        group_results[cache_keys.get(file, (None, None))[0]] = result
+                    finish(file, result)
+
+                def tracked(records):
+                    for record in records:
+                        by_file[record.file] = record
+                        yield record
+
+                def run_workers(records):
+                    if budget is not None:
+                        evaluate_model_files_scheduled(tracked(records), max(workers or 1, 1), budget,
+                                                       streaming=streaming, on_result=on_result)
+                    else:
+                        evaluate_model_files_parallel(tracked(records), workers, timeout=timeout,
+                                                      streaming=streaming, on_result=on_result)
+
+                if verdict_cache is None:
+                    run_workers(records)
                 else:
-                    if "fail" not in file:
-                        os.rename(os.path.join(path, file), os.path.join(path, f"fail_{file}"))
+                    # Only one model of each group of equivalent networks is sent to the workers, the others are looked
+                    # up in the cache once its verdict is known
+                    representatives, waiting, seen = [], [], set()
+                    for record in records:
+                        key = None
+                        if record.astr is not None:
+                            cache_keys[record.file] = verdict_cache.key(kind, record.astr)
+                            key = cache_keys[record.file][0]
+                        if key is None or (key not in seen and key not in verdict_cache.verdicts):
+                            representatives.append(record)
+                            seen.add(key)
+                        else:
+                            waiting.append(record)
+                    run_workers(representatives)
+                    unresolved = []
+                    for record in waiting:
+                        result = cached_result(record)
+                        group_result = group_results.get(cache_keys[record.file][0])
+                        if result is None and group_result is not None and group_result[0] in ["error", "timeout"]:
+                            # The equivalent model crashed or ran out of its budget in a worker, and so would this one
+                            result = group_result
+                        if result is None:
+                            unresolved.append(record)
+                        else:
+                            finish(record.file, result)
+                    # Models whose verdict can't be carried over are evaluated by the workers too, never in this process
+                    run_workers(unresolved)
+                records = []
+            for record in records:
+                if profiler is not None:
+                    profiler.model = record.file
+                result = cached_result(record)
+                if result is None:
+                    if record.astr is None:
+                        result = ("error", None)
+                    else:
+                        try:
+                            result = evaluate_model(record.astr, fitness=record.fitness, streaming=streaming)
+                        except Exception:
+                            # Same as in a worker (see oscillator_worker), so the verdicts don't depend on workers
+                            result = ("error", None)
+                        if verdict_cache is not None:
+                            cache_result(record, result)
+                finish(record.file, result)
+    finally:
+        verdicts.put(None)
+        writer.join()
+        if index is not None:
+            index.close()
+        if journal is not None:
+            journal.close()
+        if archive is not None:
+            archive.close()
+    if writer_errors:
+        raise writer_errors[0]
+    if journal is not None:
+        journal.remove()
+    success_count, total_count, error_count = counts["success"], counts["total"], counts["error"]
     print(f"Processed {total_count} models and found {success_count} oscillators.")
-    print(f"Success rate: {(success_count / total_count) * 100}%")
+    if error_count > 0:
+        print(f"{error_count} models could not be evaluated and were marked as errors")
+    if counts["timeout"] > 0:
+        print(f"{counts['timeout']} models ran out of their time budget and were marked as timeouts")
+    if total_count > 0:
+        print(f"Success rate: {(success_count / total_count) * 100}%")
+    if verdict_cache is not None:
+        print(f"{verdict_cache.hits} verdicts found in the cache")
     return success_count, total_count
 
 
-def sort_by_fitness(path, reverse=True):
+def sort_by_fitness(path, reverse=True, use_index=False):
     """
-    Given a directory of models, sort them by fitness, best to worst
-    :param path: (str) path to directory containing antimony files
+    Given a directory of models, sort them by fitness, best to worst, by prefixing each file with its rank.
+    See rank_by_fitness to rank models without renaming them
+    :param path: (str) path to directory containing antimony files, or a model archive, whose IDs are prefixed
     :param reverse: (bool, optional) If True, models will be sorted best to worst
+    :param use_index: optional (bool), if True, fitness values are read from the persistent index of the directory
+        and only new or changed files are read
     :return: None
     """
+    if is_model_archive(path):
+        with ModelArchive(path, writable=True) as archive:
+            archive.rename({file: f"{i}_{file}" for i, file in enumerate(archive.ranked(reverse=reverse))})
+        print(f"Sorted models in {path} by fitness")
+        return
     model_list = []
-    for file in os.listdir(path):
-        fitness = get_model_fitness(os.path.join(path, file))
-        model_list.append((fitness, file))
-    model_list = sorted(model_list, reverse=reverse)
-    for i, item in enumerate(model_list):
-        os.rename(os.path.join(path, item[1]), os.path.join(path, f"{i}_{item[1]}"))
+    index = ModelIndex(path) if use_index else None
+    try:
+        for file in os.listdir(path):
+            if is_auxiliary_file(file):
+                continue
+            if index is not None:
+                fitness = index.get_fitness(file)
+            else:
+                fitness = get_model_fitness(os.path.join(path, file))
+            model_list.append((fitness, file))
+        model_list = sorted(model_list, reverse=reverse)
+        for i, item in enumerate(model_list):
+            if index is not None:
+                index.rename(item[1], f"{i}_{item[1]}")
+            else:
+                os.rename(os.path.join(path, item[1]), os.path.join(path, f"{i}_{item[1]}"))
+    finally:
+        if index is not None:
+            index.close()
     print(f"Sorted models in {path} by fitness")
 
 
-def evaluate_fitness_cutoff(path, cutoff):
+def read_fitness_from_tail(path, tail_bytes=256):
+    """
+    Read the fitness of a model file from its last bytes, where the evolution writes the #fitness line, falling back
+    to reading the whole file if the line isn't there
+    :param path: (str) Path to the antimony file
+    :param tail_bytes: optional (int), number of bytes read from the end of the file
+    :return: (float) Fitness of the model, None if the file has no fitness line
+    """
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - tail_bytes))
+        tail = f.read().decode(errors="replace")
+    lines = tail.split("\n")
+    if size > tail_bytes:
+        lines = lines[1:]  # The first line may be cut
+    for line in reversed(lines):
+        if line.startswith("#fitness"):
+            return float(line.split(" ")[1])
+    if size <= tail_bytes:
+        return None
+    return get_model_fitness_from_file(path)
+
+
+def rank_by_fitness(path, k=None, reverse=True, use_index=False, destination=None, view="manifest", score=None):
+    """
+    Rank the models in a directory by fitness without renaming them. The directory is read in a single pass that
+    only keeps the best k models in a bounded heap, and the fitness is read from the end of each file (see
+    read_fitness_from_tail). The ranking is saved as a manifest, optionally with a view directory of links to the
+    ranked models, so ranking is a read-only operation that can simply be run again if it is interrupted.
+    :param path: (str) Path to a directory of antimony models
+    :param k: optional (int), only keep the best k models. All models by default
+    :param reverse: optional (bool), if True, models are ranked from the highest to the lowest fitness
+    :param use_index: optional (bool), if True, fitness values are read from the persistent index of the directory
+        and only new or changed files are read
+    :param destination: optional (str), where to save the ranking. For the "manifest" view, the path of the manifest
+        (RANKING_MANIFEST_FILENAME in the model directory by default). Otherwise, a view directory that is created
+        if needed and gets the manifest and one link per ranked model, named {rank}_{file}
+    :param view: optional (str), "manifest", "symlink" (links to the original files) or "hardlink" (hard links to
+        them, which must be on the same file system)
+    :param score: optional (str), rank by a score stored by rescore_models (e.g. "default_fitness") instead of the
+        fitness written in the files. Models without a value for the score are left out
+    :return: list((float, str)) The fitness (or score) and file name of the ranked models, best first
+    """
+    if view not in ["manifest", "symlink", "hardlink"]:
+        raise ValueError(f"Unknown view {view}, expected manifest, symlink or hardlink")
+    if view != "manifest" and destination is None:
+        raise ValueError("A destination directory is required for a symlink or hardlink view")
+    index = ModelIndex(path) if use_index else None
+    scores = None
+    if score is not None:
+        with ModelScores(path) as table:
+            scores = table.get(score)
+
+    def fitness_values():
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if is_auxiliary_file(entry.name) or not entry.is_file():
+                    continue
+                if scores is not None:
+                    fitness = scores.get(entry.name)
+                elif index is not None:
+                    fitness = index.get_fitness(entry.name)
+                else:
+                    fitness = read_fitness_from_tail(entry.path)
+                if fitness is not None:
+                    yield fitness, entry.name
+
+    try:
+        if k is None:
+            ranking = sorted(fitness_values(), reverse=reverse)
+        elif reverse:
+            ranking = heapq.nlargest(k, fitness_values())
+        else:
+            ranking = heapq.nsmallest(k, fitness_values())
+    finally:
+        if index is not None:
+            index.close()
+    manifest = {"path": os.path.abspath(path), "reverse": reverse, "view": view, "score": score,
+                "models": [{"rank": i, "fitness": fitness, "file": file} for i, (fitness, file) in enumerate(ranking)]}
+    if view == "manifest":
+        manifest_path = destination or os.path.join(path, RANKING_MANIFEST_FILENAME)
+    else:
+        os.makedirs(destination, exist_ok=True)
+        manifest_path = os.path.join(destination, RANKING_MANIFEST_FILENAME)
+        # Remove the links of an earlier ranking into this view
+        for model in read_ranking_manifest(manifest_path):
+            try:
+                os.remove(os.path.join(destination, f"{model['rank']}_{model['file']}"))
+            except FileNotFoundError:
+                pass
+        for model in manifest["models"]:
+            source = os.path.join(path, model["file"])
+            link = os.path.join(destination, f"{model['rank']}_{model['file']}")
+            if view == "symlink":
+                os.symlink(os.path.relpath(source, destination), link)
+            else:
+                os.link(source, link)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, manifest_path)
+    print(f"Ranked {len(ranking)} models in {path} by fitness, saved to {manifest_path}")
+    return ranking
+
+
+def read_ranking_manifest(manifest_path):
+    """
+    Private function. Read the ranked models of a manifest written by rank_by_fitness
+    :param manifest_path: (str) Path to the manifest
+    :return: list(dict) rank, fitness and file of each model, empty if there's no manifest
+    """
+    try:
+        with open(manifest_path, "r") as f:
+            return json.load(f)["models"]
+    except FileNotFoundError:
+        return []
+
+
+def evaluate_fitness_cutoff(path, cutoff, use_index=False):
     """
     Sort models as presumed oscillators (success) or presumed non-oscillators (fail) based on their fitness values.
     Models that have been repaired will be evaluated based on their pre-repair fitness value if present.
     Ignores models that don't have a fitness model
     :param path: Path to directory containing antimony models
     :param cutoff: (float) Fitness values equal or greater to this number will be considered oscillators
+    :param use_index: optional (bool), if True, fitness values are read from the persistent index of the directory
+        and only new or changed files are read
     :return: (int, int) The number of oscillators (successes) and the total number of models evaluated
     """
     success_count = 0
     total_count = 0
     no_fitness_count = 0
-    for file in os.listdir(path):
-        fitness = get_model_fitness(os.path.join(path, file))
-        total_count += 1
-        if fitness >= cutoff:
-            success_count += 1
-            if "success" not in file:
-                os.rename(os.path.join(path, file), os.path.join(path, f"success_{file}"))
-        elif fitness < cutoff:
-            if "fail" not in file:
-                os.rename(os.path.join(path, file), os.path.join(path, f"fail_{file}"))
-        else:  # If no fitness value is present, ignore it
-            no_fitness_count += 1
+    index = ModelIndex(path) if use_index else None
+    rename = index.rename if index is not None else lambda old, new: os.rename(os.path.join(path, old),
+                                                                               os.path.join(path, new))
+    try:
+        for file in os.listdir(path):
+            if is_auxiliary_file(file):
+                continue
+            if index is not None:
+                fitness = index.get_fitness(file)
+            else:
+                fitness = get_model_fitness(os.path.join(path, file))
+            total_count += 1
+            if fitness is None:  # If no fitness value is present, ignore it
+                no_fitness_count += 1
+            elif fitness >= cutoff:
+                success_count += 1
+                if "success" not in file:
+                    rename(file, f"success_{file}")
+            elif "fail" not in file:
+                rename(file, f"fail_{file}")
+    finally:
+        if index is not None:
+            index.close()
     print(f"Processed models in {path} by fitness cutoff of {cutoff}")
     if no_fitness_count == 1:
         print(f"{no_fitness_count} model did not have a fitness value and was ignored")
@@ -351,6 +2316,234 @@ def evaluate_fitness_cutoff(path, cutoff):
     return success_count, total_count
 
 
+#--------------------------------------------------
+# Re-Scoring
+#--------------------------------------------------
+
+ObjectiveData = collections.namedtuple("ObjectiveData", ["name", "time", "values", "species"])
+ObjectiveData.__doc__ = """
+Objective time series of the evolution (see get_objectivefunction in settings.jl): the name under which its scores are
+stored, the time points, the target values (one column per species, or a single series for the default objective) and
+the species names (None for the default objective, which every floating species is compared with)
+"""
+RESCORING_METRICS = ["fitness", "rmse"]
+
+
+def load_objective_data(path="DEFAULT", name=None):
+    """
+    Load the objective time series once, as the evolution does from the objective_data_path setting
+    :param path: optional (str), path to a CSV file with the time in the first column and one column per species
+        with a header of species names, or "DEFAULT" for the default oscillator objective
+    :param name: optional (str), name under which the scores are stored, the file name without extension (or
+        "default") by default
+    :return: (ObjectiveData)
+    """
+    if path == "DEFAULT":
+        return ObjectiveData(name or "default", np.linspace(0, 1.25, 11), np.array([5.0, 30.0] * 5 + [5.0]), None)
+    with open(path, "r") as f:
+        header = f.readline().strip().split(",")
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    species = [column.strip().strip('"') for column in header[1:]]
+    return ObjectiveData(name or os.path.splitext(os.path.basename(path))[0], data[:, 0], data[:, 1:], species)
+
+
+def read_objective_data_path(settings_path):
+    """
+    Private function. Read the objective_data_path setting of an evolution settings file
+    :param settings_path: (str) Path to the settings.json file
+    :return: (str) The path to the objective data, "DEFAULT" if it isn't set
+    """
+    with open(settings_path, "r") as f:
+        return json.load(f).get("objective_data_path", "DEFAULT")
+
+
+def simulate_on_grid(astrs, time_points):
+    """
+    Private function. Simulate models on exactly the given time points. An evenly spaced grid (as the evolution
+    assumes) is simulated in batches with simulate_mass_action, any other grid with RoadRunner one model at a time.
+    :param astrs: list(str) Antimony strings, None for models that couldn't be read
+    :param time_points: (numpy.ndarray) Time points
+    :return: list((numpy.ndarray, list(str))) The result of each model with time in the first column and the column
+        names, None for models that couldn't be simulated
+    """
+    readable = [i for i, astr in enumerate(astrs) if astr is not None]
+    results = [None] * len(astrs)
+    steps = np.diff(time_points)
+    if len(steps) > 0 and np.allclose(steps, steps[0]):
+        simulated = simulate_mass_action([astrs[i] for i in readable], time_points[0], time_points[-1],
+                                         len(time_points))
+        for i, result in zip(readable, simulated):
+            results[i] = result
+        return results
+    for i in readable:
+        try:
+            m = te.loada(astrs[i]).simulate(times=list(time_points))
+            results[i] = (np.array(m), list(m.colnames))
+        except Exception:
+            pass
+    return results
+
+
+def stack_trajectories(results, objective):
+    """
+    Private function. Stack the simulated species of several models into one array aligned with the objective
+    :param results: list((numpy.ndarray, list(str))) Simulation results, None for models that failed
+    :param objective: (ObjectiveData) The objective
+    :return: (numpy.ndarray) Shape (models, time points, species), NaN where a model failed or lacks a species. For
+        the default objective, every floating species of each model, padded to the largest number of species
+    """
+    points = len(objective.time)
+    if objective.species is None:
+        width = max([len(result[1]) - 1 for result in results if result is not None] + [1])
+        trajectories = np.full((len(results), points, width), np.nan)
+        for i, result in enumerate(results):
+            if result is not None and len(result[0]) == points:
+                trajectories[i, :, :result[0].shape[1] - 1] = result[0][:, 1:]
+        return trajectories
+    trajectories = np.full((len(results), points, len(objective.species)), np.nan)
+    for i, result in enumerate(results):
+        if result is None or len(result[0]) != points:
+            continue
+        columns = {name.strip("[]"): j for j, name in enumerate(result[1])}
+        for k, species in enumerate(objective.species):
+            if species in columns:
+                trajectories[i, :, k] = result[0][:, columns[species]]
+    return trajectories
+
+
+def score_trajectories(trajectories, objective, metric="fitness"):
+    """
+    Score stacked trajectories against the objective, for all models at once
+    :param trajectories: (numpy.ndarray) Shape (models, time points, species), see stack_trajectories
+    :param objective: (ObjectiveData) The objective
+    :param metric: optional (str), "fitness" for the fitness of the evolution (see evaluate_fitness in
+        ode_solver.jl): the inverse of the sum of absolute deviations, over the best matching species for the default
+        objective, 0 if the simulation failed; or "rmse" for the root mean square deviation, NaN if the simulation
+        failed
+    :return: (numpy.ndarray) The score of each model
+    """
+    if objective.species is None:
+        deviations = trajectories - objective.values[None, :, None]
+    else:
+        deviations = trajectories - objective.values[None, :, :]
+    if metric == "fitness":
+        errors = np.abs(deviations).sum(axis=1)
+    elif metric == "rmse":
+        errors = (deviations ** 2).mean(axis=1)
+    else:
+        raise ValueError(f"Unknown metric {metric}, expected one of {', '.join(RESCORING_METRICS)}")
+    if objective.species is None:
+        error = np.fmin.reduce(errors, axis=1)  # Best matching species, ignoring padding
+    elif metric == "fitness":
+        error = errors.sum(axis=1)
+    else:
+        error = errors.mean(axis=1)
+    with np.errstate(divide="ignore"):
+        if metric == "fitness":
+            return np.where(np.isnan(error), 0.0, 1 / error)
+        return np.sqrt(error)
+
+
+def rescoring_worker(path, files, objective, metrics):
+    """
+    Private function. Read, simulate and score a batch of models
+    :param path: (str) Path to a directory of antimony models or a model archive
+    :param files: list(str) File names (IDs in an archive)
+    :param objective: (ObjectiveData) The objective
+    :param metrics: list(str) Metrics to compute, see score_trajectories
+    :return: dict(str: numpy.ndarray) The scores of the batch for each metric
+    """
+    trajectories = stack_trajectories(simulate_on_grid(read_model_texts(path, files), objective.time), objective)
+    return {metric: score_trajectories(trajectories, objective, metric) for metric in metrics}
+
+
+class ModelScores:
+    """
+    Sidecar table of scores of the models of a directory or archive, stored as a sqlite database next to the models
+    (MODEL_SCORES_FILENAME) so the model files are never rewritten. Each score is stored under a name made of the
+    objective name and the metric, e.g. "default_fitness".
+    """
+
+    def __init__(self, path):
+        """
+        :param path: (str) Path to the directory of antimony models or the model archive
+        """
+        self.conn = sqlite3.connect(os.path.join(path, MODEL_SCORES_FILENAME))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS scores (name TEXT, score TEXT, value REAL, "
+                          "PRIMARY KEY (name, score))")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def put(self, score, files, values):
+        """
+        Store the values of a score for several models
+        :param score: (str) Name of the score
+        :param files: list(str) File names of the models
+        :param values: list(float) Values of the score, NaN is stored as NULL
+        :return: None
+        """
+        self.conn.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?)",
+                              [(file, score, None if math.isnan(value) else float(value))
+                               for file, value in zip(files, values)])
+
+    def get(self, score):
+        """
+        :param score: (str) Name of the score
+        :return: dict(str: float) Value of the score for each model that has one, None where it couldn't be computed
+        """
+        return dict(self.conn.execute("SELECT name, value FROM scores WHERE score = ?", (score,)).fetchall())
+
+    def names(self):
+        """
+        :return: list(str) Names of the scores in the table
+        """
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT score FROM scores ORDER BY score")]
+
+
+def rescore_models(path, objective_path="DEFAULT", name=None, metrics=("fitness",), workers=None, batch_size=256):
+    """
+    Score finished models against objective time series data without running the evolution again, e.g. after the
+    objective data changed or to add a second metric. The objective is loaded once, the models are simulated on its
+    time grid in batches (see simulate_mass_action), optionally in worker processes, and scored for a whole batch at
+    once. Scores are written to a sidecar table (see ModelScores) and the #fitness lines are left as they are.
+    :param path: (str) Path to a directory of antimony models or a model archive
+    :param objective_path: optional (str), objective data as for the objective_data_path setting, see
+        load_objective_data
+    :param name: optional (str), name of the objective in the score names, see load_objective_data
+    :param metrics: optional list(str), metrics to compute, see score_trajectories
+    :param workers: optional (int), number of worker processes
+    :param batch_size: optional (int), number of models simulated and scored together
+    :return: dict(str: dict(str: float)) For each score name, the score of each model
+    """
+    objective = load_objective_data(objective_path, name=name)
+    files = [file for file in list_model_files(path) if not file.endswith(".json")]
+    batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+    args = [(path, batch, objective, list(metrics)) for batch in batches]
+    if workers is not None and workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                    mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(rescoring_worker, *zip(*args)))
+    else:
+        results = [rescoring_worker(*arg) for arg in args]
+    scores = {}
+    with ModelScores(path) as table:
+        for metric in metrics:
+            score = f"{objective.name}_{metric}"
+            values = np.concatenate([result[metric] for result in results]) if results else np.zeros(0)
+            table.put(score, files, values)
+            scores[score] = dict(zip(files, values.tolist()))
+    print(f"Scored {len(files)} models against {objective.name}: {', '.join(scores)}")
+    return scores
+
+
 #--------------------------------------------------
 # Plotting Timeseries Data
 #-------------------------------------------------
@@ -371,32 +2564,34 @@ def get_best_dimensions(n):
         return best, best + 1
 
 
-def plot_timeseries_path(path, start, end, numpoints, savepath):
+def plot_timeseries_path(path, start, end, numpoints, savepath, engine="roadrunner"):
     """
     Private function for plotting time series data given a path to a directory
-    :param path: (str) Path to a directory containing antimony files
+    :param path: (str) Path to a directory containing antimony files or a model archive
     :param start: (float) Starting time for simulation
     :param end: (float) Ending time for simulation
     :param numpoints: (int) Number of points for the simulation
     :param savepath: (str) Path to save the figure, if applicable
+    :param engine: optional (str), "roadrunner" or "batch" to simulate the models with simulate_mass_action
     :return:
     """
     plt.clf()
     plt.rcParams.update({'font.size': 6})
-    filenames = os.listdir(path)
+    filenames = list_model_files(path)
     n = len(filenames)
     rows, cols = get_best_dimensions(n)
-    models = []
-    for file in os.listdir(path):
-        r = load_model(os.path.join(path, file))
-        models.append(r)
+    models = read_model_texts(path, filenames)
+    if engine == "batch":
+        results = simulate_mass_action(models, start, end, numpoints)
     idx = 0
-    fig, axs = plt.subplots(rows, cols)
+    fig, axs = plt.subplots(rows, cols, squeeze=False)
     for i in range(rows):
         for j in range(cols):
-            r = models[idx]
-            m = r.simulate(start, end, numpoints)
-            axs[i, j].plot(m['time'], m[:, 1:])
+            if engine == "batch" and results[idx] is not None:
+                m, names = results[idx]
+            else:
+                m, names = simulate_antimony(models[idx], start, end, numpoints)
+            axs[i, j].plot(m[:, 0], m[:, 1:])
             axs[i, j].set_title(filenames[idx])
             idx += 1
             if idx > n - 1:
@@ -412,7 +2607,7 @@ def plot_timeseries_path(path, start, end, numpoints, savepath):
         plt.show()
 
 
-def plot_timeseries_model_list(model_list, start, end, numpoints, savepath):
+def plot_timeseries_model_list(model_list, start, end, numpoints, savepath, engine="roadrunner"):
     """
     Private function for plotting time series data given a list of models
     :param path: list(str) OR list(RoadRunnermodels) models to plot
@@ -420,27 +2615,28 @@ def plot_timeseries_model_list(model_list, start, end, numpoints, savepath):
     :param end: (float) Ending time for simulation
     :param numpoints: (int) Number of points for the simulation
     :param savepath: (str) Path to save the figure, if applicable
+    :param engine: optional (str), "roadrunner" or "batch" to simulate antimony strings with simulate_mass_action
     :return: None
     """
     plt.clf()
-    if isinstance(model_list[0], str):  # If it's a list of antimony strings:
-        models = []
-        for astr in model_list:
-            r = te.loada(astr)
-            models.append(r)
-    else:
-        models = model_list
-    # Otherwise presumably it's a list of roadrunner models
+    models = model_list  # Either antimony strings or RoadRunner models
     n = len(models)
+    if engine == "batch":
+        strings = [i for i, model in enumerate(models) if isinstance(model, str)]
+        batched = dict(zip(strings, simulate_mass_action([models[i] for i in strings], start, end, numpoints)))
     rows, cols = get_best_dimensions(n)
     idx = 0
     plt.rcParams.update({'font.size': 6})
-    fig, axs = plt.subplots(rows, cols)
+    fig, axs = plt.subplots(rows, cols, squeeze=False)
     for i in range(rows):
         for j in range(cols):
-            r = models[idx]
-            m = r.simulate(start, end, numpoints)
-            axs[i, j].plot(m['time'], m[:, 1:])
+            if engine == "batch" and batched.get(idx) is not None:
+                m, names = batched[idx]
+            elif isinstance(models[idx], str):
+                m, names = simulate_antimony(models[idx], start, end, numpoints)
+            else:
+                m, names = simulate_model(models[idx], start, end, numpoints)
+            axs[i, j].plot(m[:, 0], m[:, 1:])
             axs[i, j].set_title(idx)
             idx += 1
             if idx > n - 1:
@@ -468,30 +2664,197 @@ def plot_single_model(model, start, end, numpoints, savepath):
     """
     plt.clf()
     if isinstance(model, str):  # if it's an antimony model
-        r = te.loada(model)
+        m, names = simulate_antimony(model, start, end, numpoints)
     else:  #  If it's already a roadrunner model
-        r = model
-    m = r.simulate(start, end, numpoints)
-    r.plot(savefig=savepath)
+        m, names = simulate_model(model, start, end, numpoints)
+    plt.plot(m[:, 0], m[:, 1:], label=names[1:])
+    plt.xlabel(names[0])
+    plt.legend()
+    if savepath:
+        plt.savefig(savepath)
+        plt.close()
+    else:
+        plt.show()
+
+
+def decimate_timeseries(time_points, values, max_points):
+    """
+    Reduce a time series to about max_points points, keeping the minimum and maximum of each bucket of points so
+    that peaks and troughs are still drawn
+    :param time_points: (numpy.ndarray) Times, shape (n,)
+    :param values: (numpy.ndarray) Values, shape (n, columns)
+    :param max_points: (int) Maximum number of points to keep
+    :return: (numpy.ndarray, numpy.ndarray) Decimated times and values. Each column keeps its own points, so
+        decimated times have the same shape as the values.
+    """
+    n = len(time_points)
+    buckets = max_points // 2
+    if n <= max_points or buckets < 1:
+        return time_points, values
+    size = n // buckets
+    reshaped = values[:size * buckets].reshape(buckets, size, -1)
+    offsets = np.arange(buckets)[:, None] * size
+    index = np.concatenate([reshaped.argmin(axis=1) + offsets, reshaped.argmax(axis=1) + offsets], axis=0)
+    index = np.sort(np.vstack([index, np.full((1, values.shape[1]), n - 1)]), axis=0)
+    return time_points[index], np.take_along_axis(values, index, axis=0)
+
+
+def simulate_timeseries_antimony(astr, start, end, numpoints, max_points=None):
+    """
+    Private function. Simulate an antimony model, returning only numeric arrays so the result is cheap to send back
+    from a worker process
+    :param astr: (str) Antimony string of the model, None if it couldn't be read
+    :param start: (float) Starting time for simulation
+    :param end: (float) Ending time for simulation
+    :param numpoints: (int) Number of points for the simulation
+    :param max_points: optional (int), decimate the result to at most this many points (see decimate_timeseries)
+    :return: (numpy.ndarray, numpy.ndarray) Times and values, or None if the simulation failed. Times have one column
+        per species once decimated, otherwise they are one-dimensional
+    """
+    if astr is None:
+        return None
+    try:
+        m, names = simulate_antimony(astr, start, end, numpoints)
+    except Exception:
+        return None
+    time_points = np.array(m[:, 0])
+    values = np.array(m[:, 1:])
+    if max_points is not None:
+        return decimate_timeseries(time_points, values, max_points)
+    return time_points, values
+
+
+def simulate_timeseries_batch(astrs, start, end, numpoints, max_points=None):
+    """
+    Private function. Like simulate_timeseries_antimony for several models, simulated together with
+    simulate_mass_action
+    :param astrs: list(str) Antimony strings of the models, None for those that couldn't be read
+    :param start: (float) Starting time for simulation
+    :param end: (float) Ending time for simulation
+    :param numpoints: (int) Number of points for the simulation
+    :param max_points: optional (int), decimate the results to at most this many points
+    :return: list((numpy.ndarray, numpy.ndarray)) Times and values of each model, None for those that failed
+    """
+    readable = [i for i, astr in enumerate(astrs) if astr is not None]
+    simulated = dict(zip(readable, simulate_mass_action([astrs[i] for i in readable], start, end, numpoints)))
+    results = []
+    for i in range(len(astrs)):
+        if simulated.get(i) is None:
+            results.append(None)
+            continue
+        m = simulated[i][0]
+        if max_points is not None:
+            results.append(decimate_timeseries(m[:, 0], m[:, 1:], max_points))
+        else:
+            results.append((m[:, 0], m[:, 1:]))
+    return results
+
+
+def plot_timeseries_pages(path, start, end, numpoints, savepath, page_size=16, workers=None, max_points=None,
+                          engine="roadrunner"):
+    """
+    Private function. Plot time series for a directory of models on several pages with a fixed number of panels,
+    saving one file per page (e.g. plots_page001.png, plots_page002.png for savepath plots.png). Models are read and
+    simulated one page at a time, optionally in worker processes, so memory use depends on the page size and not on
+    the number of models.
+    :param path: (str) Path to a directory containing antimony files or a model archive
+    :param start: (float) Starting time for simulation
+    :param end: (float) Ending time for simulation
+    :param numpoints: (int) Number of points for the simulation
+    :param savepath: (str) Path to save the figures, the page number is added before the extension
+    :param page_size: optional (int), number of models per page
+    :param workers: optional (int), number of worker processes used to simulate models
+    :param max_points: optional (int), maximum number of points drawn per time series
+    :param engine: optional (str), "roadrunner" or "batch" to simulate each page at once with simulate_mass_action
+    :return: list(str) Paths to the saved pages
+    """
+    if not savepath:
+        raise ValueError("savepath is required to plot time series on several pages")
+    filenames = list_model_files(path)
+    pages = [filenames[i:i + page_size] for i in range(0, len(filenames), page_size)]
+    root, ext = os.path.splitext(savepath)
+    if not ext:
+        ext = ".png"
+    rows, cols = get_best_dimensions(page_size)
+    pool = None
+    if workers is not None and workers > 1:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                      mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(page):
+        if pool is None:
+            return None
+        astrs = read_model_texts(path, page)
+        if engine == "batch":
+            return [pool.submit(simulate_timeseries_batch, astrs, start, end, numpoints, max_points)]
+        return [pool.submit(simulate_timeseries_antimony, astr, start, end, numpoints, max_points) for astr in astrs]
+
+    saved = []
+    plt.rcParams.update({'font.size': 6})
+    try:
+        futures = submit(pages[0]) if pages else None
+        for p, page in enumerate(pages):
+            # Start simulating the next page while this one is drawn
+            next_futures = submit(pages[p + 1]) if p + 1 < len(pages) else None
+            if futures is not None:
+                results = [future.result() for future in futures]
+                if engine == "batch":
+                    results = results[0]
+            elif engine == "batch":
+                results = simulate_timeseries_batch(read_model_texts(path, page), start, end, numpoints, max_points)
+            else:
+                results = [simulate_timeseries_antimony(astr, start, end, numpoints, max_points)
+                           for astr in read_model_texts(path, page)]
+            fig, axs = plt.subplots(rows, cols, squeeze=False)
+            for idx, ax in enumerate(axs.flat):
+                if idx >= len(page):
+                    ax.axis("off")
+                    continue
+                if results[idx] is None:
+                    ax.set_title(f"{page[idx]} (simulation failed)")
+                else:
+                    ax.plot(*results[idx])
+                    ax.set_title(page[idx])
+            fig.tight_layout()
+            page_path = f"{root}_page{p + 1:03d}{ext}"
+            fig.savefig(page_path)
+            plt.close(fig)
+            saved.append(page_path)
+            futures = next_futures
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    print(f"Plots saved to {len(saved)} pages: {root}_page*{ext}")
+    return saved
 
 
-def plot_timeseries(input, start=0, end=1, numpoints=200, savepath=None):
+def plot_timeseries(input, start=0, end=1, numpoints=200, savepath=None, page_size=None, workers=None,
+                    max_points=None, engine="roadrunner"):
     """
     Plot timeseries data for models
     :param input: Any of:
-        1. (str) path to a directory containing antimony files
+        1. (str) path to a directory containing antimony files or to a model archive (see pack_models)
         2. List of antimony strings OR list of RoadRunner models
         3. A single antimony string OR a single RoadRunner model
     :param start: optional (float), starting time for simulation, default=0
     :param end:  optional (float), end time for simulation, default=1
     :param numpoints: optional (int), number of points for simulation, default=200
     :param savepath: optional (str), path to save the figure
+    :param page_size: optional (int), for a directory, plot this many models per page and save one file per page
+        (see plot_timeseries_pages). Requires savepath
+    :param workers: optional (int), for paginated plots, number of worker processes used to simulate models
+    :param max_points: optional (int), for paginated plots, maximum number of points drawn per time series
+    :param engine: optional (str), "roadrunner" (default) or "batch" to simulate many antimony models at once with
+        the NumPy integrator of simulate_mass_action, which falls back to RoadRunner for the models it can't handle
     :return: None
     """
-    if isinstance(input, str) and "->" not in input:  # If we're given a path
-        plot_timeseries_path(input, start, end, numpoints, savepath)
+    if isinstance(input, str) and "->" not in input and page_size is not None:
+        plot_timeseries_pages(input, start, end, numpoints, savepath, page_size=page_size, workers=workers,
+                              max_points=max_points, engine=engine)
+    elif isinstance(input, str) and "->" not in input:  # If we're given a path
+        plot_timeseries_path(input, start, end, numpoints, savepath, engine=engine)
     elif isinstance(input, list):  # List of models, either as antimony strings, or roadrunner models
-        plot_timeseries_model_list(input, start, end, numpoints, savepath)
+        plot_timeseries_model_list(input, start, end, numpoints, savepath, engine=engine)
     else:  # antimony string for single model or single roadrunner model
         plot_single_model(input, start, end, numpoints, savepath)
 
@@ -500,25 +2863,17 @@ def plot_timeseries(input, start=0, end=1, numpoints=200, savepath=None):
 # Plotting Fitness Data
 #--------------------------------------------------
 
-def load_fitness_values(path):
-    """
-    Load a list of the fitness values for each generation
-    :param path: Path to a json file containing the fitness values
-    :return: list(float) fitness values for each generation
-    """
-    if not path.endswith(".json"):
-        raise ValueError("file type must be .json")
-    with open(path, "r") as f:
-        data = json.load(f)
-    return data["top_individual_fitness"]
-
 
 def load_many_fitness_values(path):
     """
     Load a collection of fitness values for each generation for several models
-    :param path: (str) Path to a directory containing .json files
+    :param path: (str) Path to a directory containing .json files, or a model archive
     :return: list(list(float)) fitness values for each model for each generation
     """
+    if is_model_archive(path):
+        with ModelArchive(path) as archive:
+            trajectories = [archive.trajectory(file) for file in archive.ids]
+            return [values.tolist() for values in trajectories if len(values) > 0]
     many_fitness_values = []
     for file in os.listdir(path):
         if file.endswith(".json"):
@@ -529,12 +2884,16 @@ def load_many_fitness_values(path):
 def plot_fitness(path, limit=None, savepath=None):
     """
     Plot the fitness over time of one or more models
-    :param path: (str) Either the path to a single json file or the path to a directory containing several json files
+    :param path: (str) Either the path to a single json file, the path to a directory containing several json files,
+        the path to a model archive (see pack_models) or the path to a fitness store (see pack_fitness_values), which
+        is plotted as percentile bands
     :param limit: (int) The maximum number of time series to plot. None by default
     :param savepath: optional (str), path to save the figure
     :return: None
     """
-    if os.path.isdir(path):
+    if is_fitness_store(path):
+        plot_fitness_store(path, savepath=savepath)
+    elif os.path.isdir(path):
         plot_fitness_dir(path, limit=limit, savepath=savepath)
     else:
         plot_individual_fitness(path, savepath=savepath)
@@ -590,25 +2949,244 @@ def plot_fitness_dir(path, limit=None, savepath=None):
         plt.show()
 
 
+#--------------------------------------------------
+# Fitness Trajectory Store
+#--------------------------------------------------
+
+def is_fitness_store(path):
+    """
+    Check if a path is a fitness store written by pack_fitness_values
+    :param path: (str) Path to check
+    :return: (bool) True if it is a fitness store
+    """
+    return os.path.isfile(os.path.join(path, "offsets.i64"))
+
+
+class FitnessStore:
+    """
+    Fitness trajectories of many runs packed in one memory-mapped file of float64 values (trajectories.f64), with a
+    ragged offset table (offsets.i64, run i is values[offsets[i]:offsets[i + 1]]) and the run names (runs.json).
+    The names are written last when appending, so an interrupted append is ignored and overwritten by the next one.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: (str) Path to the store directory
+        """
+        self.path = path
+        with open(os.path.join(path, "runs.json"), "r") as f:
+            self.names = json.load(f)
+        n = len(self.names)
+        self.offsets = np.fromfile(os.path.join(path, "offsets.i64"), dtype=np.int64, count=n + 1)
+        if self.offsets[-1] > 0:
+            self.values = np.memmap(os.path.join(path, "trajectories.f64"), dtype=np.float64, mode="r",
+                                    shape=(int(self.offsets[-1]),))
+        else:
+            self.values = np.zeros(0)
+        self.lengths = np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.names)
+
+    def trajectory(self, i):
+        """
+        :param i: (int) Index of the run
+        :return: (numpy.ndarray) Fitness of the top individual for each generation of the run
+        """
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def padded(self):
+        """
+        All trajectories as one (runs, generations) array. Runs that stopped early (e.g. because they reached the
+        writeout threshold) keep their last value for the remaining generations.
+        :return: (numpy.ndarray)
+        """
+        lengths = np.maximum(self.lengths, 1)
+        generations = np.arange(int(self.lengths.max()) if len(self) > 0 else 0)
+        index = self.offsets[:-1, None] + np.minimum(generations[None, :], lengths[:, None] - 1)
+        return self.values[np.minimum(index, len(self.values) - 1)]
+
+    def percentiles(self, q=(10, 50, 90)):
+        """
+        Percentiles of the fitness across runs for each generation
+        :param q: optional (list(float)), percentiles to compute
+        :return: (numpy.ndarray) Array of shape (len(q), generations)
+        """
+        return np.percentile(self.padded(), q, axis=0)
+
+    def run_ids(self):
+        """
+        Private. Index of the run of each stored value
+        :return: (numpy.ndarray)
+        """
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def generations_to_threshold(self, threshold):
+        """
+        First generation at which each run reached a fitness of at least threshold
+        :param threshold: (float) Fitness threshold
+        :return: (numpy.ndarray) Generation for each run, -1 for runs that never reached it
+        """
+        result = np.full(len(self), -1, dtype=np.int64)
+        hits = np.nonzero(np.asarray(self.values) >= threshold)[0]
+        if len(hits) == 0:
+            return result
+        runs = self.run_ids()[hits]
+        # hits is sorted, so the first hit of each run is where the run index changes
+        first = np.concatenate([[True], runs[1:] != runs[:-1]])
+        result[runs[first]] = hits[first] - self.offsets[runs[first]]
+        return result
+
+    def plateaus(self, tolerance=1e-6):
+        """
+        Find where each run stopped improving
+        :param tolerance: optional (float), improvements smaller than this don't count
+        :return: (numpy.ndarray, numpy.ndarray) Generation at which the plateau of each run starts and its length in
+            generations
+        """
+        values = np.asarray(self.values)
+        improved = np.zeros(len(values), dtype=bool)
+        improved[1:] = values[1:] - values[:-1] > tolerance
+        improved[self.offsets[:-1][self.lengths > 0]] = False  # Differences across runs don't count
+        start = np.zeros(len(self), dtype=np.int64)
+        positions = np.nonzero(improved)[0]
+        if len(positions) > 0:
+            runs = self.run_ids()[positions]
+            # positions is sorted, so the last improvement of each run is where the run index changes next
+            last = np.concatenate([runs[1:] != runs[:-1], [True]])
+            start[runs[last]] = positions[last] - self.offsets[runs[last]]
+        return start, self.lengths - start
+
+
+def append_fitness_values(store_path, files):
+    """
+    Append the trajectories of json fitness files (written by evolve_networks with track_fitness) to a fitness
+    store, creating it if needed
+    :param store_path: (str) Path to the store directory
+    :param files: list(str) Paths to the json files
+    :return: (int) The number of runs appended
+    """
+    if not os.path.exists(store_path):
+        os.makedirs(store_path)
+    names = []
+    if is_fitness_store(store_path):
+        with open(os.path.join(store_path, "runs.json"), "r") as f:
+            names = json.load(f)
+    offsets_path = os.path.join(store_path, "offsets.i64")
+    values_path = os.path.join(store_path, "trajectories.f64")
+    offsets = np.fromfile(offsets_path, dtype=np.int64, count=len(names) + 1) if names else np.zeros(1, np.int64)
+    # Drop anything left over from an interrupted append
+    with open(offsets_path, "ab") as f:
+        f.truncate(offsets.nbytes)
+    with open(values_path, "ab") as f:
+        f.truncate(int(offsets[-1]) * 8)
+    known = set(names)
+    end = int(offsets[-1])
+    new_offsets = []
+    with open(values_path, "ab") as f:
+        for file in files:
+            name = os.path.basename(file)
+            if name in known:
+                continue
+            values = np.asarray(load_fitness_values(file), dtype=np.float64)
+            f.write(values.tobytes())
+            end += len(values)
+            new_offsets.append(end)
+            names.append(name)
+            known.add(name)
+    with open(offsets_path, "ab") as f:
+        f.write(np.asarray(new_offsets, dtype=np.int64).tobytes())
+    with open(os.path.join(store_path, "runs.json"), "w") as f:
+        json.dump(names, f)
+    return len(new_offsets)
+
+
+def pack_fitness_values(path, store_path):
+    """
+    Pack all the json fitness files of a directory into a fitness store. Runs already in the store are skipped, so
+    this can be run again as new runs finish.
+    :param path: (str) Path to a directory containing .json files
+    :param store_path: (str) Path to the store directory
+    :return: (int) The number of runs added
+    """
+    files = sorted(os.path.join(path, file) for file in os.listdir(path) if file.endswith(".json"))
+    added = append_fitness_values(store_path, files)
+    print(f"Added {added} fitness trajectories to {store_path}")
+    return added
+
+
+def plot_fitness_store(store_path, percentiles=(10, 90), savepath=None):
+    """
+    Private function. Plot the median fitness per generation across the runs of a fitness store, with a percentile
+    band
+    :param store_path: (str) Path to the store directory
+    :param percentiles: optional (float, float), lower and upper percentiles of the band
+    :param savepath: optional (str), path to save the figure
+    :return: None
+    """
+    plt.clf()
+    store = FitnessStore(store_path)
+    low, median, high = store.percentiles([percentiles[0], 50, percentiles[1]])
+    generations = np.arange(len(median))
+    plt.fill_between(generations, low, high, alpha=0.3, label=f"{percentiles[0]}-{percentiles[1]} percentile")
+    plt.plot(generations, median, label="Median")
+    plt.ylabel("Fitness")
+    plt.xlabel("Generation")
+    plt.title(f"Top Fitness Trajectories ({len(store)} runs)")
+    plt.legend()
+    if savepath:
+        plt.savefig(savepath)
+        print(f"Plots saved to {savepath}")
+        plt.close()
+    else:
+        plt.show()
+
+
 #------------------------------------------------------------------
 # Model Cleanup
 #------------------------------------------------------------------
 
-def prune_antimony_model(astr):
+def prune_antimony_model(astr, compile_once=True, streaming=False, verdict_cache=None):
     """
     Remove reactions that don't contribute to oscillation
     :param astr: (str) an antimony string
-    :param fitness: optional (float), append the ORIGINAL fitness value to the new antimony string
+    :param compile_once: optional (bool), if True, the model is compiled once and reactions are knocked out in place
+        (see KnockoutEngine). If False, the antimony string is edited and reloaded for every reaction.
+    :param streaming: optional (bool), passed on to is_oscillator
+    :param verdict_cache: optional (VerdictCache), networks left after a knockout that are equivalent to one already
+        in the cache are not simulated again
     :return: (int, str), The number of reactions removed and the new antimony string
     """
     reactions_pruned = 0
+
+    def still_oscillates(newastr, evaluate):
+        # evaluate is only called if the network isn't in the cache
+        key = None
+        if verdict_cache is not None:
+            key = verdict_cache.key("oscillator-streaming" if streaming else "oscillator", newastr)[0]
+        verdict = verdict_cache.get(key) if key is not None else None
+        if verdict is None:
+            verdict = evaluate()
+            if key is not None:
+                verdict_cache.put(key, verdict)
+        return verdict
+
+    if compile_once:
+        engine = KnockoutEngine(astr, streaming=streaming)
+        knockouts = set()
+        for i in engine.reaction_lines:
+            candidate = knockouts | {i}
+            if still_oscillates(engine.materialize(candidate), lambda: engine.is_oscillator(candidate)):
+                # If the model is still an oscillator, keep the reaction knocked out and count it
+                knockouts.add(i)
+                reactions_pruned += 1
+        return reactions_pruned, engine.materialize(knockouts)
     split_astr = astr.split("\n")
     for i in range(len(split_astr)):
         if "->" in split_astr[i]:
             split_astr[i] = "#" + split_astr[i]
             newastr = "\n".join(split_astr)
-            r = te.loada(newastr)
-            if not is_oscillator(r):
+            if not still_oscillates(newastr, lambda: is_oscillator(te.loada(newastr), streaming=streaming)):
                 # If removing the reaction broke the oscillator, put it back
                 split_astr[i] = split_astr[i][1:]
             else:
@@ -617,24 +3195,539 @@ def prune_antimony_model(astr):
     return reactions_pruned, "\n".join(split_astr)
 
 
-def prune_models(path):
+pruning_worker_engine = None  # KnockoutEngine of the model a pruning worker process is currently working on
+
+
+def pruning_worker(astr, knockouts, streaming, profile_label=None):
+    """
+    Private function. Test a set of knockouts in a worker process. The compiled model is kept between tasks, so a
+    worker only compiles each model once per streaming setting.
+    :param astr: (str) Antimony string of the model
+    :param knockouts: (frozenset(int)) Indices of the lines of the reactions to knock out
+    :param streaming: (bool) passed on to is_oscillator
+    :param profile_label: optional (str), if given, the oscillator tests are profiled under this model label
+    :return: (bool, list) True if the model oscillates with these reactions knocked out, and the profile records
+        (None unless profiling)
+    """
+    global pruning_worker_engine
+    engine = pruning_worker_engine
+    if engine is None or (engine.astr, engine.streaming) != (astr, streaming):
+        pruning_worker_engine = KnockoutEngine(astr, streaming=streaming)
+    profiler = None
+    if profile_label is not None:
+        profiler = StageProfiler()
+        profiler.model = profile_label
+    with profiling(profiler):
+        verdict = pruning_worker_engine.is_oscillator(set(knockouts))
+    return verdict, profiler.records if profiler is not None else None
+
+
+class PruningPool:
+    """
+    Process pool evaluating candidate networks with pruning_worker. If a worker dies (e.g. libroadrunner segfaults on
+    a candidate) or a candidate takes longer than the timeout, the pool is replaced and the candidates of that batch
+    are evaluated again one at a time, so only the candidate that crashes or hangs is lost. It is counted as not
+    oscillating.
+    """
+
+    def __init__(self, workers, timeout=None):
+        """
+        :param workers: (int) Number of worker processes
+        :param timeout: optional (float), maximum number of seconds to spend on a single candidate
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.executor = None
+        self.crashes = 0
+        self.timeouts = 0
+        self.start()
+
+    def start(self):
+        """
+        Private. Start a new executor, replacing the current one. Its workers are killed, since shutting it down
+        doesn't stop a worker stuck on a candidate.
+        :return: None
+        """
+        if self.executor is not None:
+            for process in list((self.executor._processes or {}).values()):
+                process.kill()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers,
+                                                               mp_context=multiprocessing.get_context("spawn"))
+
+    def map(self, astr, candidates, streaming, profile_label=None):
+        """
+        Evaluate sets of knockouts of a model
+        :param astr: (str) Antimony string of the model
+        :param candidates: list(frozenset(int)) Sets of indices of the lines of the reactions to knock out
+        :param streaming: (bool) passed on to is_oscillator
+        :param profile_label: optional (str), see pruning_worker
+        :return: list((bool, list)) The result of pruning_worker for each candidate
+        """
+        n = len(candidates)
+        # Bound for the whole batch if no candidate exceeds the timeout: the workers share the candidates, plus the
+        # longest one
+        batch_timeout = self.timeout * (math.ceil(n / self.workers) + 1) if self.timeout is not None else None
+        try:
+            return list(self.executor.map(pruning_worker, [astr] * n, candidates, [streaming] * n,
+                                          [profile_label] * n, timeout=batch_timeout))
+        except (concurrent.futures.process.BrokenProcessPool, concurrent.futures.TimeoutError):
+            pass
+        results = []
+        self.start()
+        for knockouts in candidates:
+            future = self.executor.submit(pruning_worker, astr, knockouts, streaming, profile_label)
+            try:
+                results.append(future.result(timeout=self.timeout))
+            except concurrent.futures.process.BrokenProcessPool:
+                self.crashes += 1
+                results.append((False, None))
+                self.start()
+            except concurrent.futures.TimeoutError:
+                self.timeouts += 1
+                results.append((False, None))
+                self.start()
+        return results
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+class PruningSearch:
+    """
+    Search for a smaller set of reactions of a model that still oscillates. Verdicts are memoized per set of
+    knocked out reactions, so no set is ever evaluated twice, and the candidates of each step are evaluated in
+    parallel when a process pool is given.
+    The reaction lines are put in the order of the canonical form of the reactions (see canonical_network) before
+    the model is compiled, and the search tries them in that order, so the result doesn't depend on the order of the
+    lines of the file: neither the choice between reactions that can be removed nor the numerics of the solver, which
+    follow the order of the reactions. Knockouts are indices of lines of the reordered model.
+    """
+
+    def __init__(self, astr, pool=None, streaming=False, verdict_cache=None):
+        """
+        :param astr: (str) Antimony string of the model
+        :param pool: optional (PruningPool), process pool used to evaluate candidates
+        :param streaming: optional (bool), passed on to is_oscillator
+        :param verdict_cache: optional (VerdictCache), candidates equivalent to a network already in the cache are not
+            simulated again
+        """
+        self.lines = astr.split("\n")
+        active = [i for i, line in enumerate(self.lines) if "->" in line.split("#")[0].split("//")[0]]
+        network = parse_mass_action_network(astr)
+        canonical = canonical_network(astr)
+        if network is not None and canonical is not None and len(network["reactions"]) == len(active):
+            forms = [json.dumps(canonical_reaction(reaction, canonical[1], 12)) for reaction in network["reactions"]]
+        else:  # Not a plain mass-action network, the reactions are sorted by their text
+            forms = [self.lines[i].split("#")[0].strip() for i in active]
+        order = sorted(range(len(active)), key=lambda j: (forms[j], j))
+        self.source = {line: active[j] for line, j in zip(active, order)}  # Line of the original model of each line
+        reordered = list(self.lines)
+        for line, source in self.source.items():
+            reordered[line] = self.lines[source]
+        self.astr = "\n".join(reordered)
+        self.pool = pool
+        self.streaming = streaming
+        self.verdict_cache = verdict_cache
+        self.engine = KnockoutEngine(self.astr, streaming=streaming)
+        self.reactions = sorted(self.engine.species)  # Lines of the reactions that aren't commented out
+        self.verdicts = {}
+        self.evaluations = 0
+        self.cache_hits = 0
+
+    def materialize(self, knockouts):
+        """
+        Build the antimony string of the model with reactions commented out, in the order of the original lines
+        :param knockouts: (frozenset(int)) Indices of the lines of the reordered model to knock out
+        :return: (str) The new antimony string
+        """
+        knockouts = {self.source[i] for i in knockouts}
+        return "\n".join("#" + line if i in knockouts else line for i, line in enumerate(self.lines))
+
+    def evaluate(self, candidates):
+        """
+        Test several sets of knockouts, evaluating only those that haven't been seen before
+        :param candidates: list(frozenset(int)) Sets of indices of the lines of the reactions to knock out
+        :return: list(bool) True for each set that still oscillates
+        """
+        todo = []
+        keys = {}
+        for knockouts in candidates:
+            if knockouts in self.verdicts or knockouts in todo:
+                self.cache_hits += 1
+                continue
+            if self.verdict_cache is not None:
+                kind = "oscillator-streaming" if self.streaming else "oscillator"
+                keys[knockouts] = self.verdict_cache.key(kind, self.materialize(knockouts))[0]
+                verdict = self.verdict_cache.get(keys[knockouts]) if keys[knockouts] is not None else None
+                if verdict is not None:
+                    self.verdicts[knockouts] = verdict
+                    self.cache_hits += 1
+                    continue
+            todo.append(knockouts)
+        if self.pool is not None:
+            label = oscillation_profiler.model if oscillation_profiler is not None else None
+            results = []
+            for verdict, profile_records in self.pool.map(self.astr, todo, self.streaming, profile_label=label):
+                results.append(verdict)
+                if profile_records is not None:
+                    oscillation_profiler.records.extend(profile_records)
+        else:
+            results = [self.engine.is_oscillator(set(knockouts)) for knockouts in todo]
+        self.evaluations += len(todo)
+        self.verdicts.update(zip(todo, results))
+        for knockouts, verdict in zip(todo, results):
+            if keys.get(knockouts) is not None:
+                self.verdict_cache.put(keys[knockouts], verdict)
+        return [self.verdicts[knockouts] for knockouts in candidates]
+
+    def sequential(self, knockouts=frozenset()):
+        """
+        Try to remove each reaction once, in canonical order, keeping it removed if the network still oscillates, like
+        prune_antimony_model does in file order. One evaluation per reaction.
+        :param knockouts: optional (frozenset(int)), reactions that are already knocked out
+        :return: (frozenset(int)) Lines of the reactions to knock out
+        """
+        for i in self.reactions:
+            if i not in knockouts and self.evaluate([knockouts | {i}])[0]:
+                knockouts = knockouts | {i}
+        return knockouts
+
+    def greedy(self, knockouts=frozenset()):
+        """
+        Remove one reaction at a time until no single reaction can be removed without losing oscillation. All single
+        deletions of the current network are evaluated at each step, and the first reaction in canonical order whose
+        deletion still oscillates is removed.
+        :param knockouts: optional (frozenset(int)), reactions that are already knocked out
+        :return: (frozenset(int)) Lines of the reactions to knock out
+        """
+        while True:
+            candidates = [knockouts | {i} for i in self.reactions if i not in knockouts]
+            if not candidates:
+                return knockouts
+            oscillating = [c for c, verdict in zip(candidates, self.evaluate(candidates)) if verdict]
+            if not oscillating:
+                return knockouts
+            knockouts = oscillating[0]
+
+    def minimal(self, knockouts, max_evaluations=None, time_limit=None, batch_size=16):
+        """
+        Look for the smallest oscillating set of reactions, trying all sets smaller than the one left by knockouts,
+        smallest first. Stops when the evaluation or time budget runs out.
+        :param knockouts: (frozenset(int)) Best known set of reactions to knock out, e.g. from greedy
+        :param max_evaluations: optional (int), maximum total number of evaluations (including earlier searches)
+        :param time_limit: optional (float), maximum number of seconds to search
+        :param batch_size: optional (int), number of candidates evaluated together
+        :return: (frozenset(int)) Lines of the reactions to knock out, knockouts if nothing smaller was found
+        """
+        start = time.monotonic()
+        all_reactions = frozenset(self.reactions)
+        for size in range(1, len(self.reactions) - len(knockouts)):
+            subsets = itertools.combinations(self.reactions, size)
+            while True:
+                batch = list(itertools.islice(subsets, batch_size))
+                if not batch:
+                    break
+                if max_evaluations is not None:
+                    batch = batch[:max(0, max_evaluations - self.evaluations)]
+                if not batch or (time_limit is not None and time.monotonic() - start > time_limit):
+                    return knockouts
+                candidates = [all_reactions - frozenset(subset) for subset in batch]
+                for candidate, verdict in zip(candidates, self.evaluate(candidates)):
+                    if verdict:
+                        return candidate
+        return knockouts
+
+
+def search_minimal_network(astr, pool=None, minimal=False, max_evaluations=None, time_limit=None, streaming=False,
+                           verdict_cache=None):
+    """
+    Remove reactions that don't contribute to oscillation. Unlike prune_antimony_model, the result doesn't depend on
+    the order of the reactions in the file. A sequential pass like prune_antimony_model, but in canonical order (see
+    PruningSearch.sequential), is followed by the greedy search, which removes whatever single reactions can still be
+    removed. The two can remove different reactions, and so a different number of them, since both passes depend on
+    the order in which reactions are tried. That costs about twice the n evaluations of prune_antimony_model for a
+    model of n reactions, and n more for each reaction the greedy search removes.
+    :param astr: (str) an antimony string
+    :param pool: optional (PruningPool), process pool used to evaluate candidates in parallel
+    :param minimal: optional (bool), if True, after the greedy search look for a smallest oscillating core within the
+        budget given by max_evaluations and time_limit
+    :param max_evaluations: optional (int), evaluation budget of the minimal search
+    :param time_limit: optional (float), time budget of the minimal search in seconds
+    :param streaming: optional (bool), passed on to is_oscillator
+    :param verdict_cache: optional (VerdictCache), see PruningSearch
+    :return: (int, str, dict) The number of reactions removed, the new antimony string and statistics of the search
+        (number of evaluations and cache hits)
+    """
+    search = PruningSearch(astr, pool=pool, streaming=streaming, verdict_cache=verdict_cache)
+    knockouts = search.greedy(search.sequential())
+    if minimal:
+        knockouts = search.minimal(knockouts, max_evaluations=max_evaluations, time_limit=time_limit)
+    stats = {"evaluations": search.evaluations, "cache_hits": search.cache_hits}
+    return len(knockouts), search.materialize(knockouts), stats
+
+
+def prune_models(path, workers=None, minimal=False, max_evaluations=None, time_limit=None, streaming=False,
+                 profiler=None, verdict_cache=None, timeout=None):
     """
     Remove unnecessary reactions from antimony models in a directory
     :param path: (str) Path to a directory containing antimony files
-    :return: None
+    :param workers: optional (int), number of worker processes used to evaluate candidate networks
+    :param minimal: optional (bool), if True, look for the smallest oscillating core of each model within the budget
+        given by max_evaluations and time_limit (see PruningSearch.minimal)
+    :param max_evaluations: optional (int), maximum number of evaluations per model for the minimal search
+    :param time_limit: optional (float), maximum number of seconds per model for the minimal search
+    :param streaming: optional (bool), passed on to is_oscillator
+    :param profiler: optional (StageProfiler), records the time and outcome of each stage of the oscillator tests,
+        labelled by model file
+    :param verdict_cache: optional (VerdictCache), candidate networks equivalent to one already in the cache are not
+        simulated again, across models
+    :param timeout: optional (float), when running with workers, maximum number of seconds to spend on one candidate
+        network. Candidates that take longer are counted as not oscillating
+    :return: (int, int) The total number of reactions removed and the number of models evaluated
     """
     total_reactions_removed = 0
     total_models_evaluated = 0
-    for file in os.listdir(path):
-        if file.endswith(".ant"):
-            total_models_evaluated += 1
-            with open(os.path.join(path, file), "r") as f:
-                astr = f.read()
-            reactions_pruned, new_astr = prune_antimony_model(astr)
-            if reactions_pruned > 0:
-                total_reactions_removed += 1
-                with open(os.path.join(path, file), "w") as f:
-                    f.write(new_astr)
+    total_evaluations = 0
+    total_cache_hits = 0
+    pool = None
+    if workers is not None and workers > 1:
+        pool = PruningPool(workers, timeout=timeout)
+    try:
+        for file in sorted(os.listdir(path)):
+            if file.endswith(".ant"):
+                total_models_evaluated += 1
+                with open(os.path.join(path, file), "r") as f:
+                    astr = f.read()
+                if profiler is not None:
+                    profiler.model = file
+                with profiling(profiler):
+                    reactions_pruned, new_astr, stats = search_minimal_network(astr, pool=pool, minimal=minimal,
+                                                                               max_evaluations=max_evaluations,
+                                                                               time_limit=time_limit,
+                                                                               streaming=streaming,
+                                                                               verdict_cache=verdict_cache)
+                lookups = stats["evaluations"] + stats["cache_hits"]
+                hit_rate = stats["cache_hits"] / lookups if lookups > 0 else 0
+                print(f"{file}: removed {reactions_pruned} reactions, {stats['evaluations']} evaluations, "
+                      f"{hit_rate * 100:.1f}% cache hits")
+                total_evaluations += stats["evaluations"]
+                total_cache_hits += stats["cache_hits"]
+                if reactions_pruned > 0:
+                    total_reactions_removed += reactions_pruned
+                    with open(os.path.join(path, file), "w") as f:
+                        f.write(new_astr)
+    finally:
+        if pool is not None:
+            pool.shutdown()
     print(f"Removed {total_reactions_removed} reactions from {total_models_evaluated} models")
-    print(f"Average reactions removed per model = {total_reactions_removed / total_models_evaluated}")
+    if total_models_evaluated > 0:
+        print(f"Average reactions removed per model = {total_reactions_removed / total_models_evaluated}")
+    print(f"{total_evaluations} evaluations, {total_cache_hits} cache hits")
+    if pool is not None and pool.crashes > 0:
+        print(f"{pool.crashes} candidate networks crashed a worker and were counted as not oscillating")
+    if pool is not None and pool.timeouts > 0:
+        print(f"{pool.timeouts} candidate networks ran out of time and were counted as not oscillating")
     return total_reactions_removed, total_models_evaluated
+
+
+#------------------------------------------------------------------
+# Verdict Equivalence
+#------------------------------------------------------------------
+
+VERDICT_MODES = {"reference": {}, "streaming": {"streaming": True}, "screen": {"screen": True},
+                 "screen-streaming": {"screen": True, "streaming": True}}
+
+
+def trace_verdicts(records, evaluate=None, streaming=False, screen=False, batch_size=256):
+    """
+    Private function. Evaluate models one at a time in this process, timing each one and keeping the stages it went
+    through as recorded by a StageProfiler
+    :param records: list(ModelRecord) The models
+    :param evaluate: optional, function taking an antimony string and a fitness and returning a verdict and a
+        repaired antimony string, like evaluate_model, which is used by default
+    :param streaming: optional (bool), passed on to evaluate_model
+    :param screen: optional (bool), if True, models are first screened in batches with screen_non_oscillators and
+        the time of each batch is split evenly between its models
+    :param batch_size: optional (int), number of models screened together
+    :return: dict(str: dict) "verdict", "seconds" and "trace" (the profiler records) of each model. Models that
+        couldn't be read or whose evaluation raised get an "error" verdict
+    """
+    results = {}
+    profiler = StageProfiler()
+    with profiling(profiler):
+        for i in range(0, len(records), batch_size):
+            batch = records[i:i + batch_size]
+            rejected = set()
+            screen_seconds = 0
+            if screen:
+                readable = [record for record in batch if record.astr is not None]
+                start = time.perf_counter()
+                clear = screen_non_oscillators([record.astr for record in readable], batch_size=batch_size)
+                screen_seconds = (time.perf_counter() - start) / max(len(readable), 1)
+                rejected = {record.file for record, is_clear in zip(readable, clear) if is_clear}
+            for record in batch:
+                profiler.model = record.file
+                profiler.records = []
+                start = time.perf_counter()
+                try:
+                    if record.astr is None:
+                        verdict = "error"
+                    elif record.file in rejected:
+                        profiler.record("screen", screen_seconds, "rejected")
+                        decided("screen", False)
+                        verdict = "fail"
+                    else:
+                        if screen:
+                            profiler.record("screen", screen_seconds, "passed")
+                        if evaluate is not None:
+                            verdict = evaluate(record.astr, record.fitness)[0]
+                        else:
+                            verdict = evaluate_model(record.astr, fitness=record.fitness, streaming=streaming)[0]
+                except Exception:
+                    verdict = "error"
+                seconds = time.perf_counter() - start + (screen_seconds if record.astr is not None else 0)
+                trace = [{key: value for key, value in entry.items() if key != "model"} for entry in profiler.records]
+                results[record.file] = {"verdict": verdict, "seconds": seconds, "trace": trace}
+    return results
+
+
+def format_trace(trace):
+    """
+    Private function. One line summary of the stages a model went through
+    :param trace: list(dict) Profiler records of the model, see trace_verdicts
+    :return: (str)
+    """
+    steps = []
+    for entry in trace:
+        if entry["kind"] == "decision":
+            steps.append(f"decided by {entry['stage']} ({entry['outcome']})")
+        else:
+            steps.append(f"{entry['stage']} {entry['outcome']} {entry['seconds'] * 1000:.1f} ms")
+    return " > ".join(steps) if steps else "no stages recorded"
+
+
+def compare_verdicts(path, alternative="streaming", golden_path=None, threshold=None, savepath=None, refresh=False,
+                     batch_size=256):
+    """
+    Check that a faster way of deciding oscillation gives the same verdicts as the reference tests (evaluate_model:
+    is_broken_oscillator, fix_model and is_oscillator). The reference verdicts, times and stage traces are stored in
+    a golden file keyed by the content hash of each model, so the reference only runs on models it hasn't seen and
+    later runs only time the alternative. Models are evaluated one at a time in this process for both, so the times
+    are comparable as long as the golden file was made on the same machine.
+    :param path: (str) Path to a directory of antimony models or a model archive
+    :param alternative: optional, the name of a mode in VERDICT_MODES or a function taking an antimony string and a
+        fitness and returning a verdict and a repaired antimony string, like evaluate_model
+    :param golden_path: optional (str), path of the golden file, GOLDEN_VERDICTS_FILENAME in path by default
+    :param threshold: optional (float), minimum fraction of models that must get the reference verdict for the
+        comparison to pass
+    :param savepath: optional (str), save the report to this JSON file
+    :param refresh: optional (bool), if True, run the reference again on every model and replace its golden entries
+    :param batch_size: optional (int), number of models screened together by the screen modes
+    :return: (dict) The report: number of models, agreement, whether it passed, confusion matrix (reference verdict:
+        alternative verdict: count), total times and overall speedup, median speedup per model, the disagreements
+        with the stage traces of both runs, and the verdicts and times of each model
+    """
+    if callable(alternative):
+        name, options = getattr(alternative, "__name__", "custom"), {"evaluate": alternative}
+    elif alternative in VERDICT_MODES:
+        name, options = alternative, VERDICT_MODES[alternative]
+    else:
+        raise ValueError(f"Unknown alternative {alternative}, expected one of {', '.join(VERDICT_MODES)} or a function")
+    golden_path = golden_path or os.path.join(path, GOLDEN_VERDICTS_FILENAME)
+    files = [file for file in list_model_files(path) if not file.endswith(".json")]
+    records = [ModelRecord(file, astr, get_model_fitness_from_antimony(astr) if astr is not None else None)
+               for file, astr in zip(files, read_model_texts(path, files))]
+    hashes = {record.file: hashlib.sha256(record.astr.encode()).hexdigest() for record in records
+              if record.astr is not None}
+    golden = {}
+    if os.path.exists(golden_path):
+        with open(golden_path, "r") as f:
+            golden = json.load(f)["models"]
+    missing = [record for record in records if record.file in hashes and (refresh or hashes[record.file] not in golden)]
+    if missing:
+        print(f"Running the reference tests on {len(missing)} models")
+        for file, result in trace_verdicts(missing).items():
+            golden[hashes[file]] = dict(result, file=file)
+        tmp_path = golden_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"models": golden}, f)
+        os.replace(tmp_path, golden_path)
+    records = [record for record in records if record.file in hashes]  # Unreadable models have no reference
+    results = trace_verdicts(records, batch_size=batch_size, **options)
+
+    confusion = {}
+    models = []
+    disagreements = []
+    for record in records:
+        reference = golden[hashes[record.file]]
+        result = results[record.file]
+        row = confusion.setdefault(reference["verdict"], {})
+        row[result["verdict"]] = row.get(result["verdict"], 0) + 1
+        models.append({"file": record.file, "reference": reference["verdict"], "alternative": result["verdict"],
+                       "reference_seconds": reference["seconds"], "alternative_seconds": result["seconds"],
+                       "speedup": reference["seconds"] / result["seconds"] if result["seconds"] > 0 else None})
+        if reference["verdict"] != result["verdict"]:
+            disagreements.append({"file": record.file, "reference": reference["verdict"],
+                                  "alternative": result["verdict"], "reference_trace": reference["trace"],
+                                  "alternative_trace": result["trace"]})
+    reference_seconds = sum(model["reference_seconds"] for model in models)
+    alternative_seconds = sum(model["alternative_seconds"] for model in models)
+    speedups = [model["speedup"] for model in models if model["speedup"] is not None]
+    agreement = 1 - len(disagreements) / len(models) if models else 1.0
+    report = {"path": os.path.abspath(path), "alternative": name, "models": len(models), "agreement": agreement,
+              "threshold": threshold, "passed": threshold is None or agreement >= threshold, "confusion": confusion,
+              "reference_seconds": reference_seconds, "alternative_seconds": alternative_seconds,
+              "speedup": reference_seconds / alternative_seconds if alternative_seconds > 0 else None,
+              "median_speedup": float(np.median(speedups)) if speedups else None,
+              "disagreements": disagreements, "per_model": models}
+
+    labels = sorted(set(confusion) | {verdict for row in confusion.values() for verdict in row})
+    width = max([len(label) for label in labels] + [9])
+    print(f"Reference (rows) against {name} (columns) on {len(models)} models:")
+    print(" " * width + "".join(f"{label:>{width + 1}}" for label in labels))
+    for label in labels:
+        row = confusion.get(label, {})
+        print(f"{label:<{width}}" + "".join(f"{row.get(column, 0):>{width + 1}}" for column in labels))
+    for disagreement in disagreements:
+        print(f"{disagreement['file']}: reference {disagreement['reference']}, {name} {disagreement['alternative']}")
+        print(f"    reference: {format_trace(disagreement['reference_trace'])}")
+        print(f"    {name}: {format_trace(disagreement['alternative_trace'])}")
+    print(f"Agreement: {agreement * 100:.2f}%")
+    if report["speedup"] is not None:
+        print(f"Speedup: {report['speedup']:.2f}x overall ({reference_seconds:.2f} s against "
+              f"{alternative_seconds:.2f} s), {report['median_speedup']:.2f}x median per model")
+    if not report["passed"]:
+        print(f"FAILED: agreement is below the threshold of {threshold * 100:.2f}%")
+    if savepath:
+        with open(savepath, "w") as f:
+            json.dump(report, f, indent=1)
+    return report
+
+
+#------------------------------------------------------------------
+# Extensions
+#------------------------------------------------------------------
+
+# Modules built on the functions of this one. They import it, so their names are looked up on first use (e.g.
+# utilities.sweep_rate_constants) instead of being imported here
+EXTENSION_MODULES = ["run_monitor", "rate_sweeps", "work_queue", "command_line"]
+
+
+def __getattr__(name):
+    """
+    Private function. Look up names that aren't defined in this module in the extension modules
+    :param name: (str) Name of the attribute
+    :return: The object of that name in the first extension module that defines it
+    """
+    if not name.startswith("__"):
+        for module_name in EXTENSION_MODULES:
+            module = importlib.import_module(module_name)
+            if name in vars(module):
+                return vars(module)[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    from command_line import main
+    main()
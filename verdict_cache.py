@@ -0,0 +1,243 @@
+import collections
+import hashlib
+import itertools
+import json
+import math
+import os
+import re
+
+
+def parse_reaction_line(line):
+    """
+    Private function. Parse a mass-action reaction line, e.g. "S0 + S1 -> S2; k1*S0*S1" or the getAntimony form
+    "_J0: $S0 + S1 -> S2; k1*S0*S1;"
+    :param line: (str) A line of an antimony string, comments already removed
+    :return: (list(str), list(str), str) or None Reactants, products (repeated for stoichiometry) and the name of the
+        rate constant. None if the line isn't a mass-action reaction
+    """
+    if "->" not in line or ";" not in line:
+        return None
+    reaction, ratelaw = line.split(";")[:2]
+    reaction = reaction.split(":")[-1]
+    sides = []
+    for side in reaction.split("->"):
+        names = []
+        for term in side.split("+"):
+            match = re.fullmatch(r"\s*(\d*)\s*\$?([A-Za-z_]\w*)\s*", term)
+            if match:
+                names += [match.group(2)] * int(match.group(1) or 1)
+            elif term.strip():
+                return None
+        sides.append(names)
+    factors = ratelaw.replace(" ", "").split("*")
+    constants = [factor for factor in factors if factor not in sides[0]]
+    if len(constants) != 1 or sorted(factors) != sorted(sides[0] + constants):
+        return None
+    return sides[0], sides[1], constants[0]
+
+
+def parse_mass_action_network(astr):
+    """
+    Parse an antimony string of a mass-action network, either as written by the evolution or as returned by
+    r.getAntimony(). Commented out reactions are ignored.
+    :param astr: (str) Antimony string
+    :return: (dict) or None "reactions": list of (reactants, products, rate constant value), "species": dict of
+        species name -> initial concentration in order of first appearance (the order RoadRunner gives floating
+        species), "boundary": set of boundary (const) species. None if the model isn't a plain mass-action network
+    """
+    reactions = []
+    values = {}
+    species = {}  # Used as an ordered set
+    boundary = set()
+    constant = set()
+    for line in astr.split("\n"):
+        line = line.split("#")[0].split("//")[0].strip().rstrip(";")
+        if not line:
+            continue
+        if "->" in line:
+            reaction = parse_reaction_line(line + ";" if ";" not in line else line)
+            if reaction is None:
+                return None
+            reactions.append(reaction)
+            species.update(dict.fromkeys(reaction[0] + reaction[1]))
+            boundary.update(re.findall(r"\$([A-Za-z_]\w*)", line.split(";")[0]))
+            continue
+        match = re.fullmatch(r"(const\s+)?species\s+(.*)", line)
+        if match:
+            for name in match.group(2).split(","):
+                name = name.split(" in ")[0].strip()
+                if name.startswith("$") or match.group(1):
+                    boundary.add(name.lstrip("$"))
+                species[name.lstrip("$")] = None
+            continue
+        match = re.fullmatch(r"const\s+(.*)", line)
+        if match:
+            constant.update(name.strip() for name in match.group(1).split(","))
+            continue
+        match = re.fullmatch(r"([A-Za-z_]\w*)\s*=\s*([-+0-9.eE]+)", line)
+        if match:
+            values[match.group(1)] = float(match.group(2))
+    boundary = (boundary | constant) & species.keys()
+    try:
+        network = {"reactions": [(reactants, products, values[k]) for reactants, products, k in reactions],
+                   "species": {name: values[name] for name in species},
+                   "boundary": boundary}
+    except KeyError:
+        return None  # A rate constant or initial concentration isn't a plain number
+    return network
+
+
+def quantize(value, precision):
+    """
+    Private function. Round a number to a number of significant digits for use in a canonical form
+    :param value: (float) Number to round
+    :param precision: (int) Number of significant digits, None to keep the exact value
+    :return: (str)
+    """
+    if precision is None:
+        return repr(float(value))
+    return format(value, ".%dg" % precision)
+
+
+def canonical_reaction(reaction, labels, precision):
+    """
+    Private function. Write a reaction in terms of canonical species labels
+    :param reaction: (list(str), list(str), float) Reactants, products and rate constant
+    :param labels: (dict) Species name -> canonical label
+    :param precision: (int) Significant digits of the rate constant, None for the exact value
+    :return: (list) JSON serializable canonical form of the reaction
+    """
+    reactants, products, k = reaction
+    return [sorted(labels[s] for s in reactants), sorted(labels[s] for s in products), quantize(k, precision)]
+
+
+def canonical_network(astr, precision=12, max_permutations=5040):
+    """
+    Compute a form of a mass-action network that doesn't depend on the species names or the order of the reactions,
+    so that networks that only differ by a relabeling get the same hash. Species are first told apart by their
+    initial concentration, whether they are boundary species and (iteratively) the reactions they take part in.
+    Species that still can't be told apart are tried in every order and the smallest form is kept.
+    :param astr: (str) Antimony string
+    :param precision: optional (int), number of significant digits of rate constants and initial concentrations.
+        The default of 12 makes the antimony written by the evolution and by r.getAntimony() (15 digits) agree.
+        None compares exact values
+    :param max_permutations: optional (int), if the species that can't be told apart have more orderings than this,
+        only one of them is used. The hash is then still exact, but a relabeled copy of the network may be missed
+    :return: (str, dict) or None The hash of the canonical form and the canonical label of each species. None if the
+        model isn't a plain mass-action network
+    """
+    network = parse_mass_action_network(astr)
+    if network is None:
+        return None
+    species = sorted(network["species"])
+    reactions = network["reactions"]
+
+    def rank(signatures):
+        distinct = sorted(set(signatures.values()))
+        return {s: distinct.index(signatures[s]) for s in species}
+
+    colours = rank({s: (s in network["boundary"], quantize(network["species"][s], precision)) for s in species})
+    while True:
+        signatures = {}
+        for s in species:
+            roles = []
+            for reactants, products, k in reactions:
+                if s in reactants or s in products:
+                    roles.append((reactants.count(s), products.count(s), quantize(k, precision),
+                                  tuple(sorted(colours[x] for x in reactants)),
+                                  tuple(sorted(colours[x] for x in products))))
+            signatures[s] = (colours[s], tuple(sorted(roles)))
+        refined = rank(signatures)
+        if len(set(refined.values())) == len(set(colours.values())):
+            break
+        colours = refined
+    classes = [[s for s in species if colours[s] == c] for c in sorted(set(colours.values()))]
+    orderings = [classes]
+    if math.prod(math.factorial(len(c)) for c in classes) <= max_permutations:
+        orderings = itertools.product(*[itertools.permutations(c) for c in classes])
+    best = None
+    for ordering in orderings:
+        labels = {s: i for i, s in enumerate(itertools.chain(*ordering))}
+        form = json.dumps([sorted(canonical_reaction(reaction, labels, precision) for reaction in reactions),
+                           [[s in network["boundary"], quantize(network["species"][s], precision)]
+                            for s in sorted(species, key=labels.get)]])
+        if best is None or form < best[0]:
+            best = (form, labels)
+    return hashlib.sha256(best[0].encode()).hexdigest(), best[1]
+
+
+class VerdictCache:
+    """
+    Bounded cache of oscillator verdicts keyed by the canonical form of the network (see canonical_network), so
+    relabeled or reordered copies of a network are only simulated once. The least recently used entries are evicted
+    once max_size is reached. The cache can be saved to and loaded from a JSON file to share it between runs.
+    """
+
+    def __init__(self, max_size=100000, precision=12, path=None):
+        """
+        :param max_size: optional (int), maximum number of verdicts kept
+        :param precision: optional (int), passed on to canonical_network
+        :param path: optional (str), JSON file to load verdicts from (if it exists) and save them to
+        """
+        self.max_size = max_size
+        self.precision = precision
+        self.path = path
+        self.verdicts = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as f:
+                saved = json.load(f)
+            if saved["precision"] == precision:
+                for key, value in saved["verdicts"]:
+                    self.put(key, value)
+
+    def __len__(self):
+        return len(self.verdicts)
+
+    def key(self, kind, astr):
+        """
+        Compute the cache key of a model
+        :param kind: (str) The kind of verdict, e.g. "evaluate" or "oscillator"
+        :param astr: (str) Antimony string of the model
+        :return: (str, dict) or (None, None) The key and the canonical labels of the species. None if the model can't
+            be canonicalized, it should then simply be evaluated
+        """
+        canonical = canonical_network(astr, precision=self.precision)
+        if canonical is None:
+            return None, None
+        return "%s:%s" % (kind, canonical[0]), canonical[1]
+
+    def get(self, key):
+        """
+        :param key: (str) Key returned by VerdictCache.key
+        :return: The cached verdict, None if there is none
+        """
+        if key not in self.verdicts:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.verdicts.move_to_end(key)
+        return self.verdicts[key]
+
+    def put(self, key, value):
+        """
+        :param key: (str) Key returned by VerdictCache.key
+        :param value: JSON serializable verdict
+        :return: None
+        """
+        self.verdicts[key] = value
+        self.verdicts.move_to_end(key)
+        while len(self.verdicts) > self.max_size:
+            self.verdicts.popitem(last=False)
+
+    def save(self, path=None):
+        """
+        Write the cache to a JSON file
+        :param path: optional (str), defaults to the path the cache was created with
+        :return: None
+        """
+        path = path or self.path
+        with open(path + ".tmp", "w") as f:
+            json.dump({"precision": self.precision, "verdicts": list(self.verdicts.items())}, f)
+        os.replace(path + ".tmp", path)
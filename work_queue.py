@@ -0,0 +1,346 @@
+import contextlib
+import json
+import os
+import socket
+import threading
+import time
+
+from model_files import is_auxiliary_file, WORK_QUEUE_DIRECTORY
+from utilities import (
+    apply_verdict, evaluate_model, evaluate_model_files_parallel, prefetch_model_records, PruningPool,
+    search_minimal_network)
+
+
+class WorkQueue:
+    """
+    Work queue kept in a model directory on a shared file system, so that several processes, on one machine or many,
+    can evaluate or prune the same directory together. The models are split into shards by the first worker. A worker
+    claims a shard by creating its lease file, which only one worker can do, and keeps the lease alive by touching it
+    while it works. A lease that hasn't been touched for lease_timeout seconds belonged to a dead worker, and the shard
+    is claimed again with a lease of the next generation.
+    Workers never rename models while they work: the results of each shard are saved in the queue, and the merge of
+    all results into the directory is claimed like another shard once every shard is done. The plan and the results
+    are kept afterwards, so workers that start late find the run finished. Delete the queue directory to run again.
+    Only operations that are atomic on network file systems are used (os.link to create files exclusively,
+    os.replace), and lease times are compared to a file touched on the same file system, so the clocks of the
+    machines don't need to agree.
+    """
+
+    def __init__(self, path, task, options, worker=None, lease_timeout=300):
+        """
+        :param path: (str) Path to the directory of antimony models
+        :param task: (str) Name of the task, "evaluate" or "prune"
+        :param options: (dict) Options of the task that all workers must agree on
+        :param worker: optional (str), name of this worker, {host name}-{process id} by default
+        :param lease_timeout: optional (float), seconds after which the lease of a worker that stopped touching it
+            can be claimed by another worker
+        """
+        self.path = path
+        self.directory = os.path.join(path, WORK_QUEUE_DIRECTORY)
+        self.task = task
+        self.options = options
+        self.worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_timeout = lease_timeout
+        self.shards = []
+
+    def open(self, files, shard_size):
+        """
+        Load the plan of the queue, or create it if this is the first worker
+        :param files: list(str) Files to process, only used if the plan doesn't exist yet
+        :param shard_size: (int) Number of files per shard, only used if the plan doesn't exist yet
+        :return: None
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        plan = {"task": self.task, "options": self.options,
+                "shards": [files[i:i + shard_size] for i in range(0, len(files), shard_size)]}
+        if not self.create_exclusive("plan.json", plan):
+            with open(os.path.join(self.directory, "plan.json"), "r") as f:
+                plan = json.load(f)
+            if plan["task"] != self.task or plan["options"] != self.options:
+                raise ValueError(f"The work queue in {self.path} was created for {plan['task']} with options "
+                                 f"{plan['options']}, delete {self.directory} to start a new run")
+        self.shards = plan["shards"]
+
+    def create_exclusive(self, name, content):
+        """
+        Private function. Create a JSON file in the queue unless it already exists
+        :param name: (str) File name
+        :param content: JSON serializable content of the file
+        :return: (bool) True if the file was created by this call
+        """
+        tmp_path = os.path.join(self.directory, f".{name}.{self.worker}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(content, f)
+        try:
+            os.link(tmp_path, os.path.join(self.directory, name))
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def lease_path(self, name, generation):
+        return os.path.join(self.directory, f"lease_{name}_{generation}")
+
+    def result_path(self, name):
+        return os.path.join(self.directory, f"result_{name}.json")
+
+    def now(self):
+        """
+        Private function. Current time according to the file system of the queue
+        :return: (float) Modification time of a file touched now
+        """
+        clock = os.path.join(self.directory, f"clock_{self.worker}")
+        with open(clock, "a"):
+            pass
+        os.utime(clock)
+        return os.stat(clock).st_mtime
+
+    def generation(self, name):
+        """
+        Private function. Latest lease generation of a shard
+        :param name: (str) Name of the shard
+        :return: (int) The generation, -1 if the shard was never claimed
+        """
+        generation = -1
+        while os.path.exists(self.lease_path(name, generation + 1)):
+            generation += 1
+        return generation
+
+    def claim(self, name):
+        """
+        Claim a shard that has no lease, or whose latest lease has expired
+        :param name: (str) Name of the shard
+        :return: (int) Generation of the new lease, None if another worker holds the shard
+        """
+        generation = self.generation(name)
+        if generation >= 0:
+            try:
+                touched = os.stat(self.lease_path(name, generation)).st_mtime
+            except FileNotFoundError:  # The run was finished and the leases removed
+                return None
+            if self.now() - touched < self.lease_timeout:
+                return None
+        if self.create_exclusive(f"lease_{name}_{generation + 1}", {"worker": self.worker}):
+            return generation + 1
+        return None
+
+    def owns(self, name, generation):
+        """
+        Check that a lease hasn't been claimed again by another worker
+        :param name: (str) Name of the shard
+        :param generation: (int) Generation of the lease
+        :return: (bool) True if the lease is still the latest one
+        """
+        return not os.path.exists(self.lease_path(name, generation + 1))
+
+    @contextlib.contextmanager
+    def holding(self, name, generation):
+        """
+        Touch a lease regularly on a background thread for the duration of a with block
+        :param name: (str) Name of the shard
+        :param generation: (int) Generation of the lease
+        :return: None
+        """
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(self.lease_timeout / 4):
+                try:
+                    os.utime(self.lease_path(name, generation))
+                except FileNotFoundError:
+                    return
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def has_result(self, name):
+        return os.path.exists(self.result_path(name))
+
+    def read_result(self, name):
+        with open(self.result_path(name), "r") as f:
+            return json.load(f)
+
+    def write_result(self, name, result):
+        tmp_path = self.result_path(name) + f".{self.worker}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, self.result_path(name))
+
+    def run(self, process_shard, merge, poll_interval=None):
+        """
+        Work on the shards until all of them are done, then merge the results unless another worker does
+        :param process_shard: (function) Takes the list of files of a shard and returns its JSON serializable result
+        :param merge: (function) Takes the list of shard results, applies them to the directory and returns a JSON
+            serializable summary
+        :param poll_interval: optional (float), seconds between checks of shards held by other workers,
+            lease_timeout / 10 by default
+        :return: The summary returned by merge, read from the queue if another worker merged
+        """
+        poll_interval = poll_interval if poll_interval is not None else self.lease_timeout / 10
+
+        def done(name, work):
+            # True if the shard is done, False if another worker is on it
+            if self.has_result(name) or self.has_result("merge"):
+                return True
+            generation = self.claim(name)
+            if generation is None:
+                return False
+            with self.holding(name, generation):
+                result = work()
+            if not self.owns(name, generation):
+                return False  # Presumed dead and claimed again, the new owner saves the result
+            self.write_result(name, result)
+            return True
+
+        waiting = [shard for shard in range(len(self.shards))
+                   if not done(str(shard), lambda: process_shard(self.shards[shard]))]
+        while waiting:
+            time.sleep(poll_interval)
+            waiting = [shard for shard in waiting if not done(str(shard), lambda: process_shard(self.shards[shard]))]
+        while not done("merge", lambda: merge([self.read_result(str(i)) for i in range(len(self.shards))])):
+            time.sleep(poll_interval)
+        self.clean_up()
+        return self.read_result("merge")
+
+    def clean_up(self):
+        """
+        Private function. Remove the leases and clock files of a finished run
+        :return: None
+        """
+        for file in os.listdir(self.directory):
+            if file.startswith("lease_") or file.startswith("clock_"):
+                try:
+                    os.remove(os.path.join(self.directory, file))
+                except FileNotFoundError:
+                    pass
+
+
+def evaluate_oscillators_shared(path, worker=None, workers=None, timeout=None, streaming=False, shard_size=16,
+                                lease_timeout=300, poll_interval=None):
+    """
+    Evaluate models in a directory together with other processes running this function on the same directory, on
+    this machine or others sharing the file system (see WorkQueue). Models get the same verdicts as with
+    evaluate_oscillators, but files are only renamed (or rewritten, if repaired) once all models are evaluated.
+    :param path: (str) Path to a directory of antimony models
+    :param worker: optional (str), name of this worker in the queue, {host name}-{process id} by default
+    :param workers: optional (int), number of worker processes of this worker (see evaluate_oscillators)
+    :param timeout: optional (float), when running with workers, maximum number of seconds to spend on one model
+    :param streaming: optional (bool), see evaluate_oscillators. All workers must use the same value
+    :param shard_size: optional (int), number of models claimed at once, set by the first worker
+    :param lease_timeout: optional (float), seconds without a heartbeat after which the shard of a worker is claimed
+        by another one
+    :param poll_interval: optional (float), seconds between checks of shards held by other workers
+    :return: (int, int) The number of oscillators found and the total number of models evaluated
+    """
+    work_queue = WorkQueue(path, "evaluate", {"streaming": streaming}, worker=worker, lease_timeout=lease_timeout)
+    model_files = sorted(file for file in os.listdir(path)
+                         if not file.endswith(".json") and not is_auxiliary_file(file))
+    work_queue.open(model_files, shard_size)
+
+    def process_shard(files):
+        records = prefetch_model_records(path, files)
+        if workers is not None and workers > 1:
+            return evaluate_model_files_parallel(records, workers, timeout=timeout, streaming=streaming)
+        results = {}
+        for record in records:
+            if record.astr is None:
+                results[record.file] = ("error", None)
+            else:
+                results[record.file] = evaluate_model(record.astr, fitness=record.fitness, streaming=streaming)
+        return results
+
+    def merge(shard_results):
+        counts = {"total": 0, "success": 0, "error": 0}
+        for results in shard_results:
+            for file, (verdict, astr) in results.items():
+                counts["total"] += 1
+                counts["success"] += verdict in ["success", "repaired"]
+                counts["error"] += verdict == "error"
+                if os.path.exists(os.path.join(path, file)):  # Not applied yet by an interrupted merge
+                    apply_verdict(path, file, verdict, astr)
+        return counts
+
+    counts = work_queue.run(process_shard, merge, poll_interval=poll_interval)
+    success_count, total_count, error_count = counts["success"], counts["total"], counts["error"]
+    print(f"Processed {total_count} models and found {success_count} oscillators.")
+    if error_count > 0:
+        print(f"{error_count} models could not be evaluated and were marked as errors")
+    if total_count > 0:
+        print(f"Success rate: {(success_count / total_count) * 100}%")
+    return success_count, total_count
+
+
+def prune_models_shared(path, worker=None, workers=None, minimal=False, max_evaluations=None, time_limit=None,
+                        streaming=False, shard_size=4, lease_timeout=300, poll_interval=None, timeout=None):
+    """
+    Remove unnecessary reactions from antimony models in a directory together with other processes running this
+    function on the same directory (see WorkQueue). Pruned models are only written once all models are done.
+    :param path: (str) Path to a directory containing antimony files
+    :param worker: optional (str), name of this worker in the queue, {host name}-{process id} by default
+    :param workers: optional (int), number of worker processes used to evaluate candidate networks
+    :param minimal: optional (bool), see prune_models. The pruning options must be the same for all workers
+    :param max_evaluations: optional (int), maximum number of evaluations per model for the minimal search
+    :param time_limit: optional (float), maximum number of seconds per model for the minimal search
+    :param streaming: optional (bool), passed on to is_oscillator
+    :param shard_size: optional (int), number of models claimed at once, set by the first worker
+    :param lease_timeout: optional (float), seconds without a heartbeat after which the shard of a worker is claimed
+        by another one
+    :param poll_interval: optional (float), seconds between checks of shards held by other workers
+    :param timeout: optional (float), see prune_models
+    :return: (int, int) The total number of reactions removed and the number of models evaluated
+    """
+    options = {"minimal": minimal, "max_evaluations": max_evaluations, "time_limit": time_limit, "streaming": streaming}
+    work_queue = WorkQueue(path, "prune", options, worker=worker, lease_timeout=lease_timeout)
+    work_queue.open(sorted(file for file in os.listdir(path) if file.endswith(".ant")), shard_size)
+    pool = None
+    if workers is not None and workers > 1:
+        pool = PruningPool(workers, timeout=timeout)
+
+    def process_shard(files):
+        results = {}
+        for file in files:
+            with open(os.path.join(path, file), "r") as f:
+                astr = f.read()
+            reactions_pruned, new_astr, stats = search_minimal_network(astr, pool=pool, minimal=minimal,
+                                                                       max_evaluations=max_evaluations,
+                                                                       time_limit=time_limit, streaming=streaming)
+            lookups = stats["evaluations"] + stats["cache_hits"]
+            hit_rate = stats["cache_hits"] / lookups if lookups > 0 else 0
+            print(f"{file}: removed {reactions_pruned} reactions, {stats['evaluations']} evaluations, "
+                  f"{hit_rate * 100:.1f}% cache hits")
+            results[file] = (reactions_pruned, new_astr if reactions_pruned > 0 else None, stats)
+        return results
+
+    def merge(shard_results):
+        totals = {"reactions_removed": 0, "models": 0, "evaluations": 0, "cache_hits": 0}
+        for results in shard_results:
+            for file, (reactions_pruned, new_astr, stats) in results.items():
+                totals["models"] += 1
+                totals["evaluations"] += stats["evaluations"]
+                totals["cache_hits"] += stats["cache_hits"]
+                if reactions_pruned > 0:
+                    totals["reactions_removed"] += reactions_pruned
+                    with open(os.path.join(path, file), "w") as f:
+                        f.write(new_astr)
+        return totals
+
+    try:
+        totals = work_queue.run(process_shard, merge, poll_interval=poll_interval)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    print(f"Removed {totals['reactions_removed']} reactions from {totals['models']} models")
+    if totals["models"] > 0:
+        print(f"Average reactions removed per model = {totals['reactions_removed'] / totals['models']}")
+    print(f"{totals['evaluations']} evaluations, {totals['cache_hits']} cache hits")
+    if pool is not None and pool.crashes > 0:
+        print(f"{pool.crashes} candidate networks crashed a worker and were counted as not oscillating")
+    if pool is not None and pool.timeouts > 0:
+        print(f"{pool.timeouts} candidate networks ran out of time and were counted as not oscillating")
+    return totals["reactions_removed"], totals["models"]